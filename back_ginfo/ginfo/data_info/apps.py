@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DataInfoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'data_info'
+
+    def ready(self):
+        from . import signals  # noqa: F401
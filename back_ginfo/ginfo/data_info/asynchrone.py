@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import connection, models
+from django.db.models.query import QuerySet
+
+from .loaders import get_loader, relation_du_champ
+from .tracing import _nombre_de_lignes
+
+
+def parametre(nom):
+    """Lit un paramètre de GRAPHQL_ASYNC dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'ACTIF': False,
+        'THREADS': 4,
+        'CHAMPS_RACINE_MIN': 2,
+    }
+    return getattr(settings, 'GRAPHQL_ASYNC', {}).get(nom, defauts[nom])
+
+
+_pool = None
+_verrou = threading.Lock()
+
+
+def pool():
+    """Pool de threads borné qui exécute le travail ORM, créé à la première utilisation
+    (après le fork des workers).
+
+    Chaque thread garde sa propre connexion à la base : THREADS borne donc
+    aussi le nombre de connexions ouvertes par worker.
+    """
+    global _pool
+    with _verrou:
+        if _pool is None or _pool._pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=parametre('THREADS'), thread_name_prefix='orm')
+            _pool._pid = os.getpid()
+    return _pool
+
+
+class CompteurSql:
+    """execute_wrapper local à un appel exécuté dans le pool"""
+
+    def __init__(self):
+        self.requetes = 0
+        self.duree = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes += 1
+            self.duree += time.perf_counter() - debut
+
+
+def _mesurer(fonction, args, kwargs):
+    compteur = CompteurSql()
+    debut = time.perf_counter()
+    with connection.execute_wrapper(compteur):
+        resultat = fonction(*args, **kwargs)
+        if isinstance(resultat, QuerySet):
+            resultat = list(resultat)
+    return resultat, time.perf_counter() - debut, compteur
+
+
+async def executer(trace, fonction, *args, chemin=None, **kwargs):
+    """Exécute ``fonction`` dans le pool et reporte ses requêtes SQL dans ``trace``.
+
+    Un QuerySet renvoyé est évalué dans le thread. Le report est fait ici, sur
+    la boucle d'événements : la trace n'est jamais modifiée par deux threads.
+    """
+    boucle = asyncio.get_running_loop()
+    resultat, duree, compteur = await boucle.run_in_executor(
+        pool(), functools.partial(_mesurer, fonction, args, kwargs)
+    )
+    if trace is not None:
+        trace.requetes_sql += compteur.requetes
+        trace.duree_sql += compteur.duree
+        if chemin is not None:
+            trace.enregistrer(chemin, duree, compteur.requetes, compteur.duree, _nombre_de_lignes(resultat))
+    return resultat
+
+
+def _chemin(info):
+    return '.'.join(cle for cle in info.path.as_list() if isinstance(cle, str))
+
+
+class ExecutionAsynchrone:
+    """Middleware graphene de la vue asynchrone, à la place de LoaderMiddleware et TracingMiddleware.
+
+    - les champs racine s'exécutent chacun dans le pool, donc en parallèle ;
+    - une relation attend le lot du RelationLoader de son groupe, chargé dans
+      le pool ; les lots de relations différentes se chargent en parallèle ;
+    - les autres champs sont résolus directement sur la boucle d'événements,
+      et repassent par le pool seulement s'ils ont besoin de l'ORM.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, 'trace', None)
+        if info.parent_type is info.schema.get_root_type(info.operation.operation):
+            return self._racine(trace, next, root, info, args)
+
+        if isinstance(root, models.Model):
+            relation = relation_du_champ(root, info.field_name)
+            if relation is not None:
+                return self._relation(trace, next, root, info, relation, args)
+
+        try:
+            return next(root, info, **args)
+        except SynchronousOnlyOperation:
+            # Resolver qui interroge la base (totalCount, champ différé...)
+            return executer(trace, next, root, info, chemin=_chemin(info), **args)
+
+    async def _racine(self, trace, next, root, info, args):
+        resultat = await executer(trace, next, root, info, chemin=_chemin(info), **args)
+        if isinstance(resultat, list):
+            get_loader(info.context).enregistrer(resultat)
+        return resultat
+
+    async def _relation(self, trace, next, root, info, relation, args):
+        loader = get_loader(info.context)
+        await loader.charger_async(
+            root, relation, functools.partial(executer, trace, chemin=_chemin(info))
+        )
+        resultat = next(root, info, **args)
+        if isinstance(resultat, QuerySet):
+            if resultat._result_cache is None:
+                resultat = await executer(trace, list, resultat)
+            else:
+                resultat = list(resultat)
+        if isinstance(resultat, list):
+            loader.enregistrer(resultat)
+        return resultat
@@ -0,0 +1,210 @@
+"""
+Authentification JWT des requêtes GraphQL.
+
+JWTMiddleware lit l'en-tête ``Authorization: Bearer <jeton>`` et place sur la
+requête (``info.context`` dans les resolvers) :
+
+- ``request.jwt`` : claims du jeton d'accès, ou None ;
+- ``request.utilisateur`` : le profil Utilisateur, ou None. Avec les claims
+  ``utilisateurId`` et ``role`` posés par LoginMutation, il est construit sans
+  requête SQL ; ses autres champs se chargent au premier accès.
+
+Les claims sont ceux de l'émission du jeton : un changement de rôle n'est vu
+qu'au jeton suivant (ACCESS_TOKEN_LIFETIME).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import Utilisateur
+
+
+def parametre(nom):
+    """Lit un paramètre de GRAPHQL_AUTH dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'TAILLE_CACHE': 1024,
+        'INTERVALLE_LISTE_NOIRE': 5,
+    }
+    return getattr(settings, 'GRAPHQL_AUTH', {}).get(nom, defauts[nom])
+
+
+class CacheJetons:
+    """Cache LRU des jetons d'accès déjà vérifiés, indexés par leur signature.
+
+    Une entrée garde le jeton complet, comparé à chaque lecture, et n'est plus
+    servie après l'expiration (claim ``exp``) du jeton. Un jeton refusé n'est
+    pas mis en cache.
+    """
+
+    def __init__(self, taille=1024):
+        self.taille = taille
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verifier(self, brut):
+        """Renvoie les claims du jeton d'accès ``brut`` ; TokenError s'il est invalide ou expiré"""
+        signature = brut.rsplit('.', 1)[-1]
+        with self._verrou:
+            entree = self._entrees.get(signature)
+            if entree is not None:
+                jeton, expiration, claims = entree
+                if jeton == brut and expiration > time.time():
+                    self._entrees.move_to_end(signature)
+                    self.hits += 1
+                    return claims
+                del self._entrees[signature]
+            self.misses += 1
+
+        claims = dict(AccessToken(brut).payload)
+
+        with self._verrou:
+            self._entrees[signature] = (brut, claims['exp'], claims)
+            self._entrees.move_to_end(signature)
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+        return claims
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+class ListeNoire:
+    """Copie en mémoire des jti des jetons de rafraîchissement révoqués.
+
+    Le premier accès charge les révocations encore valides ; ensuite, au plus
+    une requête toutes les INTERVALLE_LISTE_NOIRE secondes lit les seules
+    lignes de BlacklistedToken ajoutées depuis (identifiant croissant). Une
+    révocation faite par un autre processus est donc vue avec au plus ce
+    délai ; celles de ce processus le sont immédiatement.
+    """
+
+    def __init__(self):
+        self._expirations = {}
+        self._dernier_id = None
+        self._lecture = 0.0
+        self._verrou = threading.Lock()
+
+    def rafraichir(self, forcer=False):
+        with self._verrou:
+            if not forcer and time.monotonic() - self._lecture < parametre('INTERVALLE_LISTE_NOIRE'):
+                return
+            maintenant = timezone.now()
+            lignes = BlacklistedToken.objects.order_by('id')
+            if self._dernier_id is None:
+                lignes = lignes.filter(token__expires_at__gt=maintenant)
+            else:
+                lignes = lignes.filter(id__gt=self._dernier_id)
+            for id, jti, expiration in lignes.values_list('id', 'token__jti', 'token__expires_at'):
+                self._expirations[jti] = expiration
+                self._dernier_id = id
+            if self._dernier_id is None:
+                self._dernier_id = 0
+            # Un jeton expiré est de toute façon refusé : inutile de le garder
+            for jti in [jti for jti, expiration in self._expirations.items() if expiration <= maintenant]:
+                del self._expirations[jti]
+            self._lecture = time.monotonic()
+
+    def contient(self, jti):
+        self.rafraichir()
+        return jti in self._expirations
+
+    def ajouter(self, jti, expiration):
+        with self._verrou:
+            self._expirations[jti] = expiration
+
+    def vider(self):
+        with self._verrou:
+            self._expirations.clear()
+            self._dernier_id = None
+            self._lecture = 0.0
+
+
+JETONS = CacheJetons(parametre('TAILLE_CACHE'))
+LISTE_NOIRE = ListeNoire()
+
+
+class JetonRafraichissement(RefreshToken):
+    """RefreshToken dont la vérification de révocation passe par LISTE_NOIRE"""
+
+    def check_blacklist(self):
+        if LISTE_NOIRE.contient(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        resultat = super().blacklist()
+        LISTE_NOIRE.ajouter(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+        return resultat
+
+
+# Champ de Utilisateur -> claim du jeton
+CLAIMS_UTILISATEUR = {
+    'utilisateur_id': 'utilisateurId',
+    'user_id': api_settings.USER_ID_CLAIM,
+    'role': 'role',
+}
+
+
+def utilisateur_depuis_claims(claims):
+    """Profil Utilisateur du jeton : instance partielle sans requête si les claims
+    suffisent, sinon chargé à la première utilisation"""
+    if all(claim in claims for claim in CLAIMS_UTILISATEUR.values()):
+        champs = [f.attname for f in Utilisateur._meta.concrete_fields if f.attname in CLAIMS_UTILISATEUR]
+        return Utilisateur.from_db(
+            router.db_for_read(Utilisateur), champs, [claims[CLAIMS_UTILISATEUR[champ]] for champ in champs]
+        )
+    user_id = claims.get(api_settings.USER_ID_CLAIM)
+    return SimpleLazyObject(lambda: Utilisateur.objects.filter(user_id=user_id).first())
+
+
+def authentifier(request):
+    request.jwt = None
+    request.utilisateur = None
+    type, _espace, brut = request.headers.get('Authorization', '').partition(' ')
+    if type not in api_settings.AUTH_HEADER_TYPES or not brut.strip():
+        return
+    try:
+        claims = JETONS.verifier(brut.strip())
+    except TokenError:
+        return
+    request.jwt = claims
+    request.utilisateur = utilisateur_depuis_claims(claims)
+
+
+class JWTMiddleware:
+    """Middleware Django synchrone et asynchrone : la vérification ne fait pas
+    d'entrée/sortie, elle s'exécute sans changement de thread sous ASGI"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asynchrone = iscoroutinefunction(get_response)
+        if self.asynchrone:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asynchrone:
+            return self.__acall__(request)
+        authentifier(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        authentifier(request)
+        return await self.get_response(request)
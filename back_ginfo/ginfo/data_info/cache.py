@@ -0,0 +1,107 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+ALIAS = 'resultats'
+
+_verrou = threading.Lock()
+statistiques = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def _compter(nom, nombre=1):
+    with _verrou:
+        statistiques[nom] += nombre
+
+
+class LocMemCacheCompte(LocMemCache):
+    """Cache mémoire locale qui compte les entrées évincées quand MAX_ENTRIES est atteint"""
+
+    def _cull(self):
+        avant = len(self._cache)
+        super()._cull()
+        _compter('evictions', avant - len(self._cache))
+
+
+def _cle_version(model):
+    return f"version:{model._meta.label_lower}"
+
+
+def version(model):
+    """Version des données d'un modèle propre au processus (incrémentée à chaque écriture du processus)"""
+    cache = caches[ALIAS]
+    valeur = cache.get(_cle_version(model))
+    if valeur is None:
+        valeur = _nouvelle_version(cache, model)
+    return valeur
+
+
+def _nouvelle_version(cache, model):
+    # Version initiale tirée de l'horloge : si le compteur a été évincé, la
+    # nouvelle valeur ne peut pas retomber sur une version déjà utilisée.
+    # add() ne remplace pas une version posée entre-temps par un autre worker.
+    cache.add(_cle_version(model), time.time_ns() // 1000, None)
+    return cache.get(_cle_version(model))
+
+
+def invalider(model):
+    """Rend obsolètes tous les résultats en cache qui dépendent de ``model``.
+
+    La version est incrémentée tout de suite, puis de nouveau au commit : une
+    lecture faite pendant la transaction ne peut pas remettre en cache des
+    données d'avant l'écriture sous la nouvelle version.
+    """
+    def incrementer():
+        cache = caches[ALIAS]
+        try:
+            cache.incr(_cle_version(model))
+        except ValueError:
+            _nouvelle_version(cache, model)
+
+    incrementer()
+    transaction.on_commit(incrementer)
+
+
+def resultat_en_cache(*modeles, timeout=None):
+    """Met en cache le résultat d'un resolver racine, par nom de champ et arguments.
+
+    La clé contient deux versions de chacun des ``modeles`` : celle de
+    VersionModele, commune à tous les processus et incrémentée au commit de
+    chaque écriture (y compris en masse), et celle du processus, incrémentée
+    dès l'écriture (voir invalider). Une écriture sur l'un d'eux, dans ce
+    processus ou un autre, rend les entrées précédentes inaccessibles (elles
+    expirent ensuite). Le resolver doit renvoyer des instances complètes (pas
+    de ``.only()``) ; les relations restent résolues par le RelationLoader.
+    """
+    def decorateur(resolver):
+        @functools.wraps(resolver)
+        def wrapper(root, info, **kwargs):
+            from .models import VersionModele
+            versions = [version(model) for model in modeles]
+            communes = VersionModele.lire([model._meta.label_lower for model in modeles])
+            versions += [communes[model._meta.label_lower] for model in modeles]
+            arguments = hashlib.sha1(json.dumps(kwargs, sort_keys=True, default=str).encode()).hexdigest()
+            cle = f"resultat:{info.parent_type.name}.{info.field_name}:{arguments}:{'-'.join(map(str, versions))}"
+
+            cache = caches[ALIAS]
+            resultat = cache.get(cle)
+            if resultat is not None:
+                _compter('hits')
+                return resultat
+
+            _compter('misses')
+            resultat = resolver(root, info, **kwargs)
+            if hasattr(resultat, 'model') and hasattr(resultat, 'query'):
+                resultat = list(resultat)
+            if timeout is None:
+                cache.set(cle, resultat)
+            else:
+                cache.set(cle, resultat, timeout)
+            return resultat
+        return wrapper
+    return decorateur
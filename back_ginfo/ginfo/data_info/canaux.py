@@ -0,0 +1,250 @@
+"""
+Couche de canaux des subscriptions GraphQL.
+
+Les écritures publient de petits messages (dicts sérialisables en JSON) sur
+un canal nommé, après le commit de leur transaction ; chaque subscription
+ouverte écoute un canal. La couche est choisie par ABONNEMENTS['COUCHE'] et
+doit fournir :
+
+- ``publier(canal, message)`` et ``publier_lot(canal, messages)`` : synchrones,
+  appelables depuis n'importe quel thread ;
+- ``abonner(canal)`` : appelé sur la boucle d'événements, renvoie un itérateur
+  asynchrone de messages qui a une méthode ``fermer()``.
+
+CoucheBase (par défaut) passe par la table MessageCanal : un message
+publié par un worker ou un pod atteint les abonnés de tous les autres, avec
+au plus ABONNEMENTS['INTERVALLE'] de délai. Les messages d'une écriture
+ensembliste (publier_lot) sont insérés ensemble, et chaque processus qui
+publie ou lit supprime ceux de plus de ABONNEMENTS['RETENTION'] secondes.
+CoucheMemoire garde les abonnés dans le processus et ne convient qu'à un
+seul worker.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS = 'notifications'
+INFORMATIONS = 'informations'
+
+
+def parametre(nom):
+    """Lit un paramètre de ABONNEMENTS dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'COUCHE': 'data_info.canaux.CoucheBase',
+        'INTERVALLE': 0.5,
+        'RETENTION': 300,
+        'TAILLE_FILE': 1000,
+        'DELAI_INIT': 10,
+    }
+    return getattr(settings, 'ABONNEMENTS', {}).get(nom, defauts[nom])
+
+
+class Abonnement:
+    """Messages d'un canal pour une subscription, dans une file bornée de la boucle d'événements"""
+
+    def __init__(self, couche, canal, taille):
+        self.couche = couche
+        self.canal = canal
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue(maxsize=taille)
+        self.perdus = 0
+
+    def deposer(self, message):
+        """Appelé depuis le thread qui publie"""
+        try:
+            self.boucle.call_soon_threadsafe(self._ajouter, message)
+        except RuntimeError:
+            # Boucle fermée : l'abonné a disparu sans se désabonner
+            self.fermer()
+
+    def _ajouter(self, message):
+        if self.file.full():
+            # Abonné trop lent : le plus ancien message est perdu plutôt que de bloquer les écritures
+            self.file.get_nowait()
+            self.perdus += 1
+        self.file.put_nowait(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.file.get()
+
+    def fermer(self):
+        self.couche.retirer(self)
+
+
+class CoucheMemoire:
+    """Couche en mémoire du processus"""
+
+    def __init__(self):
+        self._abonnes = {}
+        self._verrou = threading.Lock()
+
+    def publier(self, canal, message):
+        with self._verrou:
+            abonnes = list(self._abonnes.get(canal, ()))
+        for abonnement in abonnes:
+            abonnement.deposer(message)
+
+    def publier_lot(self, canal, messages):
+        for message in messages:
+            self.publier(canal, message)
+
+    def abonner(self, canal):
+        abonnement = Abonnement(self, canal, parametre('TAILLE_FILE'))
+        with self._verrou:
+            self._abonnes.setdefault(canal, set()).add(abonnement)
+        return abonnement
+
+    def retirer(self, abonnement):
+        with self._verrou:
+            self._abonnes.get(abonnement.canal, set()).discard(abonnement)
+
+    def nombre_abonnes(self, canal):
+        with self._verrou:
+            return len(self._abonnes.get(canal, ()))
+
+
+class CoucheBase(CoucheMemoire):
+    """Couche partagée par la base : une publication est une ligne MessageCanal, qu'un
+    thread de chaque processus relit toutes les INTERVALLE secondes pour ses abonnés.
+
+    Sous SQLite les écritures sont sérialisées : les identifiants suivent l'ordre
+    des commits, et lire au-delà du dernier identifiant lu ne perd rien.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._arret = threading.Event()
+        self._lecteur = None
+        self._purge = None
+
+    def publier(self, canal, message):
+        self.publier_lot(canal, [message])
+
+    def publier_lot(self, canal, messages):
+        from .models import MessageCanal
+        MessageCanal.objects.bulk_create([MessageCanal(canal=canal, contenu=message) for message in messages])
+        self.purger()
+
+    def purger(self):
+        """Supprime les messages de plus de RETENTION secondes, au plus une fois par RETENTION / 5
+        secondes et par processus : les processus sans abonné (WSGI, commandes) purgent aussi"""
+        from .models import MessageCanal
+        with self._verrou:
+            if self._purge is not None and time.monotonic() - self._purge < parametre('RETENTION') / 5:
+                return
+            self._purge = time.monotonic()
+        limite = timezone.now() - timedelta(seconds=parametre('RETENTION'))
+        MessageCanal.objects.filter(date__lt=limite).delete()
+
+    def abonner(self, canal):
+        with self._verrou:
+            if self._lecteur is None:
+                # Les messages publiés à partir de maintenant seront distribués
+                self._lecteur = threading.Thread(
+                    target=self._lire, args=(timezone.now(),), name='canaux-lecteur', daemon=True
+                )
+                self._lecteur.start()
+        return super().abonner(canal)
+
+    def _lire(self, depuis):
+        from .models import MessageCanal
+        dernier = None
+        try:
+            while not self._arret.wait(parametre('INTERVALLE')):
+                try:
+                    if dernier is None:
+                        dernier = MessageCanal.objects.filter(date__lt=depuis).aggregate(dernier=Max('pk'))['dernier'] or 0
+                    for message in MessageCanal.objects.filter(pk__gt=dernier).order_by('pk')[:1000]:
+                        CoucheMemoire.publier(self, message.canal, message.contenu)
+                        dernier = message.pk
+                    self.purger()
+                except Exception:
+                    # Base momentanément indisponible ou verrouillée : nouvel essai au tour suivant
+                    logger.exception("Lecture des messages des canaux impossible")
+        finally:
+            connection.close()
+
+    def arreter(self):
+        self._arret.set()
+        if self._lecteur is not None:
+            self._lecteur.join()
+
+
+_couche = None
+_verrou = threading.Lock()
+
+
+def couche():
+    """Couche configurée, créée au premier appel"""
+    global _couche
+    with _verrou:
+        if _couche is None:
+            _couche = import_string(parametre('COUCHE'))()
+    return _couche
+
+
+def reinitialiser():
+    """Oublie la couche (tests, changement de réglage)"""
+    global _couche
+    with _verrou:
+        if hasattr(_couche, 'arreter'):
+            _couche.arreter()
+        _couche = None
+
+
+class Ecoute:
+    """Messages d'un canal dont les champs valent ``filtres`` (comparés en texte, les filtres
+    None sont ignorés). L'abonnement est pris dès la création : rien n'est perdu entre
+    la subscription et sa première lecture."""
+
+    def __init__(self, canal, **filtres):
+        self.filtres = {cle: str(valeur) for cle, valeur in filtres.items() if valeur is not None}
+        self.abonnement = couche().abonner(canal)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            message = await self.abonnement.__anext__()
+            if all(str(message.get(cle)) == valeur for cle, valeur in self.filtres.items()):
+                return message
+
+    async def aclose(self):
+        self.abonnement.fermer()
+
+
+def publier(canal, message):
+    """Publie ``message`` sur ``canal`` après le commit de la transaction en cours
+    (tout de suite hors transaction) ; rien n'est publié si elle est annulée"""
+    publier_lot(canal, [message])
+
+
+def publier_lot(canal, messages):
+    """Comme publier, pour tous les ``messages`` d'une écriture ensembliste : un seul
+    rappel au commit, une seule insertion pour la couche partagée"""
+    messages = list(messages)
+    if not messages:
+        return
+
+    def envoyer():
+        try:
+            couche().publier_lot(canal, messages)
+        except Exception:
+            # Une couche indisponible ne fait pas échouer l'écriture, déjà validée
+            logger.exception("Publication sur le canal %s impossible", canal)
+    transaction.on_commit(envoyer)
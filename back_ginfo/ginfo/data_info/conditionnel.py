@@ -0,0 +1,160 @@
+"""
+Requêtes GraphQL de lecture en GET conditionnel (ETag, If-None-Match, Cache-Control).
+
+Une requête ``query`` reçue en GET (document ou hash de requête persistée)
+reçoit un ETag fort calculé sans exécuter les resolvers : empreinte du
+document, variables, nom d'opération, et version de chaque modèle que le
+document peut lire. Les versions (VersionModele) sont incrémentées dans la
+transaction de chaque écriture (signals.py pour save/delete, les écritures
+en masse elles-mêmes) : elles sont les mêmes pour tous les workers et ne
+changent qu'au commit. Un ``If-None-Match`` égal à l'ETag courant reçoit un
+304 sans exécution.
+
+La durée de mise en cache se déclare par nom d'opération dans
+CACHE_HTTP['MAX_AGE'] ; sans durée, la réponse est ``no-cache`` (à
+revalider à chaque usage, ce qui reste un 304 sans corps si rien n'a changé).
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.http import parse_etags
+from graphene_django import DjangoObjectType
+from graphql import TypeInfo, TypeInfoVisitor, Visitor, get_named_type, visit
+
+from .models import Historique, Information, StatistiqueCompagnie, StatistiqueJour, VersionModele
+
+
+def parametre(nom):
+    """Lit un paramètre de CACHE_HTTP dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'MAX_AGE': {},
+        'MAX_AGE_DEFAUT': 0,
+        'PORTEE': 'public',
+        'TAILLE_CACHE': 256,
+        # À changer quand une mise en production modifie les réponses à données égales
+        'VERSION': '1',
+    }
+    return getattr(settings, 'CACHE_HTTP', {}).get(nom, defauts[nom])
+
+
+# Modèles lus par un champ racine en plus de ceux de son type de retour
+DEPENDANCES = {
+    'search': (Information,),
+    'dashboardStats': (StatistiqueCompagnie, StatistiqueJour),
+    'historiquesArchives': (Historique,),
+}
+
+
+class NonModifie(Exception):
+    """Levée avant l'exécution quand le client a déjà la version courante de la réponse"""
+
+    def __init__(self, entetes):
+        super().__init__("Not Modified")
+        self.entetes = entetes
+
+
+def _modele(type_graphql):
+    """Modèle Django derrière un type GraphQL (type objet ou connexion de graphene_django)"""
+    type_graphene = getattr(type_graphql, 'graphene_type', None)
+    if type_graphene is None or not hasattr(type_graphene, '_meta'):
+        return None
+    noeud = getattr(type_graphene._meta, 'node', None)
+    if noeud is not None:
+        type_graphene = noeud
+    if isinstance(type_graphene, type) and issubclass(type_graphene, DjangoObjectType):
+        return type_graphene._meta.model
+    return None
+
+
+class _ModelesLus(Visitor):
+    def __init__(self, schema, type_info):
+        super().__init__()
+        self.schema = schema
+        self.type_info = type_info
+        self.modeles = set()
+
+    def enter_field(self, node, *args):
+        modele = _modele(get_named_type(self.type_info.get_type()))
+        if modele is not None:
+            self.modeles.add(modele)
+        if self.type_info.get_parent_type() is self.schema.query_type:
+            self.modeles.update(DEPENDANCES.get(node.name.value, ()))
+
+
+def modeles_lus(schema, document):
+    """Modèles que les champs du document (fragments compris) peuvent lire"""
+    type_info = TypeInfo(schema)
+    visiteur = _ModelesLus(schema, type_info)
+    visit(document, TypeInfoVisitor(type_info, visiteur))
+    return visiteur.modeles
+
+
+class _CacheModeles:
+    """Labels des modèles lus, par empreinte de document"""
+
+    def __init__(self, taille):
+        self.taille = taille
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, schema, document, hash):
+        cle = (hash, id(schema))
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                return self._entrees[cle]
+        labels = tuple(sorted(modele._meta.label_lower for modele in modeles_lus(schema, document)))
+        with self._verrou:
+            self._entrees[cle] = labels
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+        return labels
+
+
+_modeles = _CacheModeles(parametre('TAILLE_CACHE'))
+
+
+def etag(schema, document, hash, variables, nom_operation):
+    """ETag fort de la réponse, au format d'en-tête (entre guillemets)"""
+    versions = VersionModele.lire(_modeles.obtenir(schema, document, hash))
+    empreinte = hashlib.sha256(json.dumps(
+        [parametre('VERSION'), hash, variables or {}, nom_operation, sorted(versions.items())], sort_keys=True, default=str,
+    ).encode('utf-8')).hexdigest()
+    return f'"{empreinte}"'
+
+
+def cache_control(nom_operation):
+    max_age = parametre('MAX_AGE').get(nom_operation, parametre('MAX_AGE_DEFAUT'))
+    if max_age > 0:
+        return f"{parametre('PORTEE')}, max-age={max_age}"
+    return 'no-cache'
+
+
+def preparer(request, schema, document, hash, variables, nom_operation, operation):
+    """En-têtes de cache de la réponse (gardés dans ``request.cache_http``) ;
+    lève NonModifie si le client les a déjà"""
+    entetes = {
+        'ETag': etag(schema, document, hash, variables, nom_operation),
+        'Cache-Control': cache_control(operation.name.value if operation.name else None),
+    }
+    request.cache_http = entetes
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # Comparaison faible (RFC 9110, 13.1.2) : W/"x" correspond à "x"
+        etags = [valeur.removeprefix('W/') for valeur in parse_etags(if_none_match)]
+        if '*' in etags or entetes['ETag'] in etags:
+            raise NonModifie(entetes)
+    return entetes
+
+
+def appliquer(request, response):
+    """Ajoute les en-têtes de cache préparés à une réponse 200"""
+    entetes = getattr(request, 'cache_http', None)
+    if entetes and response.status_code == 200:
+        for nom, valeur in entetes.items():
+            response[nom] = valeur
+    return response
@@ -0,0 +1,229 @@
+import logging
+import time
+import weakref
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode, FragmentSpreadNode, GraphQLError, GraphQLList, GraphQLObjectType, InlineFragmentNode,
+    IntValueNode, OperationDefinitionNode, ValidationRule, VariableNode, get_named_type, get_nullable_type,
+)
+from graphql.utilities import type_from_ast
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import BudgetClient
+
+logger = logging.getLogger(__name__)
+
+
+def parametre(nom):
+    """Lit un paramètre de GRAPHQL_COUT dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'PROFONDEUR_MAX': 10,
+        'COUT_MAX': 20000,
+        'MULTIPLICATEUR_LISTE': 50,
+        'MULTIPLICATEURS': {},
+        'BUDGET': 200000,
+        'FENETRE': 60,
+        'PROXIES': 0,
+    }
+    return getattr(settings, 'GRAPHQL_COUT', {}).get(nom, defauts[nom])
+
+
+class Analyse:
+    """Profondeur et coût estimé d'une opération, calculés sur le document seul.
+
+    Chaque champ objet coûte 1 (les scalaires sont gratuits), multiplié par le
+    nombre d'éléments attendus pour les listes : ``first``/``last`` pour une
+    connexion (appliqué à ses ``edges``), MULTIPLICATEURS['Type.champ'] s'il
+    est défini, MULTIPLICATEUR_LISTE sinon. Un ``first: $variable`` compte
+    pour la valeur par défaut de la variable, ou la taille de page maximale.
+    Les champs d'introspection (``__schema``...) ne sont pas comptés.
+    """
+
+    def __init__(self, schema, document, operation):
+        self.schema = schema
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions if not isinstance(definition, OperationDefinitionNode)
+        }
+        self.variables = {
+            definition.variable.name.value: definition.default_value
+            for definition in operation.variable_definitions or ()
+        }
+        self.profondeur = 0
+        racine = schema.get_root_type(operation.operation)
+        self.cout = self._selection(racine, operation.selection_set, 1, set()) if racine else 0
+
+    def _selection(self, type_parent, selection_set, profondeur, fragments_vus, pagination=None):
+        cout = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cout += self._champ(type_parent, selection, profondeur, fragments_vus, pagination)
+            elif isinstance(selection, InlineFragmentNode):
+                type_fragment = (
+                    type_from_ast(self.schema, selection.type_condition) if selection.type_condition else type_parent
+                )
+                cout += self._selection(type_fragment or type_parent, selection.selection_set,
+                                        profondeur, fragments_vus, pagination)
+            elif isinstance(selection, FragmentSpreadNode):
+                nom = selection.name.value
+                fragment = self.fragments.get(nom)
+                if fragment is None or nom in fragments_vus:
+                    continue
+                type_fragment = type_from_ast(self.schema, fragment.type_condition)
+                cout += self._selection(type_fragment or type_parent, fragment.selection_set,
+                                        profondeur, fragments_vus | {nom}, pagination)
+        return cout
+
+    def _champ(self, type_parent, noeud, profondeur, fragments_vus, pagination):
+        nom = noeud.name.value
+        if nom.startswith('__') or not isinstance(type_parent, GraphQLObjectType):
+            return 0
+        definition = type_parent.fields.get(nom)
+        if definition is None:
+            return 0
+
+        self.profondeur = max(self.profondeur, profondeur)
+        type_champ = get_named_type(definition.type)
+        if noeud.selection_set is None:
+            return 0
+
+        taille_page = self._taille_page(noeud, definition)
+        multiplicateur = 1
+        if isinstance(get_nullable_type(definition.type), GraphQLList):
+            if nom == 'edges' and pagination is not None:
+                multiplicateur = pagination
+            else:
+                multiplicateur = parametre('MULTIPLICATEURS').get(
+                    f"{type_parent.name}.{nom}", parametre('MULTIPLICATEUR_LISTE')
+                )
+        enfants = self._selection(type_champ, noeud.selection_set, profondeur + 1, fragments_vus, taille_page)
+        return multiplicateur * (1 + enfants)
+
+    def _taille_page(self, noeud, definition):
+        """Nombre d'éléments demandés par ``first``/``last``, ou None hors connexion"""
+        taille = None
+        limite_max = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or parametre('MULTIPLICATEUR_LISTE')
+        for argument in noeud.arguments or ():
+            if argument.name.value not in ('first', 'last'):
+                continue
+            valeur = argument.value
+            if isinstance(valeur, VariableNode):
+                valeur = self.variables.get(valeur.name.value)
+            valeur = int(valeur.value) if isinstance(valeur, IntValueNode) else limite_max
+            taille = max(taille or 0, min(valeur, limite_max))
+        if taille is None and 'first' in definition.args:
+            # Connexion sans first/last : la pagination applique la limite maximale
+            taille = limite_max
+        return taille
+
+
+_analyses = weakref.WeakKeyDictionary()
+
+
+def analyser(schema, document, operation):
+    """Analyse de ``operation`` (OperationDefinitionNode), mémorisée avec le document"""
+    analyses = _analyses.setdefault(document, {})
+    analyse = analyses.get(id(operation))
+    if analyse is None:
+        analyse = analyses[id(operation)] = Analyse(schema, document, operation)
+    return analyse
+
+
+class LimiteCout(ValidationRule):
+    """Règle de validation qui refuse les opérations trop profondes ou trop coûteuses.
+
+    Comme les autres règles, elle n'est exécutée qu'une fois par document grâce
+    au DocumentCache de la vue.
+    """
+
+    def enter_operation_definition(self, node, *args):
+        analyse = analyser(self.context.schema, self.context.document, node)
+        nom = node.name.value if node.name else "anonyme"
+        profondeur_max = parametre('PROFONDEUR_MAX')
+        cout_max = parametre('COUT_MAX')
+        if profondeur_max and analyse.profondeur > profondeur_max:
+            self.report_error(GraphQLError(
+                f"Opération {nom} trop profonde : profondeur {analyse.profondeur} (maximum {profondeur_max})",
+                node, extensions={'code': 'PROFONDEUR_MAX', 'profondeur': analyse.profondeur, 'cout': analyse.cout},
+            ))
+        if cout_max and analyse.cout > cout_max:
+            self.report_error(GraphQLError(
+                f"Opération {nom} trop coûteuse : coût estimé {analyse.cout} (maximum {cout_max})",
+                node, extensions={'code': 'COUT_MAX', 'profondeur': analyse.profondeur, 'cout': analyse.cout},
+            ))
+
+
+class BudgetDepasse(GraphQLError):
+    def __init__(self, cout, consomme, budget, attente):
+        super().__init__(
+            f"Budget de coût dépassé : {consomme} + {cout} sur un budget de {budget}, réessayer dans {attente} s",
+            extensions={'code': 'BUDGET_DEPASSE', 'cout': cout, 'consomme': consomme,
+                        'budget': budget, 'reessayer_dans': attente},
+        )
+
+
+def adresse_client(request):
+    """Adresse IP du client. Derrière PROXIES proxys de confiance, c'est la dernière
+    adresse de X-Forwarded-For qu'ils n'ont pas ajoutée eux-mêmes : celles d'avant
+    viennent du client et peuvent être fausses."""
+    proxies = parametre('PROXIES')
+    adresses = [adresse.strip() for adresse in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if adresse.strip()]
+    if proxies and len(adresses) >= proxies:
+        return adresses[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identifiant_client(request):
+    """Utilisateur connecté si possible, adresse IP sinon"""
+    claims = getattr(request, 'jwt', None)
+    if claims and api_settings.USER_ID_CLAIM in claims:
+        return f"user:{claims[api_settings.USER_ID_CLAIM]}"
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{adresse_client(request)}"
+
+
+_derniere_purge = None
+
+
+def _purger(numero):
+    """Supprime les compteurs des fenêtres passées, une fois par fenêtre et par processus"""
+    global _derniere_purge
+    if _derniere_purge != numero:
+        _derniere_purge = numero
+        BudgetClient.objects.filter(fenetre__lt=numero).delete()
+
+
+def consommer_budget(client, cout):
+    """Décompte ``cout`` du budget de ``client`` sur la fenêtre en cours.
+
+    Fenêtre fixe de FENETRE secondes, comptée dans la table BudgetClient : le
+    budget est commun aux workers qui partagent la base (ceux d'un pod), pas
+    aux réplicas, qui ont chacun la leur. Une opération refusée n'est pas
+    décomptée. Si la base est indisponible ou verrouillée, l'opération passe
+    sans être décomptée.
+    """
+    budget = parametre('BUDGET')
+    if not budget or not cout:
+        return
+    fenetre = parametre('FENETRE')
+    maintenant = int(time.time())
+    numero = maintenant // fenetre
+    cle = f"{client}:{numero}"
+    try:
+        # Dans une transaction, une erreur n'annule que ce point de sauvegarde
+        with transaction.atomic() if connection.in_atomic_block else nullcontext():
+            _purger(numero)
+            consomme = BudgetClient.consommer(cle, numero, cout)
+            if consomme > budget:
+                BudgetClient.consommer(cle, numero, -cout)
+    except DatabaseError:
+        logger.warning("Budget de coût de %s non décompté", client, exc_info=True)
+        return
+    if consomme > budget:
+        raise BudgetDepasse(cout, consomme - cout, budget, fenetre - maintenant % fenetre)
@@ -1,6 +1,8 @@
+import graphene
 from graphene_django import DjangoObjectType
 from django.contrib.auth.models import User
-from .models import Compagnie_Assurance, Historique, Information, Notification, Utilisateur
+from .models import Compagnie_Assurance, Historique, Information, Notification, StatistiqueCompagnie, StatistiqueJour, Utilisateur
+from .pagination import CountableConnection
 
 
 class UserType(DjangoObjectType):
@@ -23,6 +25,15 @@ class HistoriqueType(DjangoObjectType):
         model = Historique
         fields = "__all__"
 
+class HistoriqueArchiveType(graphene.ObjectType):
+    """Entrée d'historique lue dans les archives (data_info/historique.py)"""
+    historique_id = graphene.Int()
+    date = graphene.DateTime()
+    type_action = graphene.String()
+    description = graphene.String()
+    mois = graphene.Int()
+    notifications = graphene.List(graphene.Int, description="Identifiants des notifications liées au moment de l'archivage")
+
 class NotificationType(DjangoObjectType):
     class Meta:
         model = Notification
@@ -32,3 +43,65 @@ class CompagnieAssuranceType(DjangoObjectType):
     class Meta:
         model = Compagnie_Assurance
         fields = "__all__"
+
+class StatistiqueCompagnieType(DjangoObjectType):
+    """Compteurs d'une compagnie ; compagnie est vide pour les informations sans compagnie"""
+    class Meta:
+        model = StatistiqueCompagnie
+        fields = ("confirmees", "en_attente")
+
+    compagnie = graphene.Field(CompagnieAssuranceType)
+
+class StatistiqueJourType(DjangoObjectType):
+    class Meta:
+        model = StatistiqueJour
+        fields = "__all__"
+
+    taux_echec = graphene.Float(description="Part des emails abandonnés parmi les emails terminés du jour")
+
+class ChangementStatutType(graphene.ObjectType):
+    """Changement de statut d'une information (subscription informationStatusChanged)"""
+    information = graphene.Field(InformationType)
+    ancien_statut = graphene.Boolean()
+    statut = graphene.Boolean()
+
+class TableauDeBordType(graphene.ObjectType):
+    """Statistiques du tableau de bord (data_info/statistiques.py) ; les totaux d'emails
+    et de notifications portent sur les jours demandés"""
+    compagnies = graphene.List(StatistiqueCompagnieType)
+    jours = graphene.List(StatistiqueJourType)
+    confirmees = graphene.Int()
+    en_attente = graphene.Int()
+    notifications = graphene.Int()
+    emails_envoyes = graphene.Int()
+    emails_echec = graphene.Int()
+    taux_echec = graphene.Float()
+
+
+class UtilisateurConnection(CountableConnection):
+    class Meta:
+        node = UtilisateurType
+
+class InformationConnection(CountableConnection):
+    class Meta:
+        node = InformationType
+
+class HistoriqueConnection(CountableConnection):
+    class Meta:
+        node = HistoriqueType
+
+class NotificationConnection(CountableConnection):
+    class Meta:
+        node = NotificationType
+
+class CompagnieAssuranceConnection(CountableConnection):
+    class Meta:
+        node = CompagnieAssuranceType
+
+class RechercheConnection(CountableConnection):
+    """Résultats de search, du plus pertinent au moins pertinent"""
+    class Meta:
+        node = UtilisateurType
+
+    class Edge:
+        rang = graphene.Float(description="Score de pertinence (bm25), plus grand = plus pertinent")
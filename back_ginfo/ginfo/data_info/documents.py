@@ -0,0 +1,177 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, parse, print_ast
+from graphql.language import REMOVE, Visitor, visit
+from graphql.validation import validate
+
+
+def parametre(nom):
+    """Lit un paramètre de GRAPHQL_DOCUMENTS dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'TAILLE_CACHE': 256,
+        'LISTE_AUTORISEE': False,
+        'FICHIER_OPERATIONS': None,
+        'CACHE_APQ': 'default',
+    }
+    return getattr(settings, 'GRAPHQL_DOCUMENTS', {}).get(nom, defauts[nom])
+
+
+def empreinte(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class _SansTypename(Visitor):
+    def enter_field(self, node, *args):
+        if node.name.value == '__typename':
+            return REMOVE
+
+
+def forme_canonique(query):
+    """Texte normalisé d'un document : mise en forme standard, sans les ``__typename``
+    ajoutés automatiquement par Apollo Client"""
+    return print_ast(visit(parse(query), _SansTypename()))
+
+
+class PersistedQueryNotFound(GraphQLError):
+    def __init__(self):
+        super().__init__("PersistedQueryNotFound", extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'})
+
+
+class OperationNonAutorisee(GraphQLError):
+    def __init__(self, hash):
+        super().__init__(
+            f"Opération non autorisée : le document {hash} n'est pas enregistré",
+            extensions={'code': 'PERSISTED_QUERY_NOT_ALLOWED'}
+        )
+
+
+class DocumentCache:
+    """Cache LRU des documents GraphQL déjà analysés et validés, indexés par sha256.
+
+    Une entrée garde le document et ses erreurs de validation : un document
+    invalide n'est donc ni ré-analysé ni re-validé non plus.
+    """
+
+    def __init__(self, taille=256):
+        self.taille = taille
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtenir(self, schema, query, validation_rules=None, hash=None):
+        """Renvoie (document, erreurs) pour ``query``, en le préparant au premier appel"""
+        cle = (hash or empreinte(query), id(schema))
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                return entree
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            entree = (None, [e])
+        else:
+            erreurs = validate(schema, document, validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+            entree = (document, erreurs)
+
+        with self._verrou:
+            self._entrees[cle] = entree
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+        return entree
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+class OperationsPersistees:
+    """Documents connus par leur seul hash (Automatic Persisted Queries d'Apollo).
+
+    Les opérations enregistrées à l'avance (FICHIER_OPERATIONS, généré par la
+    commande enregistrer_operations) sont toujours disponibles ; celles
+    apprises au fil des requêtes sont gardées dans le cache Django CACHE_APQ,
+    partageable entre workers. En mode liste autorisée, seules les opérations
+    enregistrées à l'avance sont exécutées.
+    """
+
+    prefixe = 'apq:'
+
+    def __init__(self):
+        self._enregistrees = None
+        # Documents reçus en texte complet et reconnus dans la liste autorisée
+        self._verifiees = {}
+
+    @property
+    def enregistrees(self):
+        if self._enregistrees is None:
+            self._enregistrees = charger_operations(parametre('FICHIER_OPERATIONS'))
+        return self._enregistrees
+
+    @property
+    def cache(self):
+        return caches[parametre('CACHE_APQ')]
+
+    def resoudre(self, query, extensions):
+        """Renvoie (query, hash) à exécuter, ou lève une GraphQLError au format APQ"""
+        persistee = (extensions or {}).get('persistedQuery') or {}
+        hash = persistee.get('sha256Hash')
+        liste_autorisee = parametre('LISTE_AUTORISEE')
+
+        if not query:
+            if not hash:
+                return query, None
+            query = self.enregistrees.get(hash) or self._verifiees.get(hash)
+            if query is None and not liste_autorisee:
+                query = self.cache.get(self.prefixe + hash)
+            if query is None:
+                raise PersistedQueryNotFound()
+            return query, hash
+
+        calcule = empreinte(query)
+        if hash and hash != calcule:
+            raise GraphQLError("provided sha does not match query", extensions={'code': 'BAD_REQUEST'})
+        if liste_autorisee:
+            if calcule not in self.enregistrees and calcule not in self._verifiees:
+                try:
+                    autorisee = empreinte(forme_canonique(query)) in self.enregistrees
+                except GraphQLError:
+                    autorisee = False
+                if not autorisee:
+                    raise OperationNonAutorisee(calcule)
+                self._verifiees[calcule] = query
+        elif hash:
+            self.cache.set(self.prefixe + hash, query, None)
+        return query, calcule
+
+
+def charger_operations(chemin):
+    """Charge un fichier JSON {sha256: document} (documents sous forme canonique)"""
+    if not chemin:
+        return {}
+    try:
+        with open(chemin, encoding='utf-8') as fichier:
+            return json.load(fichier)
+    except FileNotFoundError:
+        return {}
+
+
+def lire_extensions(request, data):
+    extensions = request.GET.get('extensions') or data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise GraphQLError("Extensions invalides (JSON attendu)")
+    return extensions or {}
@@ -0,0 +1,214 @@
+"""
+Export en flux des informations et de l'historique (CSV ou NDJSON).
+
+Les lignes sont lues par QuerySet.iterator(chunk_size) et écrites lot par
+lot : la mémoire utilisée dépend de la taille d'un lot, pas du nombre de
+lignes. Les colonnes d'utilisateur et de compagnie sont lues lot par lot,
+par une requête sur les seuls identifiants du lot.
+"""
+
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from .historique import filtrer_periode
+from .models import Compagnie_Assurance, Historique, Information, Utilisateur
+
+
+def parametre(nom):
+    """Lit un paramètre de EXPORT dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'TAILLE_LOT': 2000,
+    }
+    return getattr(settings, 'EXPORT', {}).get(nom, defauts[nom])
+
+
+class ExportInvalide(ValueError):
+    pass
+
+
+# Ressource exportable : modèle, colonnes du modèle dans l'ordre par défaut,
+# et jointures (clé étrangère, modèle lié, {colonne exportée: champ du modèle lié})
+RESSOURCES = {
+    'informations': {
+        'model': Information,
+        'colonnes': [
+            'information_id', 'numero_employe', 'cin', 'numero_assurance', 'adresse', 'statut',
+            'email_notification', 'utilisateur_id', 'compagnie_assurance_id',
+        ],
+        'jointures': [
+            ('utilisateur_id', Utilisateur, {
+                'utilisateur_nom': 'nom', 'utilisateur_prenom': 'prenom', 'utilisateur_email': 'email',
+            }),
+            ('compagnie_assurance_id', Compagnie_Assurance, {
+                'compagnie_nom': 'nom_compagnie', 'compagnie_email': 'email_compagnie',
+            }),
+        ],
+    },
+    'historiques': {
+        'model': Historique,
+        'colonnes': ['historique_id', 'date', 'mois', 'type_action', 'description'],
+        'jointures': [],
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _booleen(valeur, nom):
+    if valeur.lower() in ('1', 'true', 'oui'):
+        return True
+    if valeur.lower() in ('0', 'false', 'non'):
+        return False
+    raise ExportInvalide(f"{nom} attend true ou false, pas « {valeur} »")
+
+
+def _entier(valeur, nom):
+    try:
+        return int(valeur)
+    except ValueError:
+        raise ExportInvalide(f"{nom} attend un identifiant numérique, pas « {valeur} »")
+
+
+def _date(valeur, nom):
+    date = parse_datetime(valeur)
+    if date is None:
+        raise ExportInvalide(f"{nom} attend une date ISO 8601, pas « {valeur} »")
+    return date
+
+
+class Export:
+    """Export d'une ressource, préparé à partir des paramètres de l'URL :
+
+    - ``format`` : csv (défaut) ou ndjson ;
+    - ``colonnes`` : liste séparée par des virgules (défaut : toutes) ;
+    - informations : ``statut``, ``compagnie`` ;
+    - historiques : ``debut``, ``fin`` (ISO 8601, fin exclue), ``type_action``.
+    """
+
+    def __init__(self, nom, parametres):
+        if nom not in RESSOURCES:
+            raise ExportInvalide(f"Ressource inconnue : {nom} (attendu : {', '.join(RESSOURCES)})")
+        self.nom = nom
+        self.ressource = RESSOURCES[nom]
+        self.format = parametres.get('format', 'csv')
+        if self.format not in FORMATS:
+            raise ExportInvalide(f"Format inconnu : {self.format} (attendu : {', '.join(FORMATS)})")
+
+        disponibles = self.ressource['colonnes'] + [
+            nom for _cle, _model, colonnes in self.ressource['jointures'] for nom in colonnes
+        ]
+        if parametres.get('colonnes'):
+            self.colonnes = [nom.strip() for nom in parametres['colonnes'].split(',') if nom.strip()]
+            inconnues = [nom for nom in self.colonnes if nom not in disponibles]
+            if inconnues:
+                raise ExportInvalide(f"Colonnes inconnues : {', '.join(inconnues)} (disponibles : {', '.join(disponibles)})")
+        else:
+            self.colonnes = disponibles
+        self.queryset = self.filtrer(self.ressource['model'].objects.all(), parametres)
+
+    def filtrer(self, queryset, parametres):
+        if self.ressource['model'] is Information:
+            if parametres.get('statut'):
+                queryset = queryset.filter(statut=_booleen(parametres['statut'], 'statut'))
+            if parametres.get('compagnie'):
+                queryset = queryset.filter(compagnie_assurance_id=_entier(parametres['compagnie'], 'compagnie'))
+        else:
+            debut = _date(parametres['debut'], 'debut') if parametres.get('debut') else None
+            fin = _date(parametres['fin'], 'fin') if parametres.get('fin') else None
+            queryset = filtrer_periode(queryset, debut, fin)
+            if parametres.get('type_action'):
+                queryset = queryset.filter(type_action=parametres['type_action'])
+        return queryset.order_by('pk')
+
+    @property
+    def content_type(self):
+        return FORMATS[self.format]
+
+    @property
+    def nom_fichier(self):
+        return f"{self.nom}.{self.format}"
+
+    def lots(self):
+        """Lignes à exporter, par listes de dicts de TAILLE_LOT lignes"""
+        taille_lot = parametre('TAILLE_LOT')
+        jointures = [
+            jointure for jointure in self.ressource['jointures'] if any(nom in self.colonnes for nom in jointure[2])
+        ]
+        lues = [nom for nom in self.ressource['colonnes'] if nom in self.colonnes]
+        lues += [cle for cle, _model, _colonnes in jointures if cle not in lues]
+
+        lot = []
+        for ligne in self.queryset.values(*lues).iterator(chunk_size=taille_lot):
+            lot.append(ligne)
+            if len(lot) >= taille_lot:
+                yield self.joindre(lot, jointures)
+                lot = []
+        if lot:
+            yield self.joindre(lot, jointures)
+
+    def joindre(self, lot, jointures):
+        for cle, model, colonnes in jointures:
+            lies = {
+                pk: dict(zip(colonnes, valeurs))
+                for pk, *valeurs in model.objects
+                .filter(pk__in={ligne[cle] for ligne in lot if ligne[cle] is not None})
+                .values_list('pk', *colonnes.values())
+            }
+            vide = dict.fromkeys(colonnes)
+            for ligne in lot:
+                ligne.update(lies.get(ligne[cle], vide))
+        return lot
+
+    def contenu(self):
+        """Morceaux de texte encodés, un par lot (plus l'en-tête en CSV)"""
+        if self.format == 'csv':
+            tampon = _Tampon()
+            ecrivain = csv.writer(tampon)
+            ecrivain.writerow(self.colonnes)
+            yield tampon.vider()
+            for lot in self.lots():
+                ecrivain.writerows([ligne[nom] for nom in self.colonnes] for ligne in lot)
+                yield tampon.vider()
+        else:
+            for lot in self.lots():
+                yield ''.join(
+                    json.dumps({nom: ligne[nom] for nom in self.colonnes}, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+                    for ligne in lot
+                ).encode('utf-8')
+
+    async def contenu_async(self):
+        """contenu() pour ASGI : chaque lot est produit dans le thread synchrone de Django.
+
+        Sous ASGI, StreamingHttpResponse lit un itérateur synchrone en entier
+        (sync_to_async(list)) avant d'envoyer le premier octet.
+        """
+        iterateur = self.contenu()
+        suivant = sync_to_async(next, thread_sensitive=True)
+        while True:
+            morceau = await suivant(iterateur, None)
+            if morceau is None:
+                return
+            yield morceau
+
+
+class _Tampon:
+    """Destination de csv.writer, vidée à chaque lot"""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, texte):
+        self.morceaux.append(texte)
+
+    def vider(self):
+        texte = ''.join(self.morceaux)
+        self.morceaux = []
+        return texte.encode('utf-8')
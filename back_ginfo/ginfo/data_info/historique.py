@@ -0,0 +1,178 @@
+"""
+Historique par mois : filtre de période et archives des mois clos.
+
+Les entrées restent dans la table tant que leur mois fait partie des
+MOIS_CONSERVES derniers mois. Au-delà, archiver_mois les écrit dans
+``historique-AAAA-MM.ndjson.gz`` (une entrée JSON par ligne) puis les
+supprime de la table ; lire_archives les relit à la demande, fichier par
+fichier, sans les recharger en base.
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Historique, Notification, mois_de
+
+
+def parametre(nom):
+    """Lit un paramètre de HISTORIQUE dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'MOIS_CONSERVES': 12,
+        'REPERTOIRE_ARCHIVES': Path(settings.BASE_DIR) / 'archives' / 'historique',
+        'TAILLE_LOT': 1000,
+    }
+    return getattr(settings, 'HISTORIQUE', {}).get(nom, defauts[nom])
+
+
+def decaler(mois, nombre):
+    """Mois AAAAMM décalé de ``nombre`` mois"""
+    annee, numero = divmod(mois // 100 * 12 + mois % 100 - 1 + nombre, 12)
+    return annee * 100 + numero + 1
+
+
+def _avec_fuseau(date):
+    """Une date sans fuseau est prise dans le fuseau du projet"""
+    if date is not None and timezone.is_naive(date):
+        return timezone.make_aware(date)
+    return date
+
+
+def filtrer_periode(queryset, debut=None, fin=None):
+    """Entrées de ``debut`` (inclus) à ``fin`` (exclu) ; la condition sur ``mois``
+    limite la lecture de l'index aux mois de la période"""
+    debut, fin = _avec_fuseau(debut), _avec_fuseau(fin)
+    if debut is not None:
+        queryset = queryset.filter(mois__gte=mois_de(debut), date__gte=debut)
+    if fin is not None:
+        queryset = queryset.filter(mois__lte=mois_de(fin), date__lt=fin)
+    return queryset
+
+
+def mois_a_archiver(mois_conserves=None, maintenant=None):
+    """Mois encore en table qui sont sortis de la rétention, du plus ancien au plus récent"""
+    if mois_conserves is None:
+        mois_conserves = parametre('MOIS_CONSERVES')
+    limite = decaler(mois_de(maintenant or timezone.now()), -mois_conserves)
+    return list(
+        Historique.objects.filter(mois__lt=limite).order_by('mois').values_list('mois', flat=True).distinct()
+    )
+
+
+def chemin_archive(mois):
+    return Path(parametre('REPERTOIRE_ARCHIVES')) / f"historique-{mois // 100:04d}-{mois % 100:02d}.ndjson.gz"
+
+
+_NOM_ARCHIVE = re.compile(r'^historique-(\d{4})-(\d{2})\.ndjson\.gz$')
+
+
+def mois_archives():
+    """Mois dont une archive existe, dans l'ordre"""
+    repertoire = Path(parametre('REPERTOIRE_ARCHIVES'))
+    if not repertoire.is_dir():
+        return []
+    trouves = (_NOM_ARCHIVE.match(nom) for nom in os.listdir(repertoire))
+    return sorted(int(m.group(1)) * 100 + int(m.group(2)) for m in trouves if m)
+
+
+def _lire(chemin):
+    with gzip.open(chemin, 'rt', encoding='utf-8') as fichier:
+        for ligne in fichier:
+            if ligne.strip():
+                yield json.loads(ligne)
+
+
+def _par_lots(iterable, taille):
+    lot = []
+    for element in iterable:
+        lot.append(element)
+        if len(lot) >= taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def archiver_mois(mois):
+    """Ajoute les entrées de ``mois`` à son archive puis les supprime de la table.
+
+    L'archive est réécrite à côté puis remplacée d'un coup (os.replace) : un
+    arrêt en cours de route laisse l'ancienne archive intacte. Les entrées
+    déjà présentes dans l'archive (suppression interrompue) ne sont pas
+    réécrites. Renvoie (entrées archivées, entrées supprimées).
+    """
+    taille_lot = parametre('TAILLE_LOT')
+    chemin = chemin_archive(mois)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    deja_archivees = {entree['historique_id'] for entree in _lire(chemin)} if chemin.exists() else set()
+
+    lignes = (
+        Historique.objects.filter(mois=mois).order_by('pk')
+        .values('historique_id', 'date', 'type_action', 'description', 'mois')
+        .iterator(chunk_size=taille_lot)
+    )
+    ids, archivees = [], 0
+    temporaire = chemin.with_name(chemin.name + '.tmp')
+    with open(temporaire, 'wb') as sortie:
+        if chemin.exists():
+            # Un fichier gzip peut enchaîner plusieurs membres : l'ancien contenu est recopié tel quel
+            with open(chemin, 'rb') as ancienne:
+                shutil.copyfileobj(ancienne, sortie)
+        with gzip.GzipFile(fileobj=sortie, mode='wb') as archive:
+            for lot in _par_lots(lignes, taille_lot):
+                notifications = {}
+                for historique_id, notification_id in Notification.objects.filter(
+                    historique_id__in=[ligne['historique_id'] for ligne in lot]
+                ).values_list('historique_id', 'pk'):
+                    notifications.setdefault(historique_id, []).append(notification_id)
+                for ligne in lot:
+                    ids.append(ligne['historique_id'])
+                    if ligne['historique_id'] in deja_archivees:
+                        continue
+                    ligne['date'] = ligne['date'].isoformat()
+                    ligne['notifications'] = notifications.get(ligne['historique_id'], [])
+                    archive.write((json.dumps(ligne, ensure_ascii=False) + '\n').encode('utf-8'))
+                    archivees += 1
+        sortie.flush()
+        os.fsync(sortie.fileno())
+    os.replace(temporaire, chemin)
+
+    supprimees = 0
+    for debut in range(0, len(ids), taille_lot):
+        with transaction.atomic():
+            # Les notifications gardent leur ligne, sans historique (SET_NULL)
+            supprimees += Historique.objects.filter(pk__in=ids[debut:debut + taille_lot]).delete()[1].get(
+                Historique._meta.label, 0
+            )
+    return archivees, supprimees
+
+
+def lire_archives(debut=None, fin=None, type_action=None):
+    """Entrées archivées de ``debut`` (inclus) à ``fin`` (exclu), dans l'ordre des archives.
+
+    Seules les archives des mois de la période sont ouvertes, et lues ligne
+    à ligne : la mémoire utilisée ne dépend pas de leur taille.
+    """
+    debut, fin = _avec_fuseau(debut), _avec_fuseau(fin)
+    premier = mois_de(debut) if debut is not None else None
+    dernier = mois_de(fin) if fin is not None else None
+    for mois in mois_archives():
+        if (premier is not None and mois < premier) or (dernier is not None and mois > dernier):
+            continue
+        for entree in _lire(chemin_archive(mois)):
+            entree['date'] = datetime.fromisoformat(entree['date'])
+            if debut is not None and entree['date'] < debut:
+                continue
+            if fin is not None and entree['date'] >= fin:
+                continue
+            if type_action is not None and entree['type_action'] != type_action:
+                continue
+            yield entree
@@ -0,0 +1,202 @@
+import codecs
+import csv
+import json
+import time
+
+from django.db import IntegrityError, transaction
+
+from .models import Compagnie_Assurance, Information, StatistiqueCompagnie, Utilisateur, VersionModele
+from .recherche import indexer
+
+CHAMPS_TEXTE = ('numero_employe', 'adresse', 'numero_assurance', 'cin', 'email_notification')
+VALEURS_VRAIES = ('1', 'true', 'vrai', 'oui', 'yes', 'o', 'y')
+MAX_ERREURS_CONSERVEES = 100
+
+
+def texte(valeur):
+    """Valeur d'un champ texte : un nombre JSON devient du texte, une valeur vide None"""
+    if valeur is None:
+        return None
+    return str(valeur).strip() or None
+
+
+def detecter_format(nom_fichier, format=None):
+    if format:
+        return format.lower()
+    return 'jsonl' if nom_fichier.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def lire_lignes(lignes_texte, format):
+    """Itère sur les lignes d'un fichier CSV (avec en-tête) ou JSONL sans le charger en mémoire"""
+    if format == 'csv':
+        yield from csv.DictReader(lignes_texte)
+    elif format == 'jsonl':
+        # Le décodage JSON est fait ligne par ligne à la construction, pour rejeter
+        # une ligne invalide sans interrompre l'import
+        for ligne in lignes_texte:
+            ligne = ligne.strip()
+            if ligne:
+                yield ligne
+    else:
+        raise ValueError(f"Format d'import inconnu : {format}")
+
+
+def decoder(fichier_binaire, encodage='utf-8-sig'):
+    """Décode à la volée un fichier ouvert en binaire (ou un fichier uploadé)"""
+    return codecs.iterdecode(fichier_binaire, encodage)
+
+
+class ImportateurInformations:
+    """Import en flux de lignes Information, écrites par lots avec bulk_create.
+
+    Les utilisateurs et compagnies sont chargés une fois dans des dictionnaires,
+    seul le lot en cours est gardé en mémoire. Les notifications des lignes
+    importées avec ``statut`` vrai sont générées par lot elles aussi. Une ligne
+    dont le cin ou le numero_employe est déjà pris (en base, ou par une ligne
+    précédente du fichier) est rejetée, comme une ligne refusée par une
+    contrainte de la base au moment de l'écriture.
+    """
+
+    def __init__(self, taille_lot=1000, simulation=False, progression=None):
+        self.taille_lot = taille_lot
+        self.simulation = simulation
+        self.progression = progression
+        self.utilisateurs = {
+            u.pk: u for u in Utilisateur.objects.only('utilisateur_id', 'nom', 'prenom')
+        }
+        self.compagnies = {
+            c.pk: c for c in Compagnie_Assurance.objects.only('compagnie_id', 'nom_compagnie', 'email_compagnie')
+        }
+        self.lues = 0
+        self.importees = 0
+        self.rejetees = 0
+        self.notifiees = 0
+        self.erreurs = []
+        self.debut = None
+        # En simulation rien n'est écrit : les clés des lots précédents sont retenues ici
+        self.cles_simulees = {champ: set() for champ in Information.CLES}
+
+    def importer(self, lignes):
+        self.debut = time.monotonic()
+        lot = []
+        for numero, ligne in enumerate(lignes, start=1):
+            self.lues += 1
+            try:
+                lot.append((numero, self.construire(ligne)))
+            except (KeyError, ValueError, TypeError) as e:
+                self.rejeter(numero, e)
+            if len(lot) >= self.taille_lot:
+                self.ecrire(lot)
+                lot = []
+        if lot:
+            self.ecrire(lot)
+        return self.rapport()
+
+    def construire(self, ligne):
+        if isinstance(ligne, str):
+            ligne = json.loads(ligne)
+        try:
+            utilisateur = self.utilisateurs[int(ligne['utilisateur_id'])]
+        except KeyError:
+            raise ValueError(f"utilisateur {ligne.get('utilisateur_id')} inexistant")
+        try:
+            compagnie = self.compagnies[int(ligne['compagnie_id'])]
+        except KeyError:
+            raise ValueError(f"compagnie {ligne.get('compagnie_id')} inexistante")
+
+        statut = ligne.get('statut')
+        if isinstance(statut, str):
+            statut = statut.strip().lower() in VALEURS_VRAIES
+
+        information = Information(
+            utilisateur=utilisateur,
+            compagnie_assurance=compagnie,
+            statut=bool(statut),
+            **{champ: texte(ligne.get(champ)) for champ in CHAMPS_TEXTE}
+        )
+        return information
+
+    def ecrire(self, lot):
+        """Écrit le lot [(numéro de ligne, information)] ; la vérification des clés et
+        l'écriture sont dans la même transaction"""
+        if self.simulation:
+            lot = self.sans_doublons(lot)
+        else:
+            with transaction.atomic():
+                lot = self.sans_doublons(lot)
+                try:
+                    with transaction.atomic():
+                        self.enregistrer([information for _numero, information in lot])
+                except IntegrityError:
+                    # Conflit que la vérification n'a pas vu (écriture concurrente) : le lot
+                    # est repris ligne par ligne pour ne rejeter que les lignes en cause
+                    lot = [
+                        (numero, information) for numero, information in lot
+                        if self.enregistrer_ligne(numero, information)
+                    ]
+            self.notifiees += sum(1 for _numero, information in lot if information.statut)
+        self.importees += len(lot)
+        if self.progression:
+            self.progression(self.rapport())
+
+    def enregistrer(self, informations):
+        Information.objects.bulk_create(informations)
+        VersionModele.incrementer(Information)
+        indexer({information.utilisateur_id for information in informations})
+        StatistiqueCompagnie.compter_informations(informations)
+        Information.generer_notifications([information for information in informations if information.statut])
+
+    def enregistrer_ligne(self, numero, information):
+        """Écrit une seule information ; False (ligne rejetée) si la base la refuse"""
+        # bulk_create a pu poser une clé primaire avant l'annulation du lot
+        information.pk = None
+        information._state.adding = True
+        try:
+            with transaction.atomic():
+                self.enregistrer([information])
+        except IntegrityError as e:
+            self.rejeter(numero, f"refusée par la base ({e})")
+            return False
+        return True
+
+    def sans_doublons(self, lot):
+        """Lignes du lot, sans celles (rejetées) dont une clé unique est déjà prise"""
+        prises = {}
+        for champ in Information.CLES:
+            valeurs = {getattr(information, champ) for _numero, information in lot} - {None}
+            prises[champ] = self.cles_simulees[champ] | set(
+                Information.objects.filter(**{f'{champ}__in': valeurs}).values_list(champ, flat=True)
+            ) if valeurs else set()
+        informations = []
+        for numero, information in lot:
+            doublon = next(
+                (champ for champ in Information.CLES if getattr(information, champ) in prises[champ]), None
+            )
+            if doublon:
+                self.rejeter(numero, f"{doublon} « {getattr(information, doublon)} » déjà utilisé")
+                continue
+            for champ in Information.CLES:
+                if getattr(information, champ) is not None:
+                    prises[champ].add(getattr(information, champ))
+                    if self.simulation:
+                        self.cles_simulees[champ].add(getattr(information, champ))
+            informations.append((numero, information))
+        return informations
+
+    def rejeter(self, numero, erreur):
+        self.rejetees += 1
+        if len(self.erreurs) < MAX_ERREURS_CONSERVEES:
+            self.erreurs.append(f"Ligne {numero} : {erreur}")
+
+    def rapport(self):
+        duree = time.monotonic() - self.debut if self.debut else 0
+        return {
+            'lues': self.lues,
+            'importees': self.importees,
+            'rejetees': self.rejetees,
+            'notifiees': self.notifiees,
+            'duree': duree,
+            'debit': self.lues / duree if duree else 0,
+            'simulation': self.simulation,
+            'erreurs': self.erreurs,
+        }
@@ -21,6 +21,24 @@ class InformationInput(graphene.InputObjectType):
     statut = graphene.Boolean(required=True)
     email_notification = graphene.String()
 
+class InformationPatchInput(graphene.InputObjectType):
+    """Champs appliqués à toutes les informations d'updateInformations (absents : inchangés)"""
+    compagnie_id = graphene.ID()
+    adresse = graphene.String()
+    numero_assurance = graphene.String()
+    statut = graphene.Boolean()
+    email_notification = graphene.String()
+
+class InformationFiltreInput(graphene.InputObjectType):
+    compagnie_id = graphene.ID()
+    utilisateur_id = graphene.ID()
+    statut = graphene.Boolean()
+
+class CleInformation(graphene.Enum):
+    """Champ qui identifie une information dans upsertInformations"""
+    CIN = 'cin'
+    NUMERO_EMPLOYE = 'numero_employe'
+
 class HistoriqueInput(graphene.InputObjectType):
     historique_id = graphene.Int(required=True)
     type_action = graphene.String()
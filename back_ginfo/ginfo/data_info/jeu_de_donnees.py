@@ -0,0 +1,119 @@
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import (
+    Compagnie_Assurance, Historique, Information, Notification, StatistiqueCompagnie, StatistiqueJour, Utilisateur,
+    VersionModele,
+)
+from . import statistiques
+from .recherche import reconstruire
+
+
+def generer(nb_utilisateurs, nb_informations, nb_historiques, nb_compagnies=50, taille_lot=5000, graine=42, progression=None):
+    """Remplit la base avec un jeu de données synthétique (benchmarks, tests de charge).
+
+    Une Notification est créée pour chaque information confirmée tant qu'il reste
+    des historiques à créer ; les historiques restants sont des actions seules.
+    Les mots de passe sont inutilisables (pas de hachage, pas de connexion possible).
+    """
+    aleatoire = random.Random(graine)
+
+    def par_lots(iterable):
+        lot = []
+        for element in iterable:
+            lot.append(element)
+            if len(lot) >= taille_lot:
+                yield lot
+                lot = []
+        if lot:
+            yield lot
+
+    with transaction.atomic():
+        compagnies = Compagnie_Assurance.objects.bulk_create([
+            Compagnie_Assurance(
+                nom_compagnie=f"Compagnie {i}",
+                adresse_compagnie=f"{i} rue de l'Assurance",
+                email_compagnie=f"compagnie{i}@example.com",
+            )
+            for i in range(nb_compagnies)
+        ])
+    ids_compagnies = [c.pk for c in compagnies]
+
+    ids_utilisateurs = []
+    for lot in par_lots(range(nb_utilisateurs)):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f"bench{i}", email=f"bench{i}@example.com", password='!', first_name=f"Prenom{i}", last_name=f"Nom{i}")
+                for i in lot
+            ])
+            utilisateurs = Utilisateur.objects.bulk_create([
+                Utilisateur(user=user, nom=user.last_name, prenom=user.first_name, email=user.email, role="employe", mot_de_passe='!')
+                for user in users
+            ])
+        ids_utilisateurs.extend(u.pk for u in utilisateurs)
+        if progression:
+            progression('utilisateurs', len(ids_utilisateurs))
+
+    historiques_restants = nb_historiques
+    nb_crees = 0
+    for lot in par_lots(range(nb_informations)):
+        with transaction.atomic():
+            informations = Information.objects.bulk_create([
+                Information(
+                    utilisateur_id=aleatoire.choice(ids_utilisateurs),
+                    compagnie_assurance_id=aleatoire.choice(ids_compagnies),
+                    numero_employe=f"EMP-{i:07d}",
+                    adresse=f"Lot {i} Antananarivo",
+                    numero_assurance=f"ASS-{i:07d}",
+                    cin=f"{100000000000 + i}",
+                    statut=aleatoire.random() < 0.6,
+                    email_notification=f"rh{i % 100}@example.com",
+                )
+                for i in lot
+            ])
+            confirmees = [information for information in informations if information.statut][:historiques_restants]
+            historiques = Historique.objects.bulk_create([
+                Historique(type_action="envoye", description=f"Information {information.pk} confirmée")
+                for information in confirmees
+            ])
+            Notification.objects.bulk_create([
+                Notification(
+                    historique=historique,
+                    information=information,
+                    objet="Confirmation d'information",
+                    contenu=f"L'information {information.pk} a été confirmée",
+                    expediteur="Système",
+                    destinataire=information.email_notification,
+                    statut=True,
+                )
+                for information, historique in zip(confirmees, historiques)
+            ])
+        historiques_restants -= len(historiques)
+        nb_crees += len(informations)
+        if progression:
+            progression('informations', nb_crees)
+
+    nb_crees = nb_historiques - historiques_restants
+    for lot in par_lots(range(historiques_restants)):
+        with transaction.atomic():
+            Historique.objects.bulk_create([
+                Historique(
+                    type_action=aleatoire.choice(["email_envoye", "email_echec", "modification"]),
+                    description=f"Action {i}",
+                )
+                for i in lot
+            ])
+        nb_crees += len(lot)
+        if progression:
+            progression('historiques', nb_crees)
+
+    # Les bulk_create ne passent pas par les signaux : index de recherche et statistiques refaits d'un coup
+    with transaction.atomic():
+        reconstruire()
+        statistiques.reconstruire()
+        VersionModele.incrementer(
+            User, Utilisateur, Compagnie_Assurance, Information, Historique, Notification,
+            StatistiqueCompagnie, StatistiqueJour,
+        )
@@ -0,0 +1,141 @@
+import asyncio
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import prefetch_related_objects
+from django.db.models.query import QuerySet
+from graphene.utils.str_converters import to_snake_case
+
+
+class RelationLoader:
+    """Chargeur de relations par requête HTTP (DataLoader synchrone).
+
+    Les instances renvoyées ensemble par un resolver forment un groupe de
+    « frères ». Lorsqu'une relation (FK, FK inverse ou M2M) est demandée sur
+    l'une d'elles, elle est chargée pour tout le groupe en une seule requête
+    ``IN (...)``. Les objets liés obtenus forment à leur tour un groupe, ce qui
+    donne une requête par relation et par niveau de la sélection.
+    """
+
+    def __init__(self):
+        self._groupes = {}
+        self._charges = set()
+        self._taches = {}
+        self.lots = 0
+
+    def enregistrer(self, instances):
+        """Enregistre une liste d'instances comme un groupe de frères"""
+        groupe = [obj for obj in instances if isinstance(obj, models.Model)]
+        if not groupe:
+            return
+        for obj in groupe:
+            # Une instance garde le premier groupe (le plus large) qui l'a vue
+            self._groupes.setdefault(id(obj), groupe)
+
+    def groupe(self, instance):
+        groupe = self._groupes.get(id(instance))
+        if groupe is None:
+            groupe = [instance]
+            self._groupes[id(instance)] = groupe
+        return groupe
+
+    def charger(self, instance, relation):
+        """Charge ``relation`` pour tout le groupe de ``instance`` et renvoie la valeur pour ``instance``"""
+        groupe = self.groupe(instance)
+        cle = (id(groupe), relation)
+        if cle not in self._charges:
+            self._charges.add(cle)
+            self._charger_groupe(groupe, relation)
+        return getattr(instance, relation)
+
+    async def charger_async(self, instance, relation, executer):
+        """Variante asynchrone de ``charger`` : le lot est chargé par ``executer``
+        (un thread du pool) et attendu par toutes les instances du groupe.
+
+        Les lots de relations différentes s'exécutent en parallèle.
+        """
+        groupe = self.groupe(instance)
+        cle = (id(groupe), relation)
+        tache = self._taches.get(cle)
+        if tache is None:
+            if cle in self._charges:
+                return getattr(instance, relation)
+            self._charges.add(cle)
+            for obj in groupe:
+                # Caches créés ici plutôt que par des threads concurrents
+                obj._state.fields_cache
+                obj.__dict__.setdefault('_prefetched_objects_cache', {})
+            tache = self._taches[cle] = asyncio.ensure_future(executer(self._charger_groupe, groupe, relation))
+        await tache
+        return getattr(instance, relation)
+
+    def _charger_groupe(self, groupe, relation):
+        prefetch_related_objects(groupe, relation)
+        self.lots += 1
+        self.enregistrer(self._objets_lies(groupe, relation))
+
+    @staticmethod
+    def _objets_lies(groupe, relation):
+        lies = {}
+        for obj in groupe:
+            valeur = getattr(obj, relation, None)
+            if isinstance(valeur, models.Model):
+                valeur = [valeur]
+            elif valeur is not None and hasattr(valeur, 'all'):
+                valeur = valeur.all()
+            else:
+                valeur = []
+            for lie in valeur:
+                lies.setdefault(id(lie), lie)
+        return list(lies.values())
+
+
+def relation_du_champ(instance, field_name):
+    """Renvoie le nom de la relation Django exposée par le champ GraphQL, ou None"""
+    nom = to_snake_case(field_name)
+    try:
+        field = instance._meta.get_field(nom)
+    except FieldDoesNotExist:
+        return None
+    if not field.is_relation:
+        return None
+    if field.auto_created and not field.concrete:
+        # Relation inverse : on passe par le nom d'accès (related_name)
+        return nom if field.get_accessor_name() == nom else None
+    return nom
+
+
+def get_loader(context):
+    """Renvoie le chargeur attaché au contexte GraphQL, en le créant si besoin"""
+    if context is None:
+        return None
+    loader = getattr(context, 'loaders', None)
+    if loader is None:
+        try:
+            loader = context.loaders = RelationLoader()
+        except AttributeError:
+            return None
+    return loader
+
+
+class LoaderMiddleware:
+    """Middleware graphene qui fait passer toutes les relations par le RelationLoader du contexte"""
+
+    def resolve(self, next, root, info, **args):
+        loader = get_loader(info.context)
+        if loader is None:
+            return next(root, info, **args)
+
+        if isinstance(root, models.Model):
+            relation = relation_du_champ(root, info.field_name)
+            if relation is not None:
+                loader.charger(root, relation)
+
+        result = next(root, info, **args)
+
+        if isinstance(result, QuerySet):
+            result = list(result)
+            loader.enregistrer(result)
+        elif isinstance(result, list):
+            loader.enregistrer(result)
+        return result
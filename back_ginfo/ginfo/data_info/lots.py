@@ -0,0 +1,107 @@
+"""
+Lots d'opérations GraphQL : un tableau JSON d'opérations en un seul POST.
+
+Les opérations d'un lot s'exécutent dans l'ordre, dans une seule transaction
+(un seul commit), avec le même chargeur de relations. Chaque opération a son
+point de sauvegarde : une opération en erreur est annulée seule et les
+suivantes s'exécutent. Options, en paramètres de l'URL :
+
+- ``tout_ou_rien=true`` : à la première opération en erreur, tout le lot
+  est annulé et les opérations suivantes ne sont pas exécutées ;
+- ``par_operation=true`` : la réponse est un tableau, un résultat par
+  opération (``data``, ``errors``, ``id``, ``status``). Sans cette option, les
+  champs racine de toutes les opérations sont réunis dans un seul ``data`` et
+  les erreurs portent le rang de leur opération (``extensions.operation``).
+"""
+
+import json
+
+from django.conf import settings
+
+
+def parametre(nom):
+    """Lit un paramètre de GRAPHQL_LOTS dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'TAILLE_MAX': 20,
+    }
+    return getattr(settings, 'GRAPHQL_LOTS', {}).get(nom, defauts[nom])
+
+
+class LotInvalide(ValueError):
+    pass
+
+
+def est_un_lot(request):
+    """Corps JSON dont le premier caractère ouvre un tableau"""
+    return (
+        request.method == 'POST'
+        and request.content_type == 'application/json'
+        and request.body.lstrip()[:1] == b'['
+    )
+
+
+def _option(parametres, nom):
+    valeur = parametres.get(nom, '')
+    if valeur.lower() in ('', '0', 'false', 'non'):
+        return False
+    if valeur.lower() in ('1', 'true', 'oui'):
+        return True
+    raise LotInvalide(f"{nom} attend true ou false, pas « {valeur} »")
+
+
+class Lot:
+    """Opérations d'un lot et ses options, lues depuis le corps et l'URL de la requête"""
+
+    def __init__(self, entrees, parametres):
+        if not isinstance(entrees, list) or not entrees:
+            raise LotInvalide("Un lot est un tableau JSON non vide d'opérations")
+        if len(entrees) > parametre('TAILLE_MAX'):
+            raise LotInvalide(f"Lot de {len(entrees)} opérations : {parametre('TAILLE_MAX')} au plus")
+        if not all(isinstance(entree, dict) for entree in entrees):
+            raise LotInvalide("Chaque opération du lot doit être un objet JSON")
+        self.entrees = entrees
+        self.tout_ou_rien = _option(parametres, 'tout_ou_rien')
+        self.par_operation = _option(parametres, 'par_operation')
+
+    @classmethod
+    def depuis_requete(cls, request):
+        try:
+            entrees = json.loads(request.body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            raise LotInvalide("POST body sent invalid JSON.")
+        return cls(entrees, request.GET)
+
+
+def annuler(resultats, echec):
+    """tout_ou_rien : signale l'annulation sur chaque résultat [(résultat, code HTTP)]
+    autre que celui de l'opération ``echec``, dont l'erreur a tout annulé"""
+    for index, (resultat, _status) in enumerate(resultats):
+        if index != echec:
+            etat = "annulée" if index < echec else "non exécutée"
+            resultat.setdefault('errors', []).append({
+                'message': f"Opération {etat} : l'opération {echec} du lot a échoué (tout_ou_rien)",
+            })
+
+
+def fusionner(resultats):
+    """Réunit [(résultat, code HTTP)] en un seul résultat : les champs racine dans ``data``,
+    les erreurs marquées du rang de leur opération. Un champ déjà renvoyé par une
+    opération précédente est signalé plutôt qu'écrasé."""
+    data, erreurs, origine = {}, [], {}
+    for index, (resultat, _status) in enumerate(resultats):
+        for erreur in resultat.get('errors') or ():
+            erreurs.append({**erreur, 'extensions': {**(erreur.get('extensions') or {}), 'operation': index}})
+        for cle, valeur in (resultat.get('data') or {}).items():
+            if cle in data:
+                erreurs.append({
+                    'message': f"Le champ « {cle} » est déjà renvoyé par l'opération {origine[cle]} : "
+                               f"utiliser un alias, ou par_operation=true",
+                    'extensions': {'operation': index},
+                })
+                continue
+            data[cle] = valeur
+            origine[cle] = index
+    fusion = {'data': data}
+    if erreurs:
+        fusion['errors'] = erreurs
+    return fusion, max(status for _resultat, status in resultats)
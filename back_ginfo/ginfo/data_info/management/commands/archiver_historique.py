@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from data_info.historique import archiver_mois, chemin_archive, mois_a_archiver
+
+
+class Command(BaseCommand):
+    help = ("Archive les mois d'historique sortis de la rétention dans des fichiers NDJSON compressés "
+            "puis les supprime de la table")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois-conserves', type=int, default=None,
+                            help="Mois gardés en table en plus du mois en cours (défaut : HISTORIQUE['MOIS_CONSERVES'])")
+        parser.add_argument('--simulation', action='store_true',
+                            help="Affiche les mois à archiver sans rien écrire ni supprimer")
+
+    def handle(self, *args, **options):
+        a_archiver = mois_a_archiver(options['mois_conserves'])
+        total_archivees = total_supprimees = 0
+
+        for mois in a_archiver:
+            libelle = f"{mois // 100:04d}-{mois % 100:02d}"
+            if options['simulation']:
+                self.stdout.write(f"{libelle} -> {chemin_archive(mois)}")
+                continue
+            archivees, supprimees = archiver_mois(mois)
+            total_archivees += archivees
+            total_supprimees += supprimees
+            self.stdout.write(f"{libelle} : {archivees} archivée(s), {supprimees} supprimée(s) -> {chemin_archive(mois)}")
+
+        if not options['simulation']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Terminé : {len(a_archiver)} mois, {total_archivees} entrée(s) archivée(s), {total_supprimees} supprimée(s)"
+            ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from graphql import parse
+from graphql.validation import validate
+
+from data_info.documents import DocumentCache, charger_operations, parametre
+from schema_root import schema
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps CPU d'analyse/validation des opérations enregistrées, avec et sans cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fichier', default=parametre('FICHIER_OPERATIONS'),
+                            help="Fichier d'opérations (commande enregistrer_operations)")
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        operations = list(charger_operations(options['fichier']).items())
+        if not operations:
+            self.stderr.write("Aucune opération : lancer d'abord enregistrer_operations")
+            return
+        graphql_schema = schema.graphql_schema
+        iterations = options['iterations']
+
+        debut = time.process_time()
+        for _ in range(iterations):
+            for _, query in operations:
+                validate(graphql_schema, parse(query))
+        sans_cache = time.process_time() - debut
+
+        cache = DocumentCache(len(operations))
+        debut = time.process_time()
+        for _ in range(iterations):
+            for hash, query in operations:
+                cache.obtenir(graphql_schema, query, hash=hash)
+        avec_cache = time.process_time() - debut
+
+        requetes = iterations * len(operations)
+        self.stdout.write(f"{len(operations)} opération(s), {requetes} requête(s) simulée(s)")
+        self.stdout.write(f"Sans cache : {sans_cache / requetes * 1e6:.1f} µs CPU par requête")
+        self.stdout.write(f"Avec cache : {avec_cache / requetes * 1e6:.1f} µs CPU par requête")
+        self.stdout.write(self.style.SUCCESS(
+            f"Gain : {(sans_cache - avec_cache) / requetes * 1e6:.1f} µs CPU par requête"
+        ))
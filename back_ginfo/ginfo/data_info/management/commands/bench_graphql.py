@@ -0,0 +1,230 @@
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql import OperationDefinitionNode, parse
+
+from data_info.documents import charger_operations, parametre
+from data_info.jeu_de_donnees import generer
+from data_info.models import Compagnie_Assurance, Information, Utilisateur
+
+# Variables rejouées pour les opérations du front qui en attendent.
+# Seules les opérations de lecture et les mises à jour idempotentes sont rejouées.
+VARIABLES = {
+    'CompagnieById': lambda ids: {'id': ids['compagnie']},
+    'InformationById': lambda ids: {'id': ids['information']},
+    'UtilisateurById': lambda ids: {'id': ids['utilisateur']},
+    'UpdateInformation': lambda ids: {
+        'id': ids['information'],
+        'informationData': {'utilisateurId': ids['utilisateur'], 'compagnieId': ids['compagnie'],
+                            'statut': True, 'adresse': "Lot bench"},
+    },
+    'UpdateCompagnieAssurance': lambda ids: {
+        'id': ids['compagnie'], 'compagnieData': {'adresseCompagnie': "Adresse bench"},
+    },
+    # Les champs absents de UtilisateurInput valent None et seraient écrits tels quels
+    'UpdateUtilisateur': lambda ids: {
+        'id': ids['utilisateur'],
+        'utilisateurData': {'utilisateurId': ids['utilisateur'], 'nom': ids['nom'], 'prenom': ids['prenom'],
+                            'email': ids['email'], 'role': "employe"},
+    },
+}
+
+
+def identifiants():
+    """Identifiants existants utilisés comme variables des opérations rejouées"""
+    utilisateur = Utilisateur.objects.values('pk', 'nom', 'prenom', 'email').first()
+    return {
+        'utilisateur': utilisateur['pk'],
+        'nom': utilisateur['nom'], 'prenom': utilisateur['prenom'], 'email': utilisateur['email'],
+        'information': Information.objects.values_list('pk', flat=True).first(),
+        'compagnie': Compagnie_Assurance.objects.values_list('pk', flat=True).first(),
+    }
+
+
+def operations_a_rejouer(fichier, filtre=None, mutations=False):
+    """(nom, query) des opérations enregistrées qui peuvent être rejouées telles quelles"""
+    operations = []
+    for query in charger_operations(fichier).values():
+        definition = next(
+            d for d in parse(query).definitions if isinstance(d, OperationDefinitionNode)
+        )
+        nom = definition.name.value if definition.name else None
+        if filtre and nom not in filtre:
+            continue
+        if definition.operation.value == 'mutation' and not (mutations and nom in VARIABLES):
+            continue
+        if definition.variable_definitions and nom not in VARIABLES:
+            continue
+        operations.append((nom, query))
+    return sorted(operations)
+
+
+def centile(valeurs, p):
+    valeurs = sorted(valeurs)
+    if not valeurs:
+        return 0
+    rang = (len(valeurs) - 1) * p / 100
+    bas = int(rang)
+    haut = min(bas + 1, len(valeurs) - 1)
+    return valeurs[bas] + (valeurs[haut] - valeurs[bas]) * (rang - bas)
+
+
+class Command(BaseCommand):
+    help = ("Rejoue les opérations GraphQL du front sur /graphql/ avec des clients concurrents "
+            "et mesure latences, débit, requêtes SQL et mémoire")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base', default=str(Path(settings.BASE_DIR) / 'bench.sqlite3'),
+                            help="Base SQLite dédiée au benchmark (créée et remplie si absente)")
+        parser.add_argument('--regenerer', action='store_true', help="Recrée la base de benchmark")
+        parser.add_argument('--utilisateurs', type=int, default=10000)
+        parser.add_argument('--informations', type=int, default=100000)
+        parser.add_argument('--historiques', type=int, default=500000)
+        parser.add_argument('--operations', default=parametre('FICHIER_OPERATIONS'),
+                            help="Fichier des opérations du front (commande enregistrer_operations)")
+        parser.add_argument('--filtre', nargs='*', default=None, help="Noms des opérations à rejouer")
+        parser.add_argument('--mutations', action='store_true', help="Rejoue aussi les mises à jour idempotentes")
+        parser.add_argument('--clients', type=int, default=4, help="Clients concurrents")
+        parser.add_argument('--requetes', type=int, default=20, help="Requêtes par client et par opération")
+        parser.add_argument('--sortie', default='bench_graphql.json', help="Fichier JSON des résultats")
+        parser.add_argument('--reference', default=None, help="Résultats de référence à comparer")
+        parser.add_argument('--seuil', type=float, default=0.20,
+                            help="Régression tolérée par rapport à la référence (0.20 = +20%%)")
+
+    def handle(self, *args, **options):
+        self.preparer_base(options)
+        operations = operations_a_rejouer(options['operations'], options['filtre'], options['mutations'])
+        if not operations:
+            raise CommandError("Aucune opération à rejouer : lancer d'abord enregistrer_operations")
+
+        ids = identifiants()
+
+        resultats = {}
+        for nom, query in operations:
+            variables = VARIABLES[nom](ids) if nom in VARIABLES else None
+            resultats[nom] = self.mesurer(query, nom, variables, options['clients'], options['requetes'])
+            r = resultats[nom]
+            self.stdout.write(
+                f"{nom:28} p50 {r['p50_ms']:8.1f} ms  p95 {r['p95_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms  "
+                f"{r['debit_rps']:7.1f} req/s  {r['requetes_sql']:5.1f} SQL  {r['memoire_pic_mo']:7.1f} Mo"
+                + (f"  {r['erreurs']} erreur(s)" if r['erreurs'] else "")
+            )
+
+        rapport = {
+            'date': timezone.now().isoformat(),
+            'jeu_de_donnees': {
+                'utilisateurs': Utilisateur.objects.count(),
+                'informations': Information.objects.count(),
+            },
+            'clients': options['clients'],
+            'requetes_par_client': options['requetes'],
+            'operations': resultats,
+        }
+        with open(options['sortie'], 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, indent=2)
+        self.stdout.write(f"Résultats écrits dans {options['sortie']}")
+
+        if options['reference']:
+            self.comparer(resultats, options['reference'], options['seuil'])
+
+    def preparer_base(self, options):
+        base = Path(options['base'])
+        if options['regenerer'] and base.exists():
+            base.unlink()
+        existante = base.exists()
+
+        # Toutes les connexions (y compris celles des threads clients) utilisent la base de benchmark
+        connections['default'].close()
+        connections['default'].settings_dict['NAME'] = str(base)
+        call_command('migrate', verbosity=0)
+
+        if not existante:
+            self.stdout.write(f"Création du jeu de données dans {base}...")
+            generer(
+                options['utilisateurs'], options['informations'], options['historiques'],
+                progression=lambda table, n: self.stdout.write(f"  {table} : {n}"),
+            )
+
+    def mesurer(self, query, nom, variables, nb_clients, nb_requetes):
+        corps = json.dumps({'query': query, 'variables': variables, 'operationName': nom})
+        latences = []
+        requetes_sql = []
+        erreurs = []
+        verrou = threading.Lock()
+
+        def nouveau_client():
+            return Client(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+
+        def client():
+            c = nouveau_client()
+            try:
+                for _ in range(nb_requetes):
+                    with CaptureQueriesContext(connection) as sql:
+                        debut = time.perf_counter()
+                        response = c.post('/graphql/', corps, content_type='application/json')
+                        duree = time.perf_counter() - debut
+                    ok = response.status_code == 200 and 'errors' not in json.loads(response.content)
+                    with verrou:
+                        latences.append(duree)
+                        requetes_sql.append(len(sql.captured_queries))
+                        if not ok:
+                            erreurs.append(response.status_code)
+            finally:
+                connection.close()
+
+        debut = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(nb_clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duree = time.perf_counter() - debut
+
+        # Pic mémoire mesuré sur une requête isolée : tracemalloc ralentit trop
+        # l'exécution pour rester actif pendant la mesure des latences
+        tracemalloc.start()
+        nouveau_client().post('/graphql/', corps, content_type='application/json')
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'p50_ms': centile(latences, 50) * 1000,
+            'p95_ms': centile(latences, 95) * 1000,
+            'p99_ms': centile(latences, 99) * 1000,
+            'debit_rps': len(latences) / duree if duree else 0,
+            'requetes_sql': statistics.mean(requetes_sql) if requetes_sql else 0,
+            'memoire_pic_mo': pic / 1024 / 1024,
+            'erreurs': len(erreurs),
+        }
+
+    def comparer(self, resultats, chemin_reference, seuil):
+        with open(chemin_reference, encoding='utf-8') as fichier:
+            reference = json.load(fichier)['operations']
+
+        regressions = []
+        for nom, actuel in resultats.items():
+            avant = reference.get(nom)
+            if not avant:
+                continue
+            for mesure in ('p95_ms', 'requetes_sql', 'memoire_pic_mo'):
+                if avant[mesure] and actuel[mesure] > avant[mesure] * (1 + seuil):
+                    regressions.append(f"{nom} : {mesure} {avant[mesure]:.1f} → {actuel[mesure]:.1f}")
+            if avant['debit_rps'] and actuel['debit_rps'] < avant['debit_rps'] * (1 - seuil):
+                regressions.append(f"{nom} : debit_rps {avant['debit_rps']:.1f} → {actuel['debit_rps']:.1f}")
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} régression(s) au-delà de {seuil:.0%} par rapport à {chemin_reference}")
+        self.stdout.write(self.style.SUCCESS(f"Aucune régression au-delà de {seuil:.0%} par rapport à {chemin_reference}"))
@@ -0,0 +1,119 @@
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data_info.documents import parametre
+
+from .bench_graphql import VARIABLES, centile, identifiants, operations_a_rejouer
+
+
+class Command(BaseCommand):
+    help = ("Test de charge HTTP d'un serveur lancé à part (runserver, gunicorn + uvicorn...) : "
+            "rejoue en boucle les opérations du front pendant une durée fixe")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000/graphql/')
+        parser.add_argument('--operations', default=parametre('FICHIER_OPERATIONS'),
+                            help="Fichier des opérations du front (commande enregistrer_operations)")
+        parser.add_argument('--filtre', nargs='*', default=None, help="Noms des opérations à rejouer")
+        parser.add_argument('--clients', type=int, default=16, help="Connexions concurrentes")
+        parser.add_argument('--duree', type=float, default=30, help="Durée du test en secondes")
+        parser.add_argument('--sortie', default=None, help="Fichier JSON des résultats")
+        parser.add_argument('--reference', default=None,
+                            help="Résultats d'un autre serveur (--sortie) à comparer, par exemple runserver")
+
+    def handle(self, *args, **options):
+        # Les variables (identifiants) sont lues dans la base locale : lancer le
+        # serveur et cette commande avec la même base (GINFO_BASE)
+        operations = operations_a_rejouer(options['operations'], options['filtre'])
+        if not operations:
+            raise CommandError("Aucune opération à rejouer")
+        ids = identifiants()
+        corps = [
+            (nom, json.dumps({'query': query, 'variables': VARIABLES[nom](ids) if nom in VARIABLES else None,
+                              'operationName': nom}).encode())
+            for nom, query in operations
+        ]
+
+        url = urlsplit(options['url'])
+        latences = {nom: [] for nom, _ in corps}
+        erreurs = []
+        verrou = threading.Lock()
+        fin = time.perf_counter() + options['duree']
+
+        def client(decalage):
+            connexion = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+            i = decalage
+            try:
+                while time.perf_counter() < fin:
+                    nom, contenu = corps[i % len(corps)]
+                    i += 1
+                    debut = time.perf_counter()
+                    try:
+                        connexion.request('POST', url.path, contenu, {'Content-Type': 'application/json'})
+                        reponse = connexion.getresponse()
+                        reponse.read()
+                        statut = reponse.status
+                    except (OSError, http.client.HTTPException) as e:
+                        connexion.close()
+                        connexion = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+                        statut = type(e).__name__
+                    duree = time.perf_counter() - debut
+                    with verrou:
+                        latences[nom].append(duree)
+                        if statut != 200:
+                            erreurs.append(statut)
+            finally:
+                connexion.close()
+
+        debut = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(options['clients'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duree = time.perf_counter() - debut
+
+        toutes = [latence for valeurs in latences.values() for latence in valeurs]
+        rapport = {
+            'url': options['url'],
+            'clients': options['clients'],
+            'duree_s': duree,
+            'requetes': len(toutes),
+            'erreurs': len(erreurs),
+            'debit_rps': len(toutes) / duree,
+            'p50_ms': centile(toutes, 50) * 1000,
+            'p95_ms': centile(toutes, 95) * 1000,
+            'p99_ms': centile(toutes, 99) * 1000,
+            'operations': {
+                nom: {'requetes': len(valeurs), 'p50_ms': centile(valeurs, 50) * 1000,
+                      'p99_ms': centile(valeurs, 99) * 1000}
+                for nom, valeurs in latences.items()
+            },
+        }
+
+        for nom, mesure in rapport['operations'].items():
+            self.stdout.write(f"{nom:28} {mesure['requetes']:6d} req  p50 {mesure['p50_ms']:8.1f} ms  p99 {mesure['p99_ms']:8.1f} ms")
+        self.stdout.write(
+            f"Total : {rapport['requetes']} requêtes en {duree:.1f} s, {rapport['debit_rps']:.1f} req/s, "
+            f"p50 {rapport['p50_ms']:.1f} ms, p95 {rapport['p95_ms']:.1f} ms, p99 {rapport['p99_ms']:.1f} ms, "
+            f"{rapport['erreurs']} erreur(s)"
+        )
+        if erreurs:
+            self.stderr.write(f"Erreurs : {sorted(set(map(str, erreurs)))}")
+
+        if options['sortie']:
+            with open(options['sortie'], 'w', encoding='utf-8') as fichier:
+                json.dump(rapport, fichier, indent=2)
+
+        if options['reference']:
+            with open(options['reference'], encoding='utf-8') as fichier:
+                reference = json.load(fichier)
+            self.stdout.write(
+                f"Par rapport à {reference['url']} : débit x{rapport['debit_rps'] / reference['debit_rps']:.2f}, "
+                f"p95 x{rapport['p95_ms'] / reference['p95_ms']:.2f}, p99 x{rapport['p99_ms'] / reference['p99_ms']:.2f}"
+            )
@@ -0,0 +1,43 @@
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from data_info.documents import empreinte, forme_canonique, parametre
+
+GQL = re.compile(r"gql`(.*?)`", re.DOTALL)
+
+
+class Command(BaseCommand):
+    help = ("Extrait les opérations gql`...` du front et les enregistre (sha256 → document) "
+            "pour les requêtes persistées et le mode liste autorisée")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(Path(settings.BASE_DIR).parent.parent / 'front_ginfo' / 'src'),
+                            help="Répertoire des sources du front à parcourir")
+        parser.add_argument('--sortie', default=parametre('FICHIER_OPERATIONS'),
+                            help="Fichier JSON à écrire (défaut : GRAPHQL_DOCUMENTS['FICHIER_OPERATIONS'])")
+
+    def handle(self, *args, **options):
+        if not options['sortie']:
+            raise CommandError("Aucun fichier de sortie : utiliser --sortie ou GRAPHQL_DOCUMENTS['FICHIER_OPERATIONS']")
+        source = Path(options['source'])
+        if not source.is_dir():
+            raise CommandError(f"Répertoire introuvable : {source}")
+
+        operations = {}
+        for chemin in sorted(source.rglob('*')):
+            if chemin.suffix not in ('.js', '.jsx', '.ts', '.tsx') or 'node_modules' in chemin.parts:
+                continue
+            for document in GQL.findall(chemin.read_text(encoding='utf-8')):
+                if '${' in document:
+                    self.stderr.write(f"Ignoré (interpolation) dans {chemin}")
+                    continue
+                document = forme_canonique(document)
+                operations[empreinte(document)] = document
+
+        with open(options['sortie'], 'w', encoding='utf-8') as fichier:
+            json.dump(operations, fichier, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"{len(operations)} opération(s) enregistrée(s) dans {options['sortie']}"))
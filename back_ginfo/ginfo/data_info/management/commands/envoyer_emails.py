@@ -0,0 +1,48 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from data_info.outbox import taille_lot_par_defaut, traiter_lot
+
+
+class Command(BaseCommand):
+    help = ("Envoie les emails de notification en attente (outbox), par lots, sur une connexion SMTP par lot ; "
+            "en mode digest, un email récapitulatif par adresse")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=None,
+                            help="Nombre d'emails par lot (défaut : EMAIL_OUTBOX['TAILLE_LOT'], "
+                                 "ou ['TAILLE_LOT_DIGEST'] en mode digest)")
+        parser.add_argument('--intervalle', type=float, default=5.0,
+                            help="Secondes d'attente quand la file est vide")
+        parser.add_argument('--une-fois', action='store_true',
+                            help="Vide la file puis s'arrête au lieu de tourner en continu")
+        parser.add_argument('--backend', default=None,
+                            help="Backend email à utiliser (ex. django.core.mail.backends.locmem.EmailBackend)")
+
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot'] or taille_lot_par_defaut()
+        total_envoyes = total_reportes = total_echecs = 0
+
+        while True:
+            connection = get_connection(options['backend']) if options['backend'] else None
+            envoyes, reportes, echecs = traiter_lot(taille_lot, connection=connection)
+            total_envoyes += envoyes
+            total_reportes += reportes
+            total_echecs += echecs
+            if envoyes or reportes or echecs:
+                self.stdout.write(f"Lot traité : {envoyes} envoyé(s), {reportes} reporté(s), {echecs} échec(s)")
+
+            if envoyes + reportes + echecs < taille_lot:
+                # File vide (ou seulement des emails reportés à plus tard)
+                if options['une_fois']:
+                    break
+                try:
+                    time.sleep(options['intervalle'])
+                except KeyboardInterrupt:
+                    break
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé : {total_envoyes} envoyé(s), {total_reportes} reporté(s), {total_echecs} échec(s)"
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from data_info.importation import ImportateurInformations, decoder, detecter_format, lire_lignes
+
+
+class Command(BaseCommand):
+    help = "Importe des informations depuis un fichier CSV ou JSONL, en flux et par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier CSV (avec en-tête) ou JSONL")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help="Format du fichier (déduit de l'extension par défaut)")
+        parser.add_argument('--taille-lot', type=int, default=1000,
+                            help="Nombre de lignes par bulk_create")
+        parser.add_argument('--simulation', action='store_true',
+                            help="Valide le fichier sans rien écrire en base (dry-run)")
+
+    def handle(self, *args, **options):
+        if options['taille_lot'] < 1:
+            raise CommandError("--taille-lot doit être positif")
+        format = detecter_format(options['fichier'], options['format'])
+        importation = ImportateurInformations(
+            taille_lot=options['taille_lot'],
+            simulation=options['simulation'],
+            progression=self.afficher_progression,
+        )
+
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importation.importer(lire_lignes(decoder(fichier), format))
+        except OSError as e:
+            raise CommandError(f"Impossible de lire le fichier : {e}")
+
+        for erreur in rapport['erreurs']:
+            self.stderr.write(erreur)
+        mode = " (simulation, rien n'a été écrit)" if rapport['simulation'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé{mode} : {rapport['lues']} lue(s), {rapport['importees']} importée(s), "
+            f"{rapport['rejetees']} rejetée(s), {rapport['notifiees']} notification(s) "
+            f"en {rapport['duree']:.1f} s ({rapport['debit']:.0f} lignes/s)"
+        ))
+
+    def afficher_progression(self, rapport):
+        self.stdout.write(
+            f"{rapport['lues']} ligne(s) lue(s), {rapport['importees']} importée(s) - {rapport['debit']:.0f} lignes/s"
+        )
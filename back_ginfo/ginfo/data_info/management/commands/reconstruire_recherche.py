@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from data_info.recherche import disponible, reconstruire
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (FTS5) à partir des utilisateurs et de leurs informations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=2000, help="Utilisateurs indexés par lot")
+
+    def handle(self, *args, **options):
+        if not disponible():
+            self.stdout.write(self.style.WARNING("Index FTS5 disponible seulement sous SQLite : rien à faire"))
+            return
+        debut = time.monotonic()
+        with transaction.atomic():
+            nombre = reconstruire(
+                options['taille_lot'],
+                progression=lambda n: self.stdout.write(f"{n} utilisateur(s) indexé(s)"),
+            )
+        self.stdout.write(self.style.SUCCESS(f"Index reconstruit : {nombre} utilisateur(s) en {time.monotonic() - debut:.1f} s"))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from data_info.models import StatistiqueCompagnie, StatistiqueJour, VersionModele
+from data_info.statistiques import reconstruire
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les statistiques du tableau de bord (par compagnie et par jour) "
+            "à partir des informations, notifications et emails")
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        with transaction.atomic():
+            compagnies, jours = reconstruire()
+            VersionModele.incrementer(StatistiqueCompagnie, StatistiqueJour)
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques reconstruites : {compagnies} compagnie(s), {jours} jour(s) en {time.monotonic() - debut:.1f} s"
+        ))
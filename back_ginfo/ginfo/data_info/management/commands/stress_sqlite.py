@@ -0,0 +1,172 @@
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+
+from data_info import reessais
+from data_info.jeu_de_donnees import generer
+
+from .bench_graphql import centile
+
+MISE_A_JOUR = """
+mutation UpdateInformation($id: ID!, $informationData: InformationInput!) {
+  updateInformation(id: $id, informationData: $informationData) { information { informationId statut } }
+}
+"""
+LECTURE = "query InformationById($id: ID!) { informationById(id: $id) { cin statut notifications { objet } } }"
+
+# « avant » : configuration d'origine (backend SQLite de Django, journal par défaut, sans nouvelle tentative)
+MODES = {
+    'avant': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}, 'TENTATIVES': 0},
+    'apres': {'ENGINE': 'data_info.sqlite', 'OPTIONS': None, 'TENTATIVES': None},
+}
+
+
+class Command(BaseCommand):
+    help = ("Test de concurrence SQLite : mutations et lectures GraphQL en parallèle, "
+            "avec la configuration d'origine (avant) puis WAL + BEGIN IMMEDIATE + nouvelles tentatives (apres)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ecrivains', type=int, default=8, help="Threads qui enchaînent les mutations")
+        parser.add_argument('--lecteurs', type=int, default=4, help="Threads qui enchaînent les lectures")
+        parser.add_argument('--duree', type=float, default=15, help="Durée de chaque mode en secondes")
+        parser.add_argument('--informations', type=int, default=2000)
+        parser.add_argument('--modes', nargs='*', default=list(MODES), choices=list(MODES))
+        parser.add_argument('--sortie', default=None, help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        repertoire = Path(tempfile.mkdtemp(prefix='stress_sqlite_'))
+        try:
+            modele = self.preparer_modele(repertoire / 'modele.sqlite3', options['informations'])
+            resultats = {}
+            for mode in options['modes']:
+                base = repertoire / f'{mode}.sqlite3'
+                shutil.copy(modele, base)
+                resultats[mode] = self.executer(mode, base, options)
+                r = resultats[mode]
+                self.stdout.write(
+                    f"{mode:6} écritures {r['ecritures']:6d} ({r['ecritures_par_s']:6.1f}/s, "
+                    f"erreurs {r['erreurs_ecriture']} = {r['taux_erreur_ecriture']:.1%}, p95 {r['p95_ecriture_ms']:.0f} ms)  "
+                    f"lectures {r['lectures']:6d} ({r['lectures_par_s']:6.1f}/s, erreurs {r['erreurs_lecture']}, "
+                    f"p95 {r['p95_lecture_ms']:.0f} ms)  nouvelles tentatives {r['nouvelles_tentatives']}"
+                )
+        finally:
+            connection.close()
+            shutil.rmtree(repertoire, ignore_errors=True)
+
+        if options['sortie']:
+            with open(options['sortie'], 'w', encoding='utf-8') as fichier:
+                json.dump(resultats, fichier, indent=2)
+
+    def preparer_modele(self, chemin, nb_informations):
+        connection.close()
+        connections.settings['default']['NAME'] = str(chemin)
+        call_command('migrate', verbosity=0)
+        generer(max(nb_informations // 10, 1), nb_informations, nb_informations // 2)
+        connection.close()
+        # Le modèle repasse en journal classique : chaque mode choisit le sien
+        with sqlite3.connect(chemin) as brute:
+            brute.execute("PRAGMA journal_mode = DELETE")
+        return chemin
+
+    def executer(self, mode, base, options):
+        configuration = MODES[mode]
+        reglages = connections.settings['default']
+        reglages['NAME'] = str(base)
+        reglages['ENGINE'] = configuration['ENGINE']
+        reglages['OPTIONS'] = (
+            dict(settings.DATABASES['default'].get('OPTIONS', {}))
+            if configuration['OPTIONS'] is None else configuration['OPTIONS']
+        )
+        politique = dict(getattr(settings, 'SQLITE_REESSAIS', {}))
+        if configuration['TENTATIVES'] is not None:
+            politique['TENTATIVES'] = configuration['TENTATIVES']
+
+        with sqlite3.connect(base) as brute:
+            informations = list(brute.execute(
+                "SELECT information_id, utilisateur_id, compagnie_assurance_id FROM data_info_information"
+                " WHERE compagnie_assurance_id IS NOT NULL"
+            ))
+
+        mesures = {'ecriture': [], 'lecture': []}
+        erreurs = {'ecriture': [], 'lecture': []}
+        nouvelles_tentatives = [0]
+        verrou = threading.Lock()
+        fin = time.perf_counter() + options['duree']
+
+        def travailleur(genre, graine):
+            aleatoire = random.Random(graine)
+            client = Client(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+            try:
+                while time.perf_counter() < fin:
+                    id, utilisateur_id, compagnie_id = aleatoire.choice(informations)
+                    if genre == 'ecriture':
+                        corps = {'query': MISE_A_JOUR, 'variables': {'id': id, 'informationData': {
+                            'utilisateurId': utilisateur_id, 'compagnieId': compagnie_id,
+                            'statut': aleatoire.random() < 0.5, 'adresse': f"Stress {graine}",
+                        }}}
+                    else:
+                        corps = {'query': LECTURE, 'variables': {'id': id}}
+                    debut = time.perf_counter()
+                    reponse = client.post('/graphql/', json.dumps(corps), content_type='application/json')
+                    duree = time.perf_counter() - debut
+                    contenu = json.loads(reponse.content)
+                    with verrou:
+                        mesures[genre].append(duree)
+                        if 'errors' in contenu:
+                            erreurs[genre].append(contenu['errors'][0]['message'])
+            finally:
+                connection.close()
+
+        attente_origine = reessais.attente
+
+        def attente_comptee(tentative):
+            with verrou:
+                nouvelles_tentatives[0] += 1
+            return attente_origine(tentative)
+
+        reessais.attente = attente_comptee
+        try:
+            with override_settings(SQLITE_REESSAIS=politique):
+                debut = time.perf_counter()
+                threads = [
+                    threading.Thread(target=travailleur, args=('ecriture', n)) for n in range(options['ecrivains'])
+                ] + [
+                    threading.Thread(target=travailleur, args=('lecture', 1000 + n)) for n in range(options['lecteurs'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                duree = time.perf_counter() - debut
+        finally:
+            reessais.attente = attente_origine
+
+        if erreurs['ecriture'] or erreurs['lecture']:
+            self.stderr.write(f"{mode} : {sorted(set(erreurs['ecriture'] + erreurs['lecture']))[:3]}")
+
+        ecritures, lectures = len(mesures['ecriture']), len(mesures['lecture'])
+        return {
+            'duree_s': duree,
+            'ecritures': ecritures,
+            'ecritures_par_s': (ecritures - len(erreurs['ecriture'])) / duree,
+            'erreurs_ecriture': len(erreurs['ecriture']),
+            'taux_erreur_ecriture': len(erreurs['ecriture']) / ecritures if ecritures else 0,
+            'p95_ecriture_ms': centile(mesures['ecriture'], 95) * 1000,
+            'lectures': lectures,
+            'lectures_par_s': (lectures - len(erreurs['lecture'])) / duree,
+            'erreurs_lecture': len(erreurs['lecture']),
+            'p95_lecture_ms': centile(mesures['lecture'], 95) * 1000,
+            'nouvelles_tentatives': nouvelles_tentatives[0],
+            'informations': len(informations),
+        }
@@ -0,0 +1,226 @@
+"""
+Écritures ensemblistes des informations et des utilisateurs (mutations
+deleteInformations, updateInformations, upsertInformations, deleteUtilisateurs).
+
+Chaque opération lit l'état des lignes visées en une requête, écrit en une
+instruction (DELETE, UPDATE, INSERT … ON CONFLICT DO UPDATE), puis fait pour
+tout l'ensemble ce que save(), delete() et les signaux font ligne par ligne :
+statistiques, index de recherche, versions des modèles, notification des
+informations qui passent à confirmé (generer_notifications) et messages
+informationStatusChanged. Le nombre de requêtes ne dépend pas du nombre de lignes.
+"""
+
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import canaux, recherche
+from .cache import invalider
+from .models import (
+    Compagnie_Assurance, EmailEnAttente, Information, Notification, StatistiqueCompagnie, StatistiqueJour,
+    Utilisateur, VersionModele,
+)
+
+# Champs qu'updateInformations applique à toutes les lignes (cin et numero_employe sont uniques)
+CHAMPS_MODIFIABLES = ('adresse', 'numero_assurance', 'statut', 'email_notification', 'compagnie_assurance_id')
+# Clés possibles d'upsertInformations, et champs écrits par l'upsert
+CLES = Information.CLES
+CHAMPS_UPSERT = (
+    'utilisateur_id', 'compagnie_assurance_id', 'numero_employe', 'adresse', 'numero_assurance', 'cin', 'statut',
+    'email_notification',
+)
+
+
+def _supprimer(queryset):
+    # DELETE direct, sans collecteur ni signaux : leurs effets sont refaits ici pour l'ensemble
+    return queryset._raw_delete(queryset.db)
+
+
+def _notifier(informations, anciens_statuts):
+    """Publie les changements de statut et notifie les informations passées à confirmé ;
+    ``anciens_statuts`` : {pk: statut avant l'écriture} (absent pour une création)"""
+    confirmees, changements = [], []
+    for information in informations:
+        ancien = anciens_statuts.get(information.pk)
+        if ancien is not None and ancien != information.statut:
+            changements.append(information.message_de_changement(ancien, information.statut))
+        if information.statut and not ancien:
+            confirmees.append(information)
+    canaux.publier_lot(canaux.INFORMATIONS, changements)
+    Information.generer_notifications(confirmees)
+    return len(confirmees)
+
+
+def supprimer_informations(informations):
+    """Supprime les informations du queryset ``informations``, leurs notifications, emails
+    et liens aux compagnies ; renvoie le nombre d'informations supprimées"""
+    with transaction.atomic():
+        lignes = list(
+            informations.select_for_update().order_by()
+            .values_list('pk', 'utilisateur_id', 'compagnie_assurance_id', 'statut')
+        )
+        if not lignes:
+            return 0
+        ids = [pk for pk, _utilisateur, _compagnie, _statut in lignes]
+        notifications = Notification.objects.filter(information_id__in=ids)
+        emails = EmailEnAttente.objects.filter(notification__information_id__in=ids)
+        liens = Compagnie_Assurance.notifications.through.objects.filter(notification__information_id__in=ids)
+
+        StatistiqueCompagnie.ajuster(Counter({
+            cle: -nombre for cle, nombre in Counter(
+                (compagnie, statut) for _pk, _utilisateur, compagnie, statut in lignes
+            ).items()
+        }))
+        StatistiqueJour.ajuster('notifications', notifications.values_list('date_envoi', flat=True), -1)
+        StatistiqueJour.ajuster(
+            'emails_envoyes', emails.filter(statut=EmailEnAttente.ENVOYE).values_list('date_envoi', flat=True), -1
+        )
+        StatistiqueJour.ajuster(
+            'emails_echec', emails.filter(statut=EmailEnAttente.ECHEC).values_list('prochaine_tentative', flat=True), -1
+        )
+
+        _supprimer(emails)
+        _supprimer(liens)
+        _supprimer(notifications)
+        _supprimer(Information.objects.filter(pk__in=ids))
+
+        recherche.indexer({utilisateur for _pk, utilisateur, _compagnie, _statut in lignes})
+        VersionModele.incrementer(Information, Notification, Compagnie_Assurance)
+        invalider(Compagnie_Assurance)
+    return len(lignes)
+
+
+def supprimer_utilisateurs(ids):
+    """Supprime les utilisateurs ``ids``, leurs informations et leur User ; renvoie le nombre supprimé"""
+    with transaction.atomic():
+        lignes = list(Utilisateur.objects.select_for_update().filter(pk__in=ids).values_list('pk', 'user_id'))
+        if not lignes:
+            return 0
+        pks = [pk for pk, _user in lignes]
+        supprimer_informations(Information.objects.filter(utilisateur_id__in=pks))
+        _supprimer(Utilisateur.objects.filter(pk__in=pks))
+        # Le collecteur de Django supprime avec les User ce qui en dépend (jetons, journal de l'admin)
+        User.objects.filter(pk__in=[user for _pk, user in lignes]).delete()
+
+        recherche.indexer(pks)
+        VersionModele.incrementer(Utilisateur)
+        invalider(Utilisateur)
+    return len(lignes)
+
+
+def modifier_informations(ids, valeurs):
+    """Applique ``valeurs`` ({champ: valeur}, champs de CHAMPS_MODIFIABLES) aux informations ``ids``.
+
+    Renvoie (informations modifiées, informations passées à confirmé et notifiées).
+    """
+    inconnus = set(valeurs) - set(CHAMPS_MODIFIABLES)
+    if inconnus:
+        raise ValueError(f"Champs non modifiables en masse : {', '.join(sorted(inconnus))}")
+    nouvelle_compagnie = valeurs.get('compagnie_assurance_id')
+    with transaction.atomic():
+        if nouvelle_compagnie is not None and not Compagnie_Assurance.objects.filter(pk=nouvelle_compagnie).exists():
+            raise ValueError(f"compagnie_assurance_id inexistant : {nouvelle_compagnie}")
+        avant = {
+            pk: (statut, compagnie, utilisateur)
+            for pk, statut, compagnie, utilisateur in Information.objects.select_for_update().filter(pk__in=ids)
+            .values_list('pk', 'statut', 'compagnie_assurance_id', 'utilisateur_id')
+        }
+        if not avant or not valeurs:
+            return len(avant), 0
+        Information.objects.filter(pk__in=avant).update(**valeurs)
+
+        deltas = Counter()
+        for statut, compagnie, _utilisateur in avant.values():
+            deltas[(compagnie, statut)] -= 1
+            deltas[(valeurs.get('compagnie_assurance_id', compagnie), valeurs.get('statut', statut))] += 1
+        StatistiqueCompagnie.ajuster(deltas)
+
+        notifiees = 0
+        if 'statut' in valeurs:
+            changees = [pk for pk, (statut, _compagnie, _utilisateur) in avant.items() if statut != valeurs['statut']]
+            notifiees = _notifier(
+                Information.objects.filter(pk__in=changees).select_related('utilisateur', 'compagnie_assurance')
+                .order_by('pk'),
+                {pk: avant[pk][0] for pk in changees},
+            )
+        if set(valeurs) & set(recherche.CHAMPS_INFORMATION):
+            recherche.indexer({utilisateur for _statut, _compagnie, utilisateur in avant.values()})
+        VersionModele.incrementer(Information)
+    return len(avant), notifiees
+
+
+def upsert_informations(lignes, cle):
+    """Crée ou met à jour les informations ``lignes`` (dicts de CHAMPS_UPSERT), identifiées par ``cle``
+    (``cin`` ou ``numero_employe``) : un seul INSERT … ON CONFLICT DO UPDATE.
+
+    Pour une même clé, la dernière ligne l'emporte. Une information existante reçoit
+    tous les champs de CHAMPS_UPSERT : un champ absent de sa ligne est remis à NULL.
+    L'autre clé, unique elle aussi, ne doit être prise ni par une autre ligne ni par
+    une autre information. Renvoie (créées, modifiées, notifiées).
+    """
+    if cle not in CLES:
+        raise ValueError(f"Clé d'upsert inconnue : {cle} (attendu : {', '.join(CLES)})")
+    lignes = [
+        {champ: Information.cle_ou_nul(ligne.get(champ)) if champ in CLES else ligne.get(champ) for champ in CHAMPS_UPSERT}
+        for ligne in lignes
+    ]
+    sans_cle = [numero for numero, ligne in enumerate(lignes, start=1) if ligne[cle] is None]
+    if sans_cle:
+        raise ValueError(f"Lignes sans {cle} : {', '.join(map(str, sans_cle[:20]))}")
+    par_cle = {ligne[cle]: ligne for ligne in lignes}
+    numeros = {ligne[cle]: numero for numero, ligne in enumerate(lignes, start=1)}
+    if not par_cle:
+        return 0, 0, 0
+
+    with transaction.atomic():
+        for model, champ in ((Utilisateur, 'utilisateur_id'), (Compagnie_Assurance, 'compagnie_assurance_id')):
+            demandes = {int(ligne[champ]) for ligne in par_cle.values() if ligne[champ] is not None}
+            inconnus = demandes - set(model.objects.filter(pk__in=demandes).values_list('pk', flat=True))
+            if inconnus:
+                raise ValueError(f"{champ} inexistant(s) : {', '.join(map(str, sorted(inconnus)))}")
+
+        autre = next(champ for champ in CLES if champ != cle)
+        demandes = {ligne[autre] for ligne in par_cle.values() if ligne[autre] is not None}
+        proprietaires = dict(Information.objects.filter(**{f'{autre}__in': demandes}).values_list(autre, cle))
+        conflits, vues = [], {}
+        for valeur_cle, ligne in par_cle.items():
+            valeur = ligne[autre]
+            if valeur is None:
+                continue
+            if vues.setdefault(valeur, valeur_cle) != valeur_cle or proprietaires.get(valeur, valeur_cle) != valeur_cle:
+                conflits.append(numeros[valeur_cle])
+        if conflits:
+            raise ValueError(
+                f"{autre} déjà utilisé par une autre information, lignes : {', '.join(map(str, sorted(conflits)[:20]))}"
+            )
+
+        avant = {
+            valeur: (pk, statut, compagnie, utilisateur)
+            for valeur, pk, statut, compagnie, utilisateur in Information.objects.select_for_update()
+            .filter(**{f'{cle}__in': list(par_cle)})
+            .values_list(cle, 'pk', 'statut', 'compagnie_assurance_id', 'utilisateur_id')
+        }
+        Information.objects.bulk_create(
+            [Information(**ligne) for ligne in par_cle.values()],
+            update_conflicts=True, unique_fields=[cle], update_fields=[champ for champ in CHAMPS_UPSERT if champ != cle],
+        )
+        informations = list(
+            Information.objects.filter(**{f'{cle}__in': list(par_cle)})
+            .select_related('utilisateur', 'compagnie_assurance').order_by('pk')
+        )
+
+        deltas = Counter()
+        utilisateurs = set()
+        for information in informations:
+            deltas[(information.compagnie_assurance_id, information.statut)] += 1
+            utilisateurs.add(information.utilisateur_id)
+        for _pk, statut, compagnie, utilisateur in avant.values():
+            deltas[(compagnie, statut)] -= 1
+            utilisateurs.add(utilisateur)
+        StatistiqueCompagnie.ajuster(deltas)
+
+        notifiees = _notifier(informations, {pk: statut for pk, statut, _compagnie, _utilisateur in avant.values()})
+        recherche.indexer(utilisateurs)
+        VersionModele.incrementer(Information)
+    return len(par_cle) - len(avant), len(avant), notifiees
@@ -0,0 +1,112 @@
+import ipaddress
+import threading
+
+from django.conf import settings
+
+from .cout import adresse_client
+
+SECONDES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+NOMBRES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def parametre(nom):
+    """Lit un paramètre de GRAPHQL_TRACING dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'ENTETE': 'X-GraphQL-Trace',
+        'EXTENSIONS': settings.DEBUG,
+        'MAX_SERIES': 500,
+        'RESEAUX_METRIQUES': ['127.0.0.0/8', '::1/128'],
+    }
+    return getattr(settings, 'GRAPHQL_TRACING', {}).get(nom, defauts[nom])
+
+
+def acces_autorise(request):
+    """/metrics : requête authentifiée, comme les exports, ou client d'un réseau de RESEAUX_METRIQUES"""
+    if getattr(request, 'jwt', None) is not None or request.user.is_authenticated:
+        return True
+    try:
+        adresse = ipaddress.ip_address(adresse_client(request))
+    except ValueError:
+        return False
+    return any(adresse in ipaddress.ip_network(reseau) for reseau in parametre('RESEAUX_METRIQUES'))
+
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Histogramme:
+    """Histogramme au format d'exposition Prometheus, avec labels.
+
+    Les valeurs sont gardées dans la mémoire du processus : avec plusieurs
+    workers, chacun expose ses propres séries (Prometheus les additionne).
+    Au-delà de MAX_SERIES combinaisons de labels, les nouvelles valeurs sont
+    regroupées sous le label « autre » pour borner la mémoire.
+    """
+
+    def __init__(self, nom, aide, labels, seuils):
+        self.nom = nom
+        self.aide = aide
+        self.labels = tuple(labels)
+        self.seuils = tuple(seuils)
+        self._series = {}
+        self._verrou = threading.Lock()
+        REGISTRE.append(self)
+
+    def observer(self, valeur, **labels):
+        cle = tuple(str(labels[nom]) for nom in self.labels)
+        with self._verrou:
+            serie = self._series.get(cle)
+            if serie is None:
+                if len(self._series) >= parametre('MAX_SERIES'):
+                    cle = ('autre',) * len(self.labels)
+                serie = self._series.setdefault(cle, [[0] * len(self.seuils), 0, 0.0])
+            compteurs = serie[0]
+            for i, seuil in enumerate(self.seuils):
+                if valeur <= seuil:
+                    compteurs[i] += 1
+            serie[1] += 1
+            serie[2] += valeur
+
+    def exposition(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        with self._verrou:
+            series = [(cle, list(serie[0]), serie[1], serie[2]) for cle, serie in self._series.items()]
+        for cle, compteurs, total, somme in series:
+            labels = ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in zip(self.labels, cle))
+            prefixe = f"{labels}," if labels else ""
+            for seuil, compteur in zip(self.seuils, compteurs):
+                lignes.append(f'{self.nom}_bucket{{{prefixe}le="{seuil}"}} {compteur}')
+            lignes.append(f'{self.nom}_bucket{{{prefixe}le="+Inf"}} {total}')
+            lignes.append(f"{self.nom}_sum{{{labels}}} {somme}")
+            lignes.append(f"{self.nom}_count{{{labels}}} {total}")
+        return '\n'.join(lignes)
+
+
+REGISTRE = []
+
+duree_requete = Histogramme(
+    'ginfo_graphql_request_duration_seconds', "Durée d'exécution d'une opération GraphQL",
+    ['operation'], SECONDES,
+)
+requetes_sql = Histogramme(
+    'ginfo_graphql_sql_queries', "Requêtes SQL exécutées par opération GraphQL",
+    ['operation'], NOMBRES,
+)
+duree_sql = Histogramme(
+    'ginfo_graphql_sql_duration_seconds', "Temps passé en SQL par opération GraphQL",
+    ['operation'], SECONDES,
+)
+lignes = Histogramme(
+    'ginfo_graphql_rows', "Objets renvoyés par les resolvers d'une opération GraphQL",
+    ['operation'], NOMBRES,
+)
+duree_resolver = Histogramme(
+    'ginfo_graphql_resolver_duration_seconds', "Durée des resolvers racine (Query / Mutation)",
+    ['operation', 'champ'], SECONDES,
+)
+
+
+def exposition():
+    return '\n'.join(histogramme.exposition() for histogramme in REGISTRE) + '\n'
+
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 12:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0007_information_compagnie_assurance_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailEnAttente',
+            fields=[
+                ('email_id', models.AutoField(primary_key=True, serialize=False)),
+                ('destinataires', models.TextField()),
+                ('sujet', models.CharField(blank=True, max_length=255, null=True)),
+                ('message_texte', models.TextField(blank=True)),
+                ('message_html', models.TextField(blank=True)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('envoye', 'Envoyé'), ('echec', 'Échec')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='data_info.notification')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='email_a_envoyer_idx')],
+            },
+        ),
+    ]
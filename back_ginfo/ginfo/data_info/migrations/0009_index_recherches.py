@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0008_emailenattente'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='compagnie_assurance',
+            name='nom_compagnie',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='historique',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='information',
+            name='cin',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='information',
+            name='numero_employe',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='information',
+            name='statut',
+            field=models.BooleanField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='date_envoi',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='destinataire',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='utilisateur',
+            name='email',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='information',
+            index=models.Index(fields=['compagnie_assurance', 'statut'], name='information_compagnie_statut'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['destinataire', 'date_envoi'], name='notification_dest_date'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+import data_info.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remplir_mois(apps, schema_editor):
+    Historique = apps.get_model('data_info', 'Historique')
+    par_mois = defaultdict(list)
+    for pk, date in Historique.objects.values_list('pk', 'date').iterator(chunk_size=5000):
+        par_mois[data_info.models.mois_de(date)].append(pk)
+    for mois, pks in par_mois.items():
+        for debut in range(0, len(pks), 500):
+            Historique.objects.filter(pk__in=pks[debut:debut + 500]).update(mois=mois)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0009_index_recherches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historique',
+            name='mois',
+            field=data_info.models.MoisField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(remplir_mois, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='historique',
+            index=models.Index(fields=['mois', 'date'], name='historique_mois_date'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='historique',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='data_info.historique'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CHAMPS_INFORMATION = ('numero_employe', 'cin', 'numero_assurance', 'adresse')
+
+
+def creer_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS data_info_recherche USING fts5("
+        "nom, prenom, email, numero_employe, cin, numero_assurance, adresse, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+    )
+    informations = ', '.join(
+        f"(SELECT coalesce(group_concat(i.{champ}, ' '), '') FROM data_info_information i "
+        f"WHERE i.utilisateur_id = u.utilisateur_id)"
+        for champ in CHAMPS_INFORMATION
+    )
+    schema_editor.execute(
+        "INSERT INTO data_info_recherche (rowid, nom, prenom, email, numero_employe, cin, numero_assurance, adresse) "
+        f"SELECT u.utilisateur_id, coalesce(u.nom, ''), coalesce(u.prenom, ''), coalesce(u.email, ''), {informations} "
+        "FROM data_info_utilisateur u"
+    )
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS data_info_recherche")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0010_historique_par_mois'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def remplir(apps, schema_editor):
+    from data_info.statistiques import reconstruire
+    reconstruire(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0011_recherche'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueCompagnie',
+            fields=[
+                ('compagnie_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('confirmees', models.IntegerField(db_default=0, default=0)),
+                ('en_attente', models.IntegerField(db_default=0, default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatistiqueJour',
+            fields=[
+                ('jour', models.DateField(primary_key=True, serialize=False)),
+                ('notifications', models.IntegerField(db_default=0, default=0)),
+                ('emails_envoyes', models.IntegerField(db_default=0, default=0)),
+                ('emails_echec', models.IntegerField(db_default=0, default=0)),
+            ],
+        ),
+        migrations.RunPython(remplir, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0012_statistiques'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionModele',
+            fields=[
+                ('modele', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(db_default=0, default=0)),
+            ],
+        ),
+    ]
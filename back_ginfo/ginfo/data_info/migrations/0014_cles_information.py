@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verifier_doublons(apps, schema_editor):
+    """Une chaîne vide ne compte pas comme une valeur ; les vrais doublons sont à corriger avant la migration"""
+    Information = apps.get_model('data_info', 'Information')
+    for champ in ('cin', 'numero_employe'):
+        Information.objects.filter(**{champ: ''}).update(**{champ: None})
+        doublons = list(
+            Information.objects.filter(**{f'{champ}__isnull': False}).order_by().values_list(champ)
+            .annotate(nombre=Count('pk')).filter(nombre__gt=1).values_list(champ, flat=True)[:20]
+        )
+        if doublons:
+            raise RuntimeError(
+                f"Informations en double sur {champ}, à fusionner ou corriger avant de migrer : {', '.join(doublons)}"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0013_versionmodele'),
+    ]
+
+    operations = [
+        migrations.RunPython(verifier_doublons, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='information',
+            name='cin',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='information',
+            name='numero_employe',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='information',
+            constraint=models.UniqueConstraint(fields=('cin',), name='information_cin_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='information',
+            constraint=models.UniqueConstraint(fields=('numero_employe',), name='information_numero_employe_unique'),
+        ),
+    ]
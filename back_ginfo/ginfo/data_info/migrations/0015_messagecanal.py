@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 14:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0014_cles_information'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageCanal',
+            fields=[
+                ('message_id', models.AutoField(primary_key=True, serialize=False)),
+                ('canal', models.CharField(max_length=50)),
+                ('contenu', models.JSONField()),
+                ('date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
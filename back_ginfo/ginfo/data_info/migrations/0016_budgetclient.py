@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_info', '0015_messagecanal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetClient',
+            fields=[
+                ('cle', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('fenetre', models.BigIntegerField(db_index=True)),
+                ('consomme', models.BigIntegerField(db_default=0, default=0)),
+            ],
+        ),
+    ]
@@ -1,40 +1,126 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connection, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils.html import strip_tags
 
+from . import canaux
+
+
+class SuiviModifications:
+    """Mixin de modèle : garde les valeurs lues en base et n'écrit que les colonnes modifiées.
+
+    Sur une ligne déjà en base, save() sans update_fields enregistre seulement
+    les champs dont la valeur a changé depuis la lecture (ou le dernier save),
+    et ne fait rien (ni requête ni signal) si aucun n'a changé. Pendant le save,
+    ``modifications`` ({champ: (avant, après)}) est lisible par les signaux,
+    qui reçoivent aussi la liste des champs dans ``update_fields``.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._capturer()
+        return instance
 
-class Utilisateur(models.Model):
+    def _capturer(self, champs=None):
+        """Retient la valeur courante des champs ``champs`` (noms), ou de tous les champs chargés"""
+        if not hasattr(self, '_valeurs_en_base'):
+            self._valeurs_en_base = {}
+        for champ in self._meta.concrete_fields:
+            if champ.attname in self.__dict__ and (champs is None or champ.name in champs or champ.attname in champs):
+                self._valeurs_en_base[champ.attname] = self.__dict__[champ.attname]
+
+    @property
+    def valeurs_en_base(self):
+        """{attname: valeur} des champs tels que lus en base ; vide pour une instance pas encore enregistrée"""
+        return getattr(self, '_valeurs_en_base', {})
+
+    def champs_modifies(self):
+        """Noms des champs modifiés depuis la lecture ; tous les champs chargés si l'état en base est inconnu"""
+        valeurs = self.valeurs_en_base
+        return {
+            champ.name for champ in self._meta.concrete_fields
+            if champ.attname in self.__dict__
+            and (champ.attname not in valeurs or self.__dict__[champ.attname] != valeurs[champ.attname])
+        }
+
+    def save(self, *args, **kwargs):
+        modifies = self.champs_modifies()
+        valeurs = self.valeurs_en_base
+        self.modifications = {
+            champ.name: (valeurs.get(champ.attname), self.__dict__[champ.attname])
+            for champ in self._meta.concrete_fields if champ.name in modifies
+        }
+        # Un changement de clé primaire est une autre ligne : save() complet
+        if (
+            not self._state.adding and valeurs and not args
+            and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+            and self._meta.pk.name not in modifies
+        ):
+            # update_fields vide : Django n'écrit rien et n'envoie pas de signal
+            kwargs['update_fields'] = modifies
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self.modifications = {}
+        self._capturer(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        champs = kwargs.get('fields', args[1] if len(args) > 1 else None)
+        self._capturer(champs)
+
+    def modifier_relation(self, nom, ids):
+        """Met la relation plusieurs-à-plusieurs ``nom`` à ``ids`` (les inexistants sont ignorés)
+        en n'ajoutant et ne retirant que la différence ; renvoie (ajoutés, retirés)"""
+        relation = getattr(self, nom)
+        actuels = set(relation.values_list('pk', flat=True))
+        voulus = set(relation.model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        ajoutes, retires = voulus - actuels, actuels - voulus
+        if retires:
+            relation.remove(*retires)
+        if ajoutes:
+            relation.add(*ajoutes)
+        return ajoutes, retires
+
+
+class Utilisateur(SuiviModifications, models.Model):
     utilisateur_id = models.AutoField(primary_key=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     nom = models.CharField(max_length=255, null=True, blank=True)
     prenom = models.CharField(max_length=255, null=True, blank=True)
-    email = models.CharField(max_length=255, null=True, blank=True)
+    email = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     role = models.CharField(max_length=255, null=True, blank=True)
     mot_de_passe = models.CharField(max_length=255)
     
     def __str__(self):
         return f"{self.prenom} {self.nom}"
     
+    # Champs recopiés dans le User associé
+    CHAMPS_USER = {'email': 'email', 'nom': 'last_name', 'prenom': 'first_name'}
+    
     def save(self, *args, **kwargs):
-        # Synchroniser les informations avec le User associé
-        if self.user and (self.email or self.nom or self.prenom):
-            if self.email:
-                self.user.email = self.email
-            if self.nom:
-                self.user.last_name = self.nom
-            if self.prenom:
-                self.user.first_name = self.prenom
-            self.user.save()
-        super().save(*args, **kwargs) 
-
-
-class Compagnie_Assurance(models.Model):
+        # Synchroniser avec le User associé, seulement quand un champ recopié a changé
+        champs = self.champs_modifies() & set(self.CHAMPS_USER)
+        if champs and self.user_id:
+            a_ecrire = []
+            for champ in sorted(champs):
+                valeur = getattr(self, champ)
+                if valeur and getattr(self.user, self.CHAMPS_USER[champ]) != valeur:
+                    setattr(self.user, self.CHAMPS_USER[champ], valeur)
+                    a_ecrire.append(self.CHAMPS_USER[champ])
+            if a_ecrire:
+                self.user.save(update_fields=a_ecrire)
+        super().save(*args, **kwargs)
+
+
+class Compagnie_Assurance(SuiviModifications, models.Model):
     compagnie_id = models.AutoField(primary_key=True)
-    nom_compagnie = models.CharField(max_length=255, null=True, blank=True)
+    nom_compagnie = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     adresse_compagnie = models.CharField(max_length=255, null=True, blank=True)
     email_compagnie = models.CharField(max_length=255, null=True, blank=True)
     notifications = models.ManyToManyField('Notification', related_name='compagnies_assurance', blank=True)
@@ -43,45 +129,125 @@ class Compagnie_Assurance(models.Model):
         return self.nom_compagnie if self.nom_compagnie else f"Compagnie {self.pk}"
 
 
-class Information(models.Model):
+class Information(SuiviModifications, models.Model):
     information_id = models.AutoField(primary_key=True)
     utilisateur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='informations')
     numero_employe = models.CharField(max_length=255, null=True, blank=True)
     adresse = models.CharField(max_length=255, null=True, blank=True)
     numero_assurance = models.CharField(max_length=255, null=True, blank=True)
     cin = models.CharField(max_length=255, null=True, blank=True)
-    statut = models.BooleanField(null=False)
+    statut = models.BooleanField(null=False, db_index=True)
     # Nouvelle relation avec Compagnie_Assurance
     compagnie_assurance = models.ForeignKey(Compagnie_Assurance, on_delete=models.SET_NULL, null=True, blank=True, related_name='informations')
     email_notification = models.EmailField(max_length=255, null=True, blank=True, help_text="Email où envoyer la notification pour cette information")
     
+    class Meta:
+        indexes = [
+            # Informations confirmées / en attente par compagnie
+            models.Index(fields=['compagnie_assurance', 'statut'], name='information_compagnie_statut'),
+        ]
+        constraints = [
+            # Clés des upserts (upsertInformations) ; plusieurs informations peuvent rester sans valeur (NULL)
+            models.UniqueConstraint(fields=['cin'], name='information_cin_unique'),
+            models.UniqueConstraint(fields=['numero_employe'], name='information_numero_employe_unique'),
+        ]
+    
+    # Colonnes uniques (clés des upserts) : une valeur vide y est enregistrée NULL
+    CLES = ('cin', 'numero_employe')
+    
     def __str__(self):
         return f"Info de {self.utilisateur}"
     
+    @classmethod
+    def cle_ou_nul(cls, valeur):
+        """Valeur d'une clé unique à écrire : None pour une chaîne vide (le front envoie "")"""
+        if isinstance(valeur, str) and not valeur.strip():
+            return None
+        return valeur
+    
+    def en_base(self):
+        """(statut, compagnie_assurance_id) tels que lus en base, ou None s'ils n'ont pas été lus"""
+        valeurs = self.valeurs_en_base
+        if 'statut' in valeurs and 'compagnie_assurance_id' in valeurs:
+            return valeurs['statut'], valeurs['compagnie_assurance_id']
+        return None
+    
     def save(self, *args, **kwargs):
         creation = not self.pk
+        for champ in self.CLES:
+            setattr(self, champ, self.cle_ou_nul(getattr(self, champ)))
         
-        if not creation:
-            ancien_etat = Information.objects.get(pk=self.pk)
-            ancien_statut = ancien_etat.statut
+        # Statut et compagnie tels que lus en base, pour détecter la transition
+        # False→True et ajuster les statistiques sans relire la ligne
+        if creation:
+            ancien_statut, ancienne_compagnie = False, None
+        elif self.en_base() is not None:
+            ancien_statut, ancienne_compagnie = self.en_base()
         else:
-            ancien_statut = False
-            
-        super().save(*args, **kwargs)
+            ancien_statut, ancienne_compagnie = Information.objects.filter(pk=self.pk) \
+                .values_list('statut', 'compagnie_assurance_id').first() or (False, None)
         
-        if (creation and self.statut) or (not creation and not ancien_statut and self.statut):
-            self.creer_notification()
+        # Avec update_fields, les champs non enregistrés gardent leur valeur en base ;
+        # sans, SuiviModifications enregistre tous les champs modifiés
+        champs = kwargs.get('update_fields')
+        statut = self.statut if champs is None or 'statut' in champs else ancien_statut
+        compagnie = self.compagnie_assurance_id if champs is None or 'compagnie_assurance' in champs \
+            else ancienne_compagnie
+        
+        # La ligne, la notification, l'email à envoyer et les statistiques sont écrits ensemble
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            deltas = Counter({(compagnie, statut): 1})
+            if not creation:
+                deltas[(ancienne_compagnie, ancien_statut)] -= 1
+            StatistiqueCompagnie.ajuster(deltas)
+            
+            if (creation and self.statut) or (not creation and not ancien_statut and self.statut):
+                self.creer_notification()
+            if not creation and statut != ancien_statut:
+                canaux.publier(canaux.INFORMATIONS, self.message_de_changement(ancien_statut, statut))
+    
+    def message_de_changement(self, ancien_statut, statut):
+        """Message publié sur le canal des informations (subscription informationStatusChanged)"""
+        return {
+            'information_id': self.pk,
+            'utilisateur_id': self.utilisateur_id,
+            'compagnie_id': self.compagnie_assurance_id,
+            'ancien_statut': ancien_statut,
+            'statut': statut,
+        }
     
     def creer_notification(self):
         """Crée une notification lorsqu'une information est ajoutée avec statut True ou passe de False à True"""
-        historique = Historique.objects.create(
+        historique = self.historique_de_confirmation()
+        historique.save()
+        
+        notification = self.notification_de_confirmation(historique)
+        notification.save()
+        
+        # Associer la notification à la compagnie d'assurance si elle existe
+        if self.compagnie_assurance:
+            self.compagnie_assurance.notifications.add(notification)
+        
+        email_recipients = self.destinataires_email()
+        if email_recipients:
+            self.envoyer_email_notification(notification, email_recipients)
+        
+        return notification
+    
+    def historique_de_confirmation(self):
+        """Construit (sans l'enregistrer) l'historique de confirmation"""
+        return Historique(
             type_action="envoye",
             description=f"Information {self.information_id} confirmée pour l'utilisateur {self.utilisateur}"
         )
-        
+    
+    def notification_de_confirmation(self, historique):
+        """Construit (sans l'enregistrer) la notification de confirmation"""
         destinataire = self.email_notification if self.email_notification else "Administration"
         
-        notification = Notification.objects.create(
+        return Notification(
             historique=historique,
             information=self,
             objet="Confirmation d'information",
@@ -91,11 +257,8 @@ class Information(models.Model):
             date_envoi=timezone.now(),
             statut=True
         )
-        
-        # Associer la notification à la compagnie d'assurance si elle existe
-        if self.compagnie_assurance:
-            self.compagnie_assurance.notifications.add(notification)
-        
+    
+    def destinataires_email(self):
         email_recipients = []
         if self.email_notification:
             email_recipients.append(self.email_notification)
@@ -103,14 +266,97 @@ class Information(models.Model):
         # Ajouter l'email de la compagnie d'assurance s'il existe
         if self.compagnie_assurance and self.compagnie_assurance.email_compagnie:
             email_recipients.append(self.compagnie_assurance.email_compagnie)
+        return email_recipients
+    
+    @classmethod
+    def generer_notifications(cls, informations):
+        """Version ensembliste de creer_notification pour des informations déjà enregistrées.
         
-        if email_recipients:
-            self.envoyer_email_notification(notification, email_recipients)
+        Crée les historiques, les notifications, les liens compagnie↔notification
+        et les emails en attente avec un bulk_create par table.
+        """
+        informations = list(informations)
+        if not informations:
+            return []
         
-        return notification
+        with transaction.atomic():
+            historiques = Historique.objects.bulk_create(
+                [information.historique_de_confirmation() for information in informations]
+            )
+            notifications = Notification.objects.bulk_create([
+                information.notification_de_confirmation(historique)
+                for information, historique in zip(informations, historiques)
+            ])
+            StatistiqueJour.compter_notifications(notifications)
+            canaux.publier_lot(canaux.NOTIFICATIONS, [notification.message_de_creation() for notification in notifications])
+            
+            Lien = Compagnie_Assurance.notifications.through
+            Lien.objects.bulk_create([
+                Lien(compagnie_assurance_id=information.compagnie_assurance_id, notification_id=notification.pk)
+                for information, notification in zip(informations, notifications)
+                if information.compagnie_assurance_id
+            ])
+            VersionModele.incrementer(Historique, Notification, Compagnie_Assurance)
+            
+            emails = []
+            for information, notification in zip(informations, notifications):
+                email_recipients = information.destinataires_email()
+                if email_recipients:
+                    emails.append(information.email_de_notification(notification, email_recipients))
+            EmailEnAttente.objects.bulk_create(emails)
+        
+        return notifications
+    
+    @classmethod
+    def confirmer(cls, ids):
+        """Passe à True le statut des informations ``ids`` et notifie celles qui ont réellement changé.
+        
+        La transition est faite par un seul UPDATE conditionnel (``statut = False``)
+        qui renvoie les lignes modifiées ; les informations déjà confirmées sont ignorées.
+        Renvoie la liste des informations confirmées.
+        """
+        ids = [int(pk) for pk in ids]
+        if not ids:
+            return []
+        
+        with transaction.atomic():
+            table = connection.ops.quote_name(cls._meta.db_table)
+            pk = connection.ops.quote_name(cls._meta.pk.column)
+            statut = connection.ops.quote_name(cls._meta.get_field('statut').column)
+            if connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE {table} SET {statut} = %s WHERE {statut} = %s AND {pk} IN ({', '.join(['%s'] * len(ids))}) RETURNING {pk}",
+                        [True, False, *ids]
+                    )
+                    confirmees = [ligne[0] for ligne in cursor.fetchall()]
+            else:
+                confirmees = list(
+                    cls.objects.select_for_update().filter(pk__in=ids, statut=False).values_list('pk', flat=True)
+                )
+                cls.objects.filter(pk__in=confirmees).update(statut=True)
+            
+            informations = list(
+                cls.objects.filter(pk__in=confirmees)
+                .select_related('utilisateur', 'compagnie_assurance')
+                .order_by('pk')
+            )
+            deltas = Counter()
+            for information in informations:
+                deltas[(information.compagnie_assurance_id, True)] += 1
+                deltas[(information.compagnie_assurance_id, False)] -= 1
+            StatistiqueCompagnie.ajuster(deltas)
+            canaux.publier_lot(
+                canaux.INFORMATIONS, [information.message_de_changement(False, True) for information in informations]
+            )
+            if informations:
+                VersionModele.incrementer(cls)
+            cls.generer_notifications(informations)
+        
+        return informations
     
     def envoyer_email_notification(self, notification, recipients):
-        """Envoie un email de notification à l'adresse email spécifiée et à la compagnie d'assurance"""
+        """Met en file d'attente l'email de notification (envoyé ensuite par la commande envoyer_emails)"""
         if not recipients:
             notification.enregistrer_dans_historique(
                 type_action="email_non_envoyé", 
@@ -118,6 +364,24 @@ class Information(models.Model):
             )
             return
         
+        email = self.email_de_notification(notification, recipients)
+        email.save()
+        return email
+    
+    def email_de_notification(self, notification, recipients):
+        """Construit (sans l'enregistrer) l'email en attente pour la notification"""
+        sujet, message_texte, message_html = self.preparer_email_notification(notification)
+        
+        return EmailEnAttente(
+            notification=notification,
+            destinataires=", ".join(recipients),
+            sujet=sujet,
+            message_texte=message_texte,
+            message_html=message_html,
+        )
+    
+    def preparer_email_notification(self, notification):
+        """Renvoie (sujet, texte, html) de l'email de notification"""
         sujet = notification.objet
         message_html = f"""
         <html>
@@ -138,73 +402,346 @@ class Information(models.Model):
         </html>
         """
         message_texte = strip_tags(message_html)
-        
-        try:
-            print(f"Tentative d'envoi d'email à {', '.join(recipients)}")
-            
-            send_mail(
-                subject=sujet,
-                message=message_texte,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=recipients,
-                html_message=message_html,
-                fail_silently=False,  
-            )
-            
-            print(f"Email envoyé avec succès à {', '.join(recipients)}")
-            
-            notification.enregistrer_dans_historique(
-                type_action="email_envoye", 
-                description=f"Email de notification envoyé à {', '.join(recipients)}"
-            )
-            
-        except Exception as e:
-            print(f"ERREUR d'envoi d'email: {str(e)}")
-            notification.enregistrer_dans_historique(
-                type_action="email_echec", 
-                description=f"Échec de l'envoi d'email: {str(e)}"
-            )
+        return sujet, message_texte, message_html
+
+
+def mois_de(date):
+    """Mois (AAAAMM) de ``date`` dans le fuseau du projet"""
+    if timezone.is_aware(date):
+        date = timezone.localtime(date)
+    return date.year * 100 + date.month
+
+
+class MoisField(models.PositiveIntegerField):
+    """Mois (AAAAMM) du champ ``date`` de l'instance, calculé à l'insertion (y compris par bulk_create)"""
 
+    def pre_save(self, model_instance, add):
+        valeur = mois_de(model_instance.date or timezone.now())
+        setattr(model_instance, self.attname, valeur)
+        return valeur
 
-class Historique(models.Model):
+
+class Historique(SuiviModifications, models.Model):
+    """Journal d'audit en ajout seul, réparti par mois (``mois``).
+
+    Les mois clos au-delà de la rétention partent dans des archives NDJSON
+    compressées (commande archiver_historique, voir data_info/historique.py).
+    """
     historique_id = models.AutoField(primary_key=True)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     type_action = models.CharField(max_length=255, null=True, blank=True)
     description = models.TextField(null=True, blank=True)
+    mois = MoisField(editable=False)
+    
+    class Meta:
+        indexes = [
+            # Une période ne lit que les mois qu'elle recouvre
+            models.Index(fields=['mois', 'date'], name='historique_mois_date'),
+        ]
      
     def __str__(self):
         return f"Historique {self.pk} ({self.date})"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("L'historique est en ajout seul : une entrée enregistrée ne se modifie pas")
+        # Un identifiant déjà pris lève une IntegrityError au lieu d'écraser l'entrée existante
+        kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
 
 
-class Notification(models.Model):
+class Notification(SuiviModifications, models.Model):
     notification_id = models.AutoField(primary_key=True)
-    historique = models.ForeignKey(Historique, on_delete=models.CASCADE, related_name='notifications')
+    # Un historique archivé ne supprime pas ses notifications
+    historique = models.ForeignKey(Historique, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
     information = models.ForeignKey(Information, on_delete=models.CASCADE, related_name='notifications')
     objet = models.CharField(max_length=255, null=True, blank=True)
     contenu = models.CharField(max_length=255, null=True, blank=True)
     expediteur = models.CharField(max_length=255, null=True, blank=True)
-    destinataire = models.CharField(max_length=255, null=True, blank=True)
-    date_envoi = models.DateTimeField(null=True, blank=True) 
+    destinataire = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    date_envoi = models.DateTimeField(null=True, blank=True, db_index=True) 
     statut = models.BooleanField(null=True)
     
+    class Meta:
+        indexes = [
+            # Notifications d'un destinataire, les plus récentes d'abord
+            models.Index(fields=['destinataire', 'date_envoi'], name='notification_dest_date'),
+        ]
+    
     def __str__(self):
         return f"{self.objet} ({self.date_envoi})"
     
+    def save(self, *args, **kwargs):
+        ajout = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if ajout:
+                StatistiqueJour.compter_notifications([self])
+                canaux.publier(canaux.NOTIFICATIONS, self.message_de_creation())
+    
+    def message_de_creation(self):
+        """Message publié sur le canal des notifications (subscription notificationCreated)"""
+        return {
+            'notification_id': self.pk,
+            'information_id': self.information_id,
+            'utilisateur_id': self.information.utilisateur_id,
+            'compagnie_id': self.information.compagnie_assurance_id,
+            'destinataire': self.destinataire,
+        }
+    
     def enregistrer_dans_historique(self, type_action="envoi", description=None):
         """Méthode pour enregistrer une action dans l'historique"""
         if not description:
             description = f"Notification '{self.objet}' {type_action} à {self.destinataire}"
         
-        # Création d'un nouvel historique ou mise à jour de l'existant
-        if not hasattr(self, 'historique') or not self.historique:
-            historique = Historique.objects.create(
-                historique_id=self.notification_id,
-                type_action=type_action,
-                description=description
+        # L'historique est en ajout seul : chaque action ajoute une entrée,
+        # et la notification pointe vers la plus récente
+        self.historique = Historique.objects.create(
+            type_action=type_action,
+            description=description
+        )
+        self.save(update_fields=['historique'])
+
+    @classmethod
+    def enregistrer_dans_historique_en_masse(cls, entrees, type_action):
+        """Version ensembliste de enregistrer_dans_historique pour [(notification, description)] :
+        un bulk_create des historiques et un bulk_update des notifications"""
+        if not entrees:
+            return
+        with transaction.atomic():
+            historiques = Historique.objects.bulk_create([
+                Historique(type_action=type_action, description=description) for _notification, description in entrees
+            ])
+            # Une notification citée plusieurs fois pointe vers sa dernière entrée
+            notifications = {}
+            for (notification, _description), historique in zip(entrees, historiques):
+                notification.historique = historique
+                notifications[notification.pk] = notification
+            cls.objects.bulk_update(list(notifications.values()), ['historique'])
+            VersionModele.incrementer(Historique, cls)
+
+
+class EmailEnAttente(SuiviModifications, models.Model):
+    """Email de notification écrit dans la même transaction que la Notification (outbox)"""
+    EN_ATTENTE = 'en_attente'
+    EN_COURS = 'en_cours'
+    ENVOYE = 'envoye'
+    ECHEC = 'echec'
+    STATUTS = [
+        (EN_ATTENTE, 'En attente'),
+        (EN_COURS, 'En cours'),
+        (ENVOYE, 'Envoyé'),
+        (ECHEC, 'Échec'),
+    ]
+
+    email_id = models.AutoField(primary_key=True)
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='emails')
+    destinataires = models.TextField()
+    sujet = models.CharField(max_length=255, null=True, blank=True)
+    message_texte = models.TextField(blank=True)
+    message_html = models.TextField(blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default=EN_ATTENTE)
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(null=True, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative'], name='email_a_envoyer_idx'),
+        ]
+
+    def __str__(self):
+        return f"Email {self.pk} à {self.destinataires} ({self.statut})"
+
+    def liste_destinataires(self):
+        return [d.strip() for d in self.destinataires.split(",") if d.strip()]
+
+
+def _incrementer(model, pk, deltas):
+    """Ajoute ``deltas`` ({champ: nombre}) aux compteurs de la ligne ``pk``, créée au besoin.
+
+    Sous SQLite et PostgreSQL, un seul INSERT … ON CONFLICT DO UPDATE : deux
+    écritures concurrentes s'additionnent sans lecture préalable.
+    """
+    deltas = {champ: nombre for champ, nombre in deltas.items() if nombre}
+    if not deltas:
+        return
+    if connection.vendor in ('sqlite', 'postgresql'):
+        table = connection.ops.quote_name(model._meta.db_table)
+        cle = connection.ops.quote_name(model._meta.pk.column)
+        colonnes = [connection.ops.quote_name(model._meta.get_field(champ).column) for champ in deltas]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({cle}, {', '.join(colonnes)}) VALUES (%s, {', '.join(['%s'] * len(colonnes))}) "
+                f"ON CONFLICT ({cle}) DO UPDATE SET "
+                + ', '.join(f"{colonne} = {table}.{colonne} + excluded.{colonne}" for colonne in colonnes),
+                [model._meta.pk.get_db_prep_value(pk, connection), *deltas.values()]
             )
-            self.historique = historique
-            self.save()
-        else:
-            self.historique.type_action = type_action
-            self.historique.description = description
-            self.historique.save()
\ No newline at end of file
+    else:
+        with transaction.atomic():
+            if not model.objects.filter(pk=pk).update(**{champ: F(champ) + nombre for champ, nombre in deltas.items()}):
+                model.objects.create(pk=pk, **deltas)
+
+
+class StatistiqueCompagnie(models.Model):
+    """Informations confirmées et en attente d'une compagnie, tenues à jour à chaque écriture.
+
+    ``compagnie_id`` vaut SANS_COMPAGNIE pour les informations sans compagnie.
+    """
+    SANS_COMPAGNIE = 0
+
+    compagnie_id = models.IntegerField(primary_key=True)
+    confirmees = models.IntegerField(default=0, db_default=0)
+    en_attente = models.IntegerField(default=0, db_default=0)
+
+    def __str__(self):
+        return f"Compagnie {self.compagnie_id} : {self.confirmees} confirmée(s), {self.en_attente} en attente"
+
+    @classmethod
+    def ajuster(cls, deltas):
+        """Applique {(compagnie_id ou None, statut): nombre d'informations ajoutées (ou retirées si négatif)}"""
+        par_compagnie = {}
+        for (compagnie_id, statut), nombre in deltas.items():
+            compteurs = par_compagnie.setdefault(compagnie_id or cls.SANS_COMPAGNIE, {'confirmees': 0, 'en_attente': 0})
+            compteurs['confirmees' if statut else 'en_attente'] += nombre
+        # Toujours dans le même ordre, pour que deux transactions ne s'attendent pas mutuellement
+        for compagnie_id, compteurs in sorted(par_compagnie.items()):
+            _incrementer(cls, compagnie_id, compteurs)
+        if any(nombre for nombre in deltas.values()):
+            VersionModele.incrementer(cls)
+
+    @classmethod
+    def compter_informations(cls, informations, signe=1):
+        """Ajoute (ou retire, signe=-1) des informations écrites sans passer par save()"""
+        deltas = Counter()
+        for information in informations:
+            deltas[(information.compagnie_assurance_id, information.statut)] += signe
+        cls.ajuster(deltas)
+
+
+class StatistiqueJour(models.Model):
+    """Notifications et issues des emails d'une journée (fuseau du projet), tenues à jour à chaque écriture.
+
+    Une notification compte le jour de sa date_envoi, un email envoyé le jour
+    de sa date_envoi, un email abandonné le jour de l'abandon (prochaine_tentative,
+    remise à l'heure de l'abandon par l'outbox).
+    """
+    jour = models.DateField(primary_key=True)
+    notifications = models.IntegerField(default=0, db_default=0)
+    emails_envoyes = models.IntegerField(default=0, db_default=0)
+    emails_echec = models.IntegerField(default=0, db_default=0)
+
+    def __str__(self):
+        return f"{self.jour} : {self.notifications} notification(s)"
+
+    @property
+    def taux_echec(self):
+        termines = self.emails_envoyes + self.emails_echec
+        return self.emails_echec / termines if termines else None
+
+    @classmethod
+    def ajuster(cls, champ, dates, signe=1):
+        """Ajoute ``signe`` au compteur ``champ`` du jour de chaque date (les dates None sont ignorées)"""
+        par_jour = Counter(
+            # Une date sans fuseau est enregistrée comme heure locale du projet
+            timezone.localdate(date) if timezone.is_aware(date) else date.date()
+            for date in dates if date is not None
+        )
+        for jour, nombre in sorted(par_jour.items()):
+            _incrementer(cls, jour, {champ: nombre * signe})
+        if par_jour:
+            VersionModele.incrementer(cls)
+
+    @classmethod
+    def compter_notifications(cls, notifications, signe=1):
+        cls.ajuster('notifications', [notification.date_envoi for notification in notifications], signe)
+
+    @classmethod
+    def compter_email(cls, email, signe=1):
+        """Compte l'issue d'un email envoyé ou abandonné ; les autres statuts ne comptent pas"""
+        if email.statut == EmailEnAttente.ENVOYE:
+            cls.ajuster('emails_envoyes', [email.date_envoi], signe)
+        elif email.statut == EmailEnAttente.ECHEC:
+            cls.ajuster('emails_echec', [email.prochaine_tentative], signe)
+
+
+class VersionModele(models.Model):
+    """Compteur d'écritures d'un modèle, incrémenté dans la transaction de chaque écriture.
+
+    Sert aux ETag des requêtes GraphQL en GET (data_info/conditionnel.py) et aux
+    clés du cache de résultats (data_info/cache.py) : en base, il est le même
+    pour tous les workers et suit exactement le commit.
+    """
+    modele = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0, db_default=0)
+
+    def __str__(self):
+        return f"{self.modele} v{self.version}"
+
+    @classmethod
+    def incrementer(cls, *modeles):
+        for label in sorted({modele._meta.label_lower for modele in modeles}):
+            _incrementer(cls, label, {'version': 1})
+
+    @classmethod
+    def lire(cls, labels):
+        """{label: version} des modèles ``labels`` (0 pour un modèle jamais écrit)"""
+        versions = dict.fromkeys(labels, 0)
+        versions.update(cls.objects.filter(modele__in=list(labels)).values_list('modele', 'version'))
+        return versions
+
+
+class BudgetClient(models.Model):
+    """Coût GraphQL consommé par un client sur une fenêtre du budget (data_info/cout.py).
+
+    Une ligne par client et par fenêtre, dans la base du pod : le budget est
+    commun aux workers qui partagent cette base, chaque réplica a le sien.
+    """
+    cle = models.CharField(max_length=255, primary_key=True)
+    fenetre = models.BigIntegerField(db_index=True)
+    consomme = models.BigIntegerField(default=0, db_default=0)
+
+    def __str__(self):
+        return f"{self.cle} : {self.consomme}"
+
+    @classmethod
+    def consommer(cls, cle, fenetre, cout):
+        """Ajoute ``cout`` (négatif pour le rendre) au compteur ``cle`` et renvoie le total.
+
+        Sous SQLite et PostgreSQL, un seul INSERT … ON CONFLICT DO UPDATE … RETURNING :
+        deux requêtes concurrentes s'additionnent sans lecture préalable.
+        """
+        if connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert:
+            table = connection.ops.quote_name(cls._meta.db_table)
+            colonne_cle, colonne_fenetre, consomme = (
+                connection.ops.quote_name(cls._meta.get_field(champ).column) for champ in ('cle', 'fenetre', 'consomme')
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} ({colonne_cle}, {colonne_fenetre}, {consomme}) VALUES (%s, %s, %s) "
+                    f"ON CONFLICT ({colonne_cle}) DO UPDATE SET {consomme} = {table}.{consomme} + excluded.{consomme} "
+                    f"RETURNING {consomme}",
+                    [cle, fenetre, cout]
+                )
+                return cursor.fetchone()[0]
+        with transaction.atomic():
+            if not cls.objects.filter(pk=cle).update(consomme=F('consomme') + cout):
+                cls.objects.create(pk=cle, fenetre=fenetre, consomme=cout)
+            return cls.objects.get(pk=cle).consomme
+
+
+class MessageCanal(models.Model):
+    """Message publié sur un canal des subscriptions par la couche partagée (canaux.CoucheBase).
+
+    Chaque processus relit les messages plus récents que le dernier lu ; les
+    messages plus anciens que ABONNEMENTS['RETENTION'] sont supprimés.
+    """
+    message_id = models.AutoField(primary_key=True)
+    canal = models.CharField(max_length=50)
+    contenu = models.JSONField()
+    date = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.canal} {self.pk} ({self.date})"
@@ -7,9 +7,16 @@ from django.contrib.auth import authenticate
 from graphql import GraphQLError
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .input import CompagnieAssuranceInput, HistoriqueInput, InformationInput, NotificationInput, UtilisateurInput
+from .authentification import JetonRafraichissement
+from .importation import ImportateurInformations, decoder, detecter_format, lire_lignes
+from .input import (
+    CleInformation, CompagnieAssuranceInput, HistoriqueInput, InformationFiltreInput, InformationInput,
+    InformationPatchInput, NotificationInput, UtilisateurInput,
+)
+from .masse import modifier_informations, supprimer_informations, supprimer_utilisateurs, upsert_informations
 
 from .models import Utilisateur, Information, Historique, Notification, Compagnie_Assurance
+from .reessais import base_verrouillee
 from .djangoObjectType import CompagnieAssuranceType, HistoriqueType, InformationType, NotificationType, UtilisateurType
 
 class LoginMutation(graphene.Mutation):
@@ -87,7 +94,7 @@ class RefreshTokenMutation(graphene.Mutation):
     def mutate(root, info, refresh_token):
         try:        
             # Vérifier et rafraîchir le token
-            refresh = RefreshToken(refresh_token)
+            refresh = JetonRafraichissement(refresh_token)
             
             return RefreshTokenMutation(
                 success=True,
@@ -95,6 +102,8 @@ class RefreshTokenMutation(graphene.Mutation):
                 token=str(refresh.access_token)
             )
         except Exception as e:
+            if base_verrouillee(e):
+                raise
             return RefreshTokenMutation(
                 success=False,
                 message=f"Erreur lors du rafraîchissement du token: {str(e)}",
@@ -113,7 +122,7 @@ class LogoutMutation(graphene.Mutation):
     def mutate(root, info, refresh_token):
         try:       
             # Blacklister le token
-            token = RefreshToken(refresh_token)
+            token = JetonRafraichissement(refresh_token)
             token.blacklist()
             
             return LogoutMutation(
@@ -121,6 +130,8 @@ class LogoutMutation(graphene.Mutation):
                 message="Déconnexion réussie"
             )
         except Exception as e:
+            if base_verrouillee(e):
+                raise
             return LogoutMutation(
                 success=False,
                 message=f"Erreur lors de la déconnexion: {str(e)}"
@@ -179,6 +190,8 @@ class CreateUtilisateur(graphene.Mutation):
             utilisateur.save()
             
             refresh = RefreshToken.for_user(user)
+            refresh['utilisateurId'] = utilisateur.utilisateur_id
+            refresh['role'] = utilisateur.role
             token = str(refresh.access_token)
             refresh_token = str(refresh)
             
@@ -191,6 +204,8 @@ class CreateUtilisateur(graphene.Mutation):
             )
             
         except Exception as e:
+            if base_verrouillee(e):
+                raise
             return CreateUtilisateur(
                 utilisateur=None,
                 success=False, 
@@ -225,6 +240,8 @@ class CreateInformation(graphene.Mutation):
         except Utilisateur.DoesNotExist:
             raise GraphQLError("Utilisateur non trouvé")
         except Exception as e:
+            if base_verrouillee(e):
+                raise
             raise GraphQLError(f"Erreur lors de la création de l'information: {str(e)}")
 
 class CreateHistorique(graphene.Mutation):
@@ -308,15 +325,16 @@ class UpdateUtilisateur(graphene.Mutation):
             utilisateur = Utilisateur.objects.get(pk=id)
             
             # Mettre à jour les champs
-            if hasattr(utilisateur_data, 'utilisateur_id'):
+            # Seuls les champs fournis sont modifiés ; save() n'écrit que ceux qui ont changé
+            if hasattr(utilisateur_data, 'utilisateur_id') and utilisateur_data.utilisateur_id is not None:
                 utilisateur.utilisateur_id = utilisateur_data.utilisateur_id
-            if hasattr(utilisateur_data, 'nom'):
+            if hasattr(utilisateur_data, 'nom') and utilisateur_data.nom is not None:
                 utilisateur.nom = utilisateur_data.nom
-            if hasattr(utilisateur_data, 'prenom'):
+            if hasattr(utilisateur_data, 'prenom') and utilisateur_data.prenom is not None:
                 utilisateur.prenom = utilisateur_data.prenom
-            if hasattr(utilisateur_data, 'email'):
+            if hasattr(utilisateur_data, 'email') and utilisateur_data.email is not None:
                 utilisateur.email = utilisateur_data.email
-            if hasattr(utilisateur_data, 'role'):
+            if hasattr(utilisateur_data, 'role') and utilisateur_data.role is not None:
                 utilisateur.role = utilisateur_data.role
                 
             utilisateur.save()
@@ -357,6 +375,130 @@ class UpdateInformation(graphene.Mutation):
         
         return UpdateInformation(information=information)
 
+def _identifiants(ids):
+    try:
+        return [int(pk) for pk in ids]
+    except ValueError:
+        raise GraphQLError("Identifiants invalides")
+
+class UpdateInformations(graphene.Mutation):
+    """Applique ``patch`` aux informations ``ids`` en une seule requête UPDATE"""
+    class Arguments:
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+        patch = InformationPatchInput(required=True)
+
+    nombre = graphene.Int()
+    notifiees = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, ids, patch):
+        valeurs = {champ: valeur for champ, valeur in patch.items() if champ != 'compagnie_id'}
+        if 'compagnie_id' in patch:
+            # Un ID GraphQL arrive en chaîne : les compteurs par compagnie sont indexés par entier
+            valeurs['compagnie_assurance_id'] = (
+                _identifiants([patch.compagnie_id])[0] if patch.compagnie_id is not None else None
+            )
+        if valeurs.get('statut', False) is None:
+            raise GraphQLError("statut ne peut pas être null")
+        try:
+            nombre, notifiees = modifier_informations(_identifiants(ids), valeurs)
+        except ValueError as e:
+            raise GraphQLError(str(e))
+        return UpdateInformations(nombre=nombre, notifiees=notifiees)
+
+class UpsertInformations(graphene.Mutation):
+    """Crée ou met à jour les informations ``rows``, identifiées par ``cle``, en un seul INSERT … ON CONFLICT.
+    Une information existante reçoit toute la ligne : un champ facultatif absent est remis à null."""
+    class Arguments:
+        rows = graphene.List(graphene.NonNull(InformationInput), required=True)
+        cle = CleInformation(default_value=CleInformation.CIN.value)
+
+    creees = graphene.Int()
+    modifiees = graphene.Int()
+    notifiees = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, rows, cle):
+        lignes = [
+            {
+                'utilisateur_id': ligne.utilisateur_id,
+                'compagnie_assurance_id': ligne.compagnie_id,
+                'numero_employe': ligne.numero_employe,
+                'adresse': ligne.adresse,
+                'numero_assurance': ligne.numero_assurance,
+                'cin': ligne.cin,
+                'statut': ligne.statut,
+                'email_notification': ligne.email_notification,
+            }
+            for ligne in rows
+        ]
+        try:
+            creees, modifiees, notifiees = upsert_informations(lignes, getattr(cle, 'value', cle))
+        except ValueError as e:
+            raise GraphQLError(str(e))
+        return UpsertInformations(creees=creees, modifiees=modifiees, notifiees=notifiees)
+
+class ConfirmInformations(graphene.Mutation):
+    class Arguments:
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+    
+    success = graphene.Boolean()
+    nombre = graphene.Int()
+    confirmees = graphene.List(graphene.ID)
+    
+    @staticmethod
+    def mutate(root, info, ids):
+        try:
+            informations = Information.confirmer(ids)
+        except ValueError:
+            raise GraphQLError("Identifiants d'information invalides")
+        
+        return ConfirmInformations(
+            success=True,
+            nombre=len(informations),
+            confirmees=[information.information_id for information in informations]
+        )
+
+class ImportInformations(graphene.Mutation):
+    """Import d'un fichier CSV/JSONL envoyé en multipart/form-data dans le champ ``champ_fichier``"""
+    class Arguments:
+        champ_fichier = graphene.String(default_value="fichier")
+        format = graphene.String()
+        taille_lot = graphene.Int(default_value=1000)
+        simulation = graphene.Boolean(default_value=False)
+    
+    success = graphene.Boolean()
+    message = graphene.String()
+    lues = graphene.Int()
+    importees = graphene.Int()
+    rejetees = graphene.Int()
+    notifiees = graphene.Int()
+    erreurs = graphene.List(graphene.String)
+    
+    @staticmethod
+    def mutate(root, info, champ_fichier, taille_lot, simulation, format=None):
+        fichier = info.context.FILES.get(champ_fichier)
+        if fichier is None:
+            return ImportInformations(success=False, message=f"Aucun fichier reçu dans le champ '{champ_fichier}'")
+        if taille_lot < 1:
+            raise GraphQLError("taille_lot doit être positif")
+        
+        try:
+            importation = ImportateurInformations(taille_lot=taille_lot, simulation=simulation)
+            rapport = importation.importer(lire_lignes(decoder(fichier), detecter_format(fichier.name, format)))
+        except (ValueError, UnicodeDecodeError) as e:
+            return ImportInformations(success=False, message=f"Fichier illisible : {str(e)}")
+        
+        return ImportInformations(
+            success=True,
+            message=f"{rapport['importees']} information(s) importée(s) en {rapport['duree']:.1f} s",
+            lues=rapport['lues'],
+            importees=rapport['importees'],
+            rejetees=rapport['rejetees'],
+            notifiees=rapport['notifiees'],
+            erreurs=rapport['erreurs']
+        )
+
 class UpdateCompagnieAssurance(graphene.Mutation):
     class Arguments:
         id = graphene.ID(required=True)
@@ -378,12 +520,12 @@ class UpdateCompagnieAssurance(graphene.Mutation):
             if hasattr(compagnie_data, 'email_compagnie') and compagnie_data.email_compagnie is not None:
                 compagnie.email_compagnie = compagnie_data.email_compagnie
                 
-            if hasattr(compagnie_data, 'notification_ids') and compagnie_data.notification_ids is not None:
-                notifications = Notification.objects.filter(pk__in=compagnie_data.notification_ids)
-                compagnie.notifications.set(notifications)
-                
             compagnie.save()
             
+            # Seules les notifications ajoutées ou retirées sont écrites
+            if hasattr(compagnie_data, 'notification_ids') and compagnie_data.notification_ids is not None:
+                compagnie.modifier_relation('notifications', compagnie_data.notification_ids)
+            
             return UpdateCompagnieAssurance(compagnie=compagnie)
         except Compagnie_Assurance.DoesNotExist:
             raise GraphQLError(f"Compagnie d'assurance avec ID {id} n'existe pas")
@@ -422,6 +564,38 @@ class DeleteInformation(graphene.Mutation):
         except Information.DoesNotExist:
             return DeleteInformation(success=False)
 
+class DeleteInformations(graphene.Mutation):
+    """Supprime les informations ``ids`` ou celles qui correspondent à ``filtre``, en quelques requêtes DELETE"""
+    class Arguments:
+        ids = graphene.List(graphene.NonNull(graphene.ID))
+        filtre = InformationFiltreInput()
+
+    nombre = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, ids=None, filtre=None):
+        criteres = {}
+        if ids is not None:
+            criteres['pk__in'] = _identifiants(ids)
+        for champ, colonne in (('compagnie_id', 'compagnie_assurance_id'), ('utilisateur_id', 'utilisateur_id'), ('statut', 'statut')):
+            if filtre and filtre.get(champ) is not None:
+                criteres[colonne] = filtre[champ]
+        if not criteres:
+            # Jamais de suppression de toute la table par un filtre vide
+            raise GraphQLError("Indiquer ids ou au moins un critère de filtre")
+        return DeleteInformations(nombre=supprimer_informations(Information.objects.filter(**criteres)))
+
+class DeleteUtilisateurs(graphene.Mutation):
+    """Supprime les utilisateurs ``ids``, leurs informations et leur compte"""
+    class Arguments:
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+
+    nombre = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, ids):
+        return DeleteUtilisateurs(nombre=supprimer_utilisateurs(_identifiants(ids)))
+
 class DeleteCompagnieAssurance(graphene.Mutation):
     class Arguments:
         id = graphene.ID(required=True)
@@ -0,0 +1,145 @@
+import logging
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.relay import Connection
+from graphene.utils.str_converters import to_snake_case
+from graphql import get_named_type
+from graphql.execution.collect_fields import collect_sub_fields
+
+logger = logging.getLogger(__name__)
+
+
+def optimiser(queryset, info):
+    """Adapte ``queryset`` à la sélection GraphQL du champ en cours de résolution.
+
+    Les relations directes demandées sont jointes avec ``select_related``, les
+    relations multiples sont préchargées avec des ``Prefetch`` eux-mêmes
+    optimisés, et seules les colonnes demandées sont lues avec ``.only()``.
+    """
+    type_graphql, field_nodes = _selection_des_noeuds(
+        info, get_named_type(info.return_type), info.field_nodes
+    )
+    colonnes, jointures, prechargements = _analyser(
+        info, queryset.model, type_graphql, field_nodes
+    )
+    queryset = _appliquer(queryset, colonnes, jointures, prechargements)
+
+    rapport = {
+        'champ': info.field_name,
+        'modele': queryset.model.__name__,
+        'select_related': jointures,
+        'prefetch_related': [_decrire(p) for p in prechargements],
+        'only': sorted(colonnes),
+    }
+    logger.debug("Optimisation de %(champ)s (%(modele)s) : select_related=%(select_related)s "
+                 "prefetch_related=%(prefetch_related)s only=%(only)s", rapport)
+    optimisations = getattr(info.context, 'optimisations', None)
+    if optimisations is None and info.context is not None:
+        try:
+            optimisations = info.context.optimisations = []
+        except AttributeError:
+            optimisations = None
+    if optimisations is not None:
+        optimisations.append(rapport)
+    return queryset
+
+
+def _selection_des_noeuds(info, type_graphql, field_nodes):
+    """Pour une connexion Relay, descend jusqu'à la sélection de ``edges { node }``"""
+    graphene_type = getattr(type_graphql, 'graphene_type', None)
+    if not (isinstance(graphene_type, type) and issubclass(graphene_type, Connection)):
+        return type_graphql, field_nodes
+    for nom in ('edges', 'node'):
+        sous_champs = collect_sub_fields(
+            info.schema, info.fragments, info.variable_values, type_graphql, field_nodes
+        )
+        field_nodes = [n for nodes in sous_champs.values() for n in nodes if n.name.value == nom]
+        type_graphql = get_named_type(type_graphql.fields[nom].type)
+    return type_graphql, field_nodes
+
+
+def _decrire(prechargement):
+    sous_requete = prechargement.queryset
+    colonnes = sous_requete.query.deferred_loading[0] if sous_requete is not None else ()
+    return {'lookup': prechargement.prefetch_through, 'only': sorted(colonnes)}
+
+
+def _appliquer(queryset, colonnes, jointures, prechargements):
+    if jointures:
+        queryset = queryset.select_related(*jointures)
+    if prechargements:
+        queryset = queryset.prefetch_related(*prechargements)
+    return queryset.only(*colonnes)
+
+
+def _champ_du_modele(model, nom):
+    """Renvoie le champ Django correspondant au champ GraphQL ``nom``, ou None"""
+    try:
+        field = model._meta.get_field(nom)
+    except FieldDoesNotExist:
+        return None
+    if field.auto_created and not field.concrete and field.get_accessor_name() != nom:
+        return None
+    return field
+
+
+def _toutes_les_colonnes(model, prefixe):
+    return {prefixe + f.name for f in model._meta.concrete_fields}
+
+
+def _analyser(info, model, type_graphql, field_nodes, prefixe=''):
+    """Renvoie (colonnes, select_related, prefetch) nécessaires pour la sélection"""
+    colonnes = {prefixe + model._meta.pk.name}
+    jointures = []
+    prechargements = []
+
+    sous_champs = collect_sub_fields(
+        info.schema, info.fragments, info.variable_values, type_graphql, field_nodes
+    )
+    # Les alias d'un même champ sont fusionnés en une seule sélection
+    par_nom = {}
+    for nodes in sous_champs.values():
+        par_nom.setdefault(nodes[0].name.value, []).extend(nodes)
+
+    for nom_graphql, nodes in par_nom.items():
+        if nom_graphql.startswith('__'):
+            continue
+        nom = to_snake_case(nom_graphql)
+        field = _champ_du_modele(model, nom)
+        if field is None:
+            # Champ calculé : on ne sait pas quelles colonnes il lit
+            colonnes |= _toutes_les_colonnes(model, prefixe)
+            continue
+        if not field.is_relation:
+            colonnes.add(prefixe + nom)
+            continue
+
+        sous_type = get_named_type(type_graphql.fields[nom_graphql].type)
+        sous_modele = field.related_model
+
+        if field.concrete and (field.many_to_one or field.one_to_one):
+            # Clé étrangère directe : jointure dans la même requête
+            sous_colonnes, sous_jointures, sous_prechargements = _analyser(
+                info, sous_modele, sous_type, nodes, prefixe + nom + '__'
+            )
+            colonnes.add(prefixe + nom)
+            colonnes |= sous_colonnes
+            jointures.append(prefixe + nom)
+            jointures.extend(sous_jointures)
+            prechargements.extend(sous_prechargements)
+            continue
+
+        # Relation multiple (FK inverse, M2M) : préchargement avec une sous-requête optimisée
+        sous_colonnes, sous_jointures, sous_prechargements = _analyser(
+            info, sous_modele, sous_type, nodes
+        )
+        if not field.concrete and not field.many_to_many:
+            # La FK distante sert à rattacher les objets préchargés à leur parent
+            sous_colonnes.add(field.field.name)
+        sous_requete = _appliquer(
+            sous_modele._default_manager.all(), sous_colonnes, sous_jointures, sous_prechargements
+        )
+        prechargements.append(Prefetch(prefixe + nom, queryset=sous_requete))
+
+    return colonnes, jointures, prechargements
@@ -0,0 +1,234 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import escape, strip_tags
+
+from .models import EmailEnAttente, Notification, StatistiqueJour
+
+
+def parametre(nom):
+    """Lit un paramètre de EMAIL_OUTBOX dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'TAILLE_LOT': 50,
+        'MAX_TENTATIVES': 5,
+        'DELAI_INITIAL': 30,
+        'DELAI_MAX': 3600,
+        'DUREE_VERROU': 300,
+        'DIGEST': False,
+        'FENETRE_DIGEST': 300,
+        'TAILLE_LOT_DIGEST': 1000,
+    }
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(nom, defauts[nom])
+
+
+def taille_lot_par_defaut():
+    return parametre('TAILLE_LOT_DIGEST') if parametre('DIGEST') else parametre('TAILLE_LOT')
+
+
+def delai_avant_nouvelle_tentative(tentatives):
+    """Backoff exponentiel : DELAI_INITIAL, x2, x4... plafonné à DELAI_MAX (secondes)"""
+    return min(parametre('DELAI_INITIAL') * 2 ** (tentatives - 1), parametre('DELAI_MAX'))
+
+
+def debut_fenetre(maintenant):
+    """Début de la fenêtre de digest en cours : les fenêtres de FENETRE_DIGEST secondes
+    sont alignées sur l'epoch, pour que tous les workers les découpent de la même façon"""
+    fenetre = parametre('FENETRE_DIGEST')
+    secondes = maintenant.timestamp()
+    return datetime.fromtimestamp(secondes - secondes % fenetre, tz=maintenant.tzinfo)
+
+
+def reserver_lot(taille_lot):
+    """Réserve un lot d'emails à envoyer pour ce worker.
+
+    La réservation est une mise à jour conditionnelle : un autre worker qui
+    aurait pris les mêmes lignes entre-temps les fait disparaître du lot. Un
+    verrou expiré (worker arrêté en plein lot) rend les lignes à nouveau
+    disponibles. En mode digest, seuls les emails créés avant la fenêtre en
+    cours sont pris : ceux d'une même fenêtre partent ensemble.
+    """
+    maintenant = timezone.now()
+    disponibles = Q(statut=EmailEnAttente.EN_ATTENTE) | Q(statut=EmailEnAttente.EN_COURS)
+    a_envoyer = Q(disponibles, prochaine_tentative__lte=maintenant)
+    if parametre('DIGEST'):
+        a_envoyer &= Q(date_creation__lt=debut_fenetre(maintenant))
+    ids = list(
+        EmailEnAttente.objects.filter(a_envoyer)
+        .order_by('prochaine_tentative', 'email_id')
+        .values_list('email_id', flat=True)[:taille_lot]
+    )
+    if not ids:
+        return []
+    verrou = maintenant + timedelta(seconds=parametre('DUREE_VERROU'))
+    EmailEnAttente.objects.filter(a_envoyer, email_id__in=ids).update(
+        statut=EmailEnAttente.EN_COURS, prochaine_tentative=verrou
+    )
+    return list(
+        EmailEnAttente.objects.filter(
+            email_id__in=ids, statut=EmailEnAttente.EN_COURS, prochaine_tentative=verrou
+        ).select_related('notification__historique').order_by('email_id')
+    )
+
+
+def _message(sujet, texte, html, destinataires, connection):
+    message = EmailMultiAlternatives(
+        subject=sujet,
+        body=texte,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=destinataires,
+        connection=connection,
+    )
+    if html:
+        message.attach_alternative(html, "text/html")
+    return message
+
+
+def message_digest(emails, destinataire, connection=None):
+    """Un seul email récapitulant les notifications de ``emails`` pour ``destinataire``"""
+    if len(emails) == 1:
+        email = emails[0]
+        return _message(email.sujet, email.message_texte, email.message_html, [destinataire], connection)
+    lignes = ''.join(
+        f"<li>{escape(email.sujet or '')} : {escape(email.notification.contenu or '')}</li>" for email in emails
+    )
+    message_html = f"""
+        <html>
+        <head></head>
+        <body>
+            <h2>Récapitulatif des notifications</h2>
+            <p>Bonjour,</p>
+            <p>{len(emails)} notifications vous ont été adressées :</p>
+            <ul>{lignes}</ul>
+            <p>Cordialement,<br>L'équipe RH</p>
+        </body>
+        </html>
+        """
+    return _message(f"{len(emails)} notifications", strip_tags(message_html), message_html, [destinataire], connection)
+
+
+def preparer_envois(emails, connection=None):
+    """Messages à envoyer, avec pour chacun [(email, adresses couvertes)].
+
+    Sans digest, un message par email. En mode digest, un message par adresse,
+    qui récapitule tous les emails du lot adressés à cette adresse.
+    """
+    if not parametre('DIGEST'):
+        return [
+            (_message(email.sujet, email.message_texte, email.message_html, email.liste_destinataires(), connection),
+             [(email, email.liste_destinataires())])
+            for email in emails
+        ]
+    par_adresse = {}
+    for email in emails:
+        for adresse in email.liste_destinataires():
+            par_adresse.setdefault(adresse.lower(), (adresse, []))[1].append(email)
+    return [
+        (message_digest(groupe, adresse, connection), [(email, [adresse]) for email in groupe])
+        for adresse, groupe in par_adresse.values()
+    ]
+
+
+def traiter_lot(taille_lot=None, connection=None):
+    """Envoie un lot d'emails sur une seule connexion SMTP et renvoie (envoyés, reportés, échecs).
+
+    Tous les messages du lot partent en un send_messages. Si le serveur en
+    refuse un, les messages sont renvoyés un par un pour isoler le fautif :
+    ceux partis avant l'erreur peuvent l'être deux fois (envoi au moins une fois).
+    """
+    emails = reserver_lot(taille_lot or taille_lot_par_defaut())
+    if not emails:
+        return 0, 0, 0
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Serveur injoignable : tout le lot est reporté sans consommer de connexion par email
+        reportes, echecs = _enregistrer_echecs([(email, e) for email in emails])
+        return 0, reportes, echecs
+
+    envois = preparer_envois(emails, connection)
+    erreurs = []
+    try:
+        try:
+            connection.send_messages([message for message, _couverts in envois])
+        except Exception:
+            for message, couverts in envois:
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    erreurs.append((couverts, e))
+    finally:
+        connection.close()
+
+    # Adresses refusées, par email ; un email n'est envoyé que si aucune ne l'a été
+    refusees = {}
+    for couverts, erreur in erreurs:
+        for email, adresses in couverts:
+            refusees.setdefault(email.pk, ([], erreur))[0].extend(adresses)
+    envoyes = [email for email in emails if email.pk not in refusees]
+    echoues = []
+    for email in emails:
+        if email.pk in refusees:
+            adresses, erreur = refusees[email.pk]
+            # La tentative suivante ne vise que les adresses qui ont échoué
+            email.destinataires = ", ".join(adresses)
+            echoues.append((email, erreur))
+
+    _enregistrer_envois(envoyes)
+    reportes, echecs = _enregistrer_echecs(echoues)
+    return len(envoyes), reportes, echecs
+
+
+def _enregistrer_envois(emails):
+    if not emails:
+        return
+    maintenant = timezone.now()
+    for email in emails:
+        email.statut = EmailEnAttente.ENVOYE
+        email.tentatives += 1
+        email.date_envoi = maintenant
+        email.derniere_erreur = None
+    with transaction.atomic():
+        EmailEnAttente.objects.bulk_update(emails, ['statut', 'tentatives', 'date_envoi', 'derniere_erreur'])
+        StatistiqueJour.ajuster('emails_envoyes', [email.date_envoi for email in emails])
+        Notification.enregistrer_dans_historique_en_masse(
+            [(email.notification, f"Email de notification envoyé à {email.destinataires}") for email in emails],
+            type_action="email_envoye",
+        )
+
+
+def _enregistrer_echecs(echoues):
+    """Reprogramme les emails [(email, erreur)] avec backoff ; renvoie (reportés, abandonnés)"""
+    if not echoues:
+        return 0, 0
+    maintenant = timezone.now()
+    abandonnes = []
+    for email, erreur in echoues:
+        email.tentatives += 1
+        email.derniere_erreur = str(erreur)
+        if email.tentatives >= parametre('MAX_TENTATIVES'):
+            email.statut = EmailEnAttente.ECHEC
+            # Plus de tentative à venir : le champ garde l'heure de l'abandon (jour compté dans StatistiqueJour)
+            email.prochaine_tentative = maintenant
+            abandonnes.append((email, erreur))
+        else:
+            email.statut = EmailEnAttente.EN_ATTENTE
+            email.prochaine_tentative = maintenant + timedelta(
+                seconds=delai_avant_nouvelle_tentative(email.tentatives)
+            )
+    with transaction.atomic():
+        EmailEnAttente.objects.bulk_update(
+            [email for email, _erreur in echoues],
+            ['statut', 'tentatives', 'derniere_erreur', 'prochaine_tentative', 'destinataires'],
+        )
+        StatistiqueJour.ajuster('emails_echec', [email.prochaine_tentative for email, _erreur in abandonnes])
+        Notification.enregistrer_dans_historique_en_masse(
+            [(email.notification, f"Échec de l'envoi d'email: {erreur}") for email, erreur in abandonnes],
+            type_action="email_echec",
+        )
+    return len(echoues) - len(abandonnes), len(abandonnes)
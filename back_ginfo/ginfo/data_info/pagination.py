@@ -0,0 +1,172 @@
+import base64
+import json
+
+import graphene
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphql_relay import cursor_to_offset, offset_to_cursor
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+
+from .loaders import get_loader
+
+
+class CountableConnection(graphene.relay.Connection):
+    """Connexion Relay avec un ``totalCount`` calculé seulement s'il est demandé"""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(root, info):
+        return root.total_queryset.count()
+
+
+def encoder_curseur(instance, ordre):
+    valeurs = []
+    for cle in ordre:
+        field = instance._meta.get_field(cle.lstrip('-'))
+        valeurs.append(field.value_to_string(instance))
+    return base64.urlsafe_b64encode(json.dumps(valeurs).encode()).decode()
+
+
+def decoder_curseur(curseur, model, ordre):
+    try:
+        valeurs = json.loads(base64.urlsafe_b64decode(curseur.encode()).decode())
+        assert isinstance(valeurs, list) and len(valeurs) == len(ordre)
+        return [
+            model._meta.get_field(cle.lstrip('-')).to_python(valeur)
+            for cle, valeur in zip(ordre, valeurs)
+        ]
+    except Exception:
+        raise GraphQLError(f"Curseur invalide : {curseur}")
+
+
+def _apres(ordre, valeurs, inverse=False):
+    """Condition « strictement après le curseur » pour un ordre multi-colonnes"""
+    condition = Q()
+    egalites = Q()
+    for cle, valeur in zip(ordre, valeurs):
+        nom = cle.lstrip('-')
+        descendant = cle.startswith('-') != inverse
+        lookup = 'lt' if descendant else 'gt'
+        condition |= egalites & Q(**{f"{nom}__{lookup}": valeur})
+        egalites &= Q(**{nom: valeur})
+    return condition
+
+
+def _inverser(ordre):
+    return [cle[1:] if cle.startswith('-') else f"-{cle}" for cle in ordre]
+
+
+def paginer(queryset, connection_type, info, first=None, after=None, last=None, before=None, ordre=('pk',)):
+    """Pagination par clé (keyset) : une seule requête ``WHERE cle > curseur LIMIT n+1``.
+
+    ``ordre`` doit se terminer par une colonne unique (la clé primaire) pour que
+    le curseur désigne une position stable.
+    """
+    model = queryset.model
+    ordre = [model._meta.pk.name if cle == 'pk' else cle for cle in ordre]
+    ordre = ['-' + model._meta.pk.name if cle == '-pk' else cle for cle in ordre]
+    limite_max = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+    for nom, valeur in (('first', first), ('last', last)):
+        if valeur is not None and valeur < 0:
+            raise GraphQLError(f"L'argument {nom} doit être positif")
+        if valeur is not None and limite_max and valeur > limite_max:
+            raise GraphQLError(f"L'argument {nom} est limité à {limite_max} éléments")
+    if first is None and last is None:
+        first = limite_max
+
+    total_queryset = queryset
+    if after:
+        queryset = queryset.filter(_apres(ordre, decoder_curseur(after, model, ordre)))
+    if before:
+        queryset = queryset.filter(_apres(ordre, decoder_curseur(before, model, ordre), inverse=True))
+
+    if last is not None and first is None:
+        lignes = list(queryset.order_by(*_inverser(ordre))[:last + 1])
+        has_previous_page = len(lignes) > last
+        lignes = lignes[:last]
+        lignes.reverse()
+        has_next_page = bool(before)
+    else:
+        lignes = list(queryset.order_by(*ordre)[:first + 1])
+        has_next_page = len(lignes) > first
+        lignes = lignes[:first]
+        if last is not None:
+            lignes = lignes[-last:] if last else []
+        has_previous_page = bool(after)
+
+    loader = get_loader(info.context)
+    if loader is not None:
+        loader.enregistrer(lignes)
+
+    edges = [
+        connection_type.Edge(node=ligne, cursor=encoder_curseur(ligne, ordre))
+        for ligne in lignes
+    ]
+    connection = connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
+    connection.total_queryset = total_queryset
+    return connection
+
+
+class _Total:
+    """Remplace total_queryset quand le total vient d'une fonction"""
+
+    def __init__(self, compter):
+        self.count = compter
+
+
+def paginer_par_decalage(charger, compter, connection_type, info, first=None, after=None):
+    """Pagination par position, pour un ordre qui ne se reprend pas par clé (classement de pertinence).
+
+    ``charger(limite, decalage)`` renvoie une liste de ``(instance, champs de l'arête)``,
+    ``compter()`` le nombre total de résultats (appelé seulement si totalCount est demandé).
+    """
+    limite_max = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if first is not None and first < 0:
+        raise GraphQLError("L'argument first doit être positif")
+    if first is not None and limite_max and first > limite_max:
+        raise GraphQLError(f"L'argument first est limité à {limite_max} éléments")
+    if first is None:
+        first = limite_max
+    decalage = 0
+    if after:
+        position = cursor_to_offset(after)
+        if position is None or position < 0:
+            raise GraphQLError(f"Curseur invalide : {after}")
+        decalage = position + 1
+
+    lignes = charger(first + 1, decalage)
+    has_next_page = len(lignes) > first
+    lignes = lignes[:first]
+
+    loader = get_loader(info.context)
+    if loader is not None:
+        loader.enregistrer([instance for instance, _champs in lignes])
+
+    edges = [
+        connection_type.Edge(node=instance, cursor=offset_to_cursor(decalage + i), **champs)
+        for i, (instance, champs) in enumerate(lignes)
+    ]
+    connection = connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=decalage > 0,
+            has_next_page=has_next_page,
+        ),
+    )
+    connection.total_queryset = _Total(compter)
+    return connection
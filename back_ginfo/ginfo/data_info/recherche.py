@@ -0,0 +1,139 @@
+"""
+Recherche plein texte des personnes (index SQLite FTS5).
+
+Un document par Utilisateur (rowid = utilisateur_id) : ses nom, prénom et
+email, et les numéros, CIN et adresses de toutes ses informations. Le
+tokenizer unicode61 ignore casse et accents ; les index de préfixes servent
+la recherche au fil de la frappe.
+
+L'index est tenu à jour dans la transaction de l'écriture (signals.py pour
+save/delete, appel explicite après un bulk_create) ; reconstruire() le
+refait entièrement (commande reconstruire_recherche).
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Information, Utilisateur
+
+TABLE = 'data_info_recherche'
+
+# Colonne indexée -> poids dans le classement bm25
+COLONNES = {
+    'nom': 10.0,
+    'prenom': 10.0,
+    'email': 4.0,
+    'numero_employe': 8.0,
+    'cin': 8.0,
+    'numero_assurance': 8.0,
+    'adresse': 1.0,
+}
+CHAMPS_UTILISATEUR = ('nom', 'prenom', 'email')
+CHAMPS_INFORMATION = ('numero_employe', 'cin', 'numero_assurance', 'adresse')
+
+
+def disponible():
+    return connection.vendor == 'sqlite'
+
+
+def indexer(utilisateur_ids):
+    """Réécrit les documents des utilisateurs ``utilisateur_ids`` (supprime ceux qui n'existent plus)"""
+    utilisateur_ids = sorted({int(pk) for pk in utilisateur_ids if pk is not None})
+    if not utilisateur_ids or not disponible():
+        return
+    documents = {
+        pk: {champ: [valeur] if valeur else [] for champ, valeur in zip(CHAMPS_UTILISATEUR, valeurs)}
+        for pk, *valeurs in Utilisateur.objects.filter(pk__in=utilisateur_ids).values_list('pk', *CHAMPS_UTILISATEUR)
+    }
+    for utilisateur_id, *valeurs in Information.objects.filter(utilisateur_id__in=documents).order_by('pk') \
+            .values_list('utilisateur_id', *CHAMPS_INFORMATION):
+        document = documents[utilisateur_id]
+        for champ, valeur in zip(CHAMPS_INFORMATION, valeurs):
+            if valeur:
+                document.setdefault(champ, []).append(valeur)
+
+    with connection.cursor() as cursor:
+        for debut in range(0, len(utilisateur_ids), 500):
+            lot = utilisateur_ids[debut:debut + 500]
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(lot))})", lot)
+        if documents:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, {', '.join(COLONNES)}) VALUES (%s, {', '.join(['%s'] * len(COLONNES))})",
+                [
+                    [pk, *(' '.join(document.get(champ, [])) for champ in COLONNES)]
+                    for pk, document in documents.items()
+                ]
+            )
+
+
+def reconstruire(taille_lot=2000, progression=None):
+    """Vide l'index puis y remet tous les utilisateurs, par lots"""
+    if not disponible():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    ids = list(Utilisateur.objects.order_by('pk').values_list('pk', flat=True))
+    for debut in range(0, len(ids), taille_lot):
+        indexer(ids[debut:debut + taille_lot])
+        if progression:
+            progression(min(debut + taille_lot, len(ids)))
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return len(ids)
+
+
+def expression(terme):
+    """Requête FTS5 : chaque mot saisi doit apparaître, le dernier de ses
+    morceaux pouvant n'être qu'un début de mot (« rako », « E-00 »).
+    Le mot exact compte en plus, pour classer « Nom12 » avant « Nom120 »."""
+    phrases = []
+    for mot in terme.split():
+        morceaux = re.findall(r'\w+', mot)
+        if morceaux:
+            phrase = '"' + ' '.join(morceaux) + '"'
+            phrases.append(f'({phrase} OR {phrase}*)')
+    return ' AND '.join(phrases) or None
+
+
+def rechercher(terme, limite, decalage=0):
+    """Liste de (utilisateur_id, score) du plus pertinent au moins pertinent"""
+    requete = expression(terme)
+    if requete is None:
+        return []
+    if not disponible():
+        ids = _sans_index(terme).order_by('pk').values_list('pk', flat=True)[decalage:decalage + limite]
+        return [(pk, 0.0) for pk in ids]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({TABLE}, {', '.join(str(poids) for poids in COLONNES.values())}) AS score "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY score, rowid LIMIT %s OFFSET %s",
+            [requete, limite, decalage]
+        )
+        # bm25 est négatif : plus il est petit, plus le document est pertinent
+        return [(pk, -score) for pk, score in cursor.fetchall()]
+
+
+def compter(terme):
+    requete = expression(terme)
+    if requete is None:
+        return 0
+    if not disponible():
+        return _sans_index(terme).count()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s", [requete])
+        return cursor.fetchone()[0]
+
+
+def _sans_index(terme):
+    """Repli hors SQLite : recherche sans classement ni insensibilité aux accents"""
+    condition = Q()
+    for mot in terme.split():
+        mot_condition = Q()
+        for champ in CHAMPS_UTILISATEUR:
+            mot_condition |= Q(**{f"{champ}__icontains": mot})
+        for champ in CHAMPS_INFORMATION:
+            mot_condition |= Q(**{f"informations__{champ}__icontains": mot})
+        condition &= mot_condition
+    return Utilisateur.objects.filter(condition).distinct()
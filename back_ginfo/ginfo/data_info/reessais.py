@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+def parametre(nom):
+    """Lit un paramètre de SQLITE_REESSAIS dans les settings, avec sa valeur par défaut"""
+    defauts = {
+        'TENTATIVES': 5,
+        'DELAI_INITIAL': 0.05,
+        'DELAI_MAX': 1.0,
+        'EXCLUS': ['importInformations', 'refreshToken'],
+    }
+    return getattr(settings, 'SQLITE_REESSAIS', {}).get(nom, defauts[nom])
+
+
+def base_verrouillee(erreur):
+    message = str(erreur).lower()
+    return isinstance(erreur, OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def attente(tentative):
+    """Délai avant la tentative suivante : exponentiel, tiré au hasard entre 0 et le plafond
+    pour que les écrivains en conflit ne repartent pas ensemble"""
+    plafond = min(parametre('DELAI_MAX'), parametre('DELAI_INITIAL') * 2 ** tentative)
+    return random.uniform(0, plafond)
+
+
+class ReessaiMiddleware:
+    """Middleware graphene qui exécute chaque mutation dans sa propre transaction
+    et la relance si SQLite reste verrouillé au-delà de busy_timeout.
+
+    La transaction rend chaque tentative tout ou rien : une mutation relancée
+    ne laisse pas d'écritures partielles de la tentative précédente. Rien
+    n'est relancé à l'intérieur d'une transaction déjà ouverte
+    (ATOMIC_MUTATIONS, ATOMIC_REQUESTS), qui est de toute façon perdue.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if info.parent_type is not info.schema.mutation_type or info.field_name in parametre('EXCLUS') \
+                or connection.in_atomic_block:
+            return next(root, info, **args)
+
+        tentative = 0
+        while True:
+            try:
+                with transaction.atomic():
+                    return next(root, info, **args)
+            except OperationalError as e:
+                if not base_verrouillee(e) or tentative >= parametre('TENTATIVES'):
+                    raise
+                time.sleep(attente(tentative))
+                tentative += 1
@@ -1,45 +1,76 @@
+import itertools
+
 import graphene
 from graphql import GraphQLError
 from django.contrib.auth.models import User
 
-from .mutation import CreateCompagnieAssurance, CreateHistorique, CreateInformation, CreateNotification, CreateUtilisateur, DeleteCompagnieAssurance, DeleteInformation, DeleteUtilisateur, LoginMutation, LogoutMutation, RefreshTokenMutation, UpdateCompagnieAssurance, UpdateInformation, UpdateUtilisateur
+from .mutation import ConfirmInformations, CreateCompagnieAssurance, CreateHistorique, CreateInformation, CreateNotification, CreateUtilisateur, DeleteCompagnieAssurance, DeleteInformation, DeleteInformations, DeleteUtilisateur, DeleteUtilisateurs, ImportInformations, LoginMutation, LogoutMutation, RefreshTokenMutation, UpdateCompagnieAssurance, UpdateInformation, UpdateInformations, UpdateUtilisateur, UpsertInformations
 
-from .djangoObjectType import CompagnieAssuranceType, HistoriqueType, InformationType, NotificationType, UtilisateurType
+from .djangoObjectType import ChangementStatutType, CompagnieAssuranceConnection, CompagnieAssuranceType, HistoriqueArchiveType, HistoriqueConnection, HistoriqueType, InformationConnection, InformationType, NotificationConnection, NotificationType, RechercheConnection, TableauDeBordType, UtilisateurConnection, UtilisateurType
 from .models import Utilisateur, Information, Historique, Notification, Compagnie_Assurance
+from . import canaux
+from .cache import resultat_en_cache
+from .historique import filtrer_periode, lire_archives
+from .optimizer import optimiser
+from .pagination import paginer, paginer_par_decalage
+from .recherche import compter, rechercher
+from .statistiques import tableau_de_bord
 
 
 
 # Queries
 class Query(graphene.ObjectType):
     # Utilisateur queries
-    utilisateurs = graphene.List(UtilisateurType)
+    utilisateurs = graphene.List(UtilisateurType, deprecation_reason="Utiliser utilisateursConnection")
+    utilisateurs_connection = graphene.relay.ConnectionField(UtilisateurConnection)
     utilisateur_by_id = graphene.Field(UtilisateurType, id=graphene.ID(required=True))
     utilisateur_by_email = graphene.Field(UtilisateurType, email=graphene.String(required=True))
     
     # Information queries
-    informations = graphene.List(InformationType)
+    informations = graphene.List(InformationType, deprecation_reason="Utiliser informationsConnection")
+    informations_connection = graphene.relay.ConnectionField(InformationConnection)
     information_by_id = graphene.Field(InformationType, id=graphene.ID(required=True))
     informations_by_utilisateur = graphene.List(InformationType, utilisateur_id=graphene.ID(required=True))
     
     # Historique queries
-    historiques = graphene.List(HistoriqueType)
+    historiques = graphene.List(HistoriqueType, debut=graphene.DateTime(), fin=graphene.DateTime(), deprecation_reason="Utiliser historiquesConnection")
+    historiques_connection = graphene.relay.ConnectionField(HistoriqueConnection, debut=graphene.DateTime(), fin=graphene.DateTime())
     historique_by_id = graphene.Field(HistoriqueType, id=graphene.ID(required=True))
+    historiques_archives = graphene.List(
+        HistoriqueArchiveType,
+        debut=graphene.DateTime(required=True),
+        fin=graphene.DateTime(required=True),
+        type_action=graphene.String(),
+        first=graphene.Int(),
+    )
     
     # Notification queries
-    notifications = graphene.List(NotificationType)
+    notifications = graphene.List(NotificationType, deprecation_reason="Utiliser notificationsConnection")
+    notifications_connection = graphene.relay.ConnectionField(NotificationConnection)
     notification_by_id = graphene.Field(NotificationType, id=graphene.ID(required=True))
     # notifications_by_expediteur = graphene.List(NotificationType, expediteur=graphene.String(required=True))
     # notifications_by_destinataire = graphene.List(NotificationType, destinataire=graphene.String(required=True))
     
     # CompagnieAssurance queries
-    compagnies = graphene.List(CompagnieAssuranceType)
+    compagnies = graphene.List(CompagnieAssuranceType, deprecation_reason="Utiliser compagniesConnection")
+    compagnies_connection = graphene.relay.ConnectionField(CompagnieAssuranceConnection)
     compagnie_by_id = graphene.Field(CompagnieAssuranceType, id=graphene.ID(required=True))
     compagnie_by_nom = graphene.Field(CompagnieAssuranceType, nom=graphene.String(required=True))
 
+    # Recherche plein texte des personnes (nom, prénom, email, numéros, CIN, adresse)
+    search = graphene.Field(RechercheConnection, term=graphene.String(required=True), first=graphene.Int(), after=graphene.String())
+
+    # Tableau de bord, lu dans les tables de statistiques (jours de debut à fin inclus)
+    dashboard_stats = graphene.Field(TableauDeBordType, debut=graphene.Date(), fin=graphene.Date())
+
     # Resolvers pour Utilisateur
     def resolve_utilisateurs(root, info):
-        return Utilisateur.objects.all()
+        return optimiser(Utilisateur.objects.all(), info)
+
+    def resolve_utilisateurs_connection(root, info, **kwargs):
+        return paginer(optimiser(Utilisateur.objects.all(), info), UtilisateurConnection, info, **kwargs)
         
+    @resultat_en_cache(Utilisateur)
     def resolve_utilisateur_by_id(root, info, id):
         try:
             return Utilisateur.objects.get(pk=id)
@@ -48,40 +79,75 @@ class Query(graphene.ObjectType):
             
     def resolve_utilisateur_by_email(root, info, email):
         try:
-            return Utilisateur.objects.get(email=email)
+            return optimiser(Utilisateur.objects.all(), info).get(email=email)
         except Utilisateur.DoesNotExist:
             raise GraphQLError(f"Utilisateur avec email {email} n'existe pas")
     
     # Resolvers pour Information
     def resolve_informations(root, info):
-        return Information.objects.all()
+        return optimiser(Information.objects.all(), info)
+
+    def resolve_informations_connection(root, info, **kwargs):
+        return paginer(optimiser(Information.objects.all(), info), InformationConnection, info, **kwargs)
         
     def resolve_information_by_id(root, info, id):
         try:
-            return Information.objects.get(pk=id)
+            return optimiser(Information.objects.all(), info).get(pk=id)
         except Information.DoesNotExist:
             raise GraphQLError(f"Information avec ID {id} n'existe pas")
             
     def resolve_informations_by_utilisateur(root, info, utilisateur_id):
-        return Information.objects.filter(utilisateur_id=utilisateur_id)
+        return optimiser(Information.objects.all(), info).filter(utilisateur_id=utilisateur_id)
     
     # Resolvers pour Historique
-    def resolve_historiques(root, info):
-        return Historique.objects.all()
+    def resolve_historiques(root, info, debut=None, fin=None):
+        return optimiser(filtrer_periode(Historique.objects.all(), debut, fin), info)
+
+    def resolve_historiques_connection(root, info, debut=None, fin=None, **kwargs):
+        # Les plus récents d'abord, la clé primaire départage les dates identiques
+        queryset = filtrer_periode(Historique.objects.all(), debut, fin)
+        return paginer(optimiser(queryset, info), HistoriqueConnection, info, ordre=('-date', '-pk'), **kwargs)
         
     def resolve_historique_by_id(root, info, id):
         try:
-            return Historique.objects.get(pk=id)
+            return optimiser(Historique.objects.all(), info).get(pk=id)
         except Historique.DoesNotExist:
             raise GraphQLError(f"Historique avec ID {id} n'existe pas")
+
+    def resolve_historiques_archives(root, info, debut, fin, type_action=None, first=None):
+        if first is not None and first < 0:
+            raise GraphQLError("L'argument first doit être positif")
+        entrees = lire_archives(debut, fin, type_action)
+        return list(itertools.islice(entrees, first))
+    
+    # Resolver de la recherche
+    def resolve_search(root, info, term, first=None, after=None):
+        def charger(limite, decalage):
+            resultats = rechercher(term, limite, decalage)
+            utilisateurs = optimiser(Utilisateur.objects.all(), info).in_bulk([pk for pk, _rang in resultats])
+            return [(utilisateurs[pk], {'rang': rang}) for pk, rang in resultats if pk in utilisateurs]
+        return paginer_par_decalage(charger, lambda: compter(term), RechercheConnection, info, first=first, after=after)
+    
+    # Resolver du tableau de bord
+    def resolve_dashboard_stats(root, info, debut=None, fin=None):
+        if debut is not None and fin is not None and debut > fin:
+            raise GraphQLError("debut doit précéder fin")
+        tableau = tableau_de_bord(debut, fin)
+        compagnies = Compagnie_Assurance.objects.in_bulk([ligne.compagnie_id for ligne in tableau['compagnies']])
+        for ligne in tableau['compagnies']:
+            ligne.compagnie = compagnies.get(ligne.compagnie_id)
+        return tableau
     
     # Resolvers pour Notification
     def resolve_notifications(root, info):
-        return Notification.objects.all()
+        return optimiser(Notification.objects.all(), info)
+
+    def resolve_notifications_connection(root, info, **kwargs):
+        return paginer(optimiser(Notification.objects.all(), info), NotificationConnection, info, ordre=('-pk',), **kwargs)
         
     def resolve_notification_by_id(root, info, id):
         try:
-            return Notification.objects.get(pk=id)
+            return optimiser(Notification.objects.all(), info).get(pk=id)
         except Notification.DoesNotExist:
             raise GraphQLError(f"Notification avec ID {id} n'existe pas")
             
@@ -92,15 +158,21 @@ class Query(graphene.ObjectType):
     #     return Notification.objects.filter(destinataire=destinataire)
     
     # Resolvers pour CompagnieAssurance
+    @resultat_en_cache(Compagnie_Assurance)
     def resolve_compagnies(root, info):
         return Compagnie_Assurance.objects.all()
+
+    def resolve_compagnies_connection(root, info, **kwargs):
+        return paginer(optimiser(Compagnie_Assurance.objects.all(), info), CompagnieAssuranceConnection, info, **kwargs)
         
+    @resultat_en_cache(Compagnie_Assurance)
     def resolve_compagnie_by_id(root, info, id):
         try:
             return Compagnie_Assurance.objects.get(pk=id)
         except Compagnie_Assurance.DoesNotExist:
             raise GraphQLError(f"Compagnie d'assurance avec ID {id} n'existe pas")
             
+    @resultat_en_cache(Compagnie_Assurance)
     def resolve_compagnie_by_nom(root, info, nom):
         try:
             return Compagnie_Assurance.objects.get(nom_compagnie=nom)
@@ -108,6 +180,33 @@ class Query(graphene.ObjectType):
             raise GraphQLError(f"Compagnie d'assurance avec nom {nom} n'existe pas")
 
 
+class Subscription(graphene.ObjectType):
+    """Servies en websocket (protocole graphql-transport-ws) sur /graphql/ par l'application ASGI"""
+    notification_created = graphene.Field(
+        NotificationType, destinataire=graphene.String(), compagnie_id=graphene.ID(), utilisateur_id=graphene.ID()
+    )
+    information_status_changed = graphene.Field(
+        ChangementStatutType, compagnie_id=graphene.ID(), utilisateur_id=graphene.ID()
+    )
+
+    def subscribe_notification_created(root, info, destinataire=None, compagnie_id=None, utilisateur_id=None):
+        return canaux.Ecoute(canaux.NOTIFICATIONS, destinataire=destinataire, compagnie_id=compagnie_id, utilisateur_id=utilisateur_id)
+
+    def resolve_notification_created(message, info, **kwargs):
+        # Une notification supprimée entre-temps donne null
+        return optimiser(Notification.objects.all(), info).filter(pk=message['notification_id']).first()
+
+    def subscribe_information_status_changed(root, info, compagnie_id=None, utilisateur_id=None):
+        return canaux.Ecoute(canaux.INFORMATIONS, compagnie_id=compagnie_id, utilisateur_id=utilisateur_id)
+
+    def resolve_information_status_changed(message, info, **kwargs):
+        return {
+            'information': Information.objects.filter(pk=message['information_id']).first(),
+            'ancien_statut': message['ancien_statut'],
+            'statut': message['statut'],
+        }
+
+
 class Mutation(graphene.ObjectType):
     # Create mutations
     create_utilisateur = CreateUtilisateur.Field()
@@ -120,15 +219,21 @@ class Mutation(graphene.ObjectType):
     update_utilisateur = UpdateUtilisateur.Field()
     update_information = UpdateInformation.Field()
     update_compagnie_assurance = UpdateCompagnieAssurance.Field()
+    update_informations = UpdateInformations.Field()
+    upsert_informations = UpsertInformations.Field()
+    confirm_informations = ConfirmInformations.Field()
+    import_informations = ImportInformations.Field()
     
     # Delete mutations
     delete_utilisateur = DeleteUtilisateur.Field()
     delete_information = DeleteInformation.Field()
     delete_compagnie_assurance = DeleteCompagnieAssurance.Field()
+    delete_informations = DeleteInformations.Field()
+    delete_utilisateurs = DeleteUtilisateurs.Field()
 
     #login
     login = LoginMutation.Field()
     refresh_token = RefreshTokenMutation.Field()
     logout = LogoutMutation.Field()
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
\ No newline at end of file
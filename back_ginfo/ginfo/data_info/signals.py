@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import recherche
+from .cache import invalider
+from .models import (
+    Compagnie_Assurance, EmailEnAttente, Historique, Information, Notification, StatistiqueCompagnie, StatistiqueJour,
+    Utilisateur, VersionModele,
+)
+
+
+@receiver(post_save, sender=Compagnie_Assurance)
+@receiver(post_delete, sender=Compagnie_Assurance)
+@receiver(post_save, sender=Utilisateur)
+@receiver(post_delete, sender=Utilisateur)
+def invalider_cache_resultats(sender, **kwargs):
+    invalider(sender)
+
+
+@receiver(m2m_changed, sender=Compagnie_Assurance.notifications.through)
+def invalider_cache_notifications_compagnie(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalider(Compagnie_Assurance)
+
+
+# Modèles exposés en GraphQL dont la version sert aux ETag (data_info/conditionnel.py) ;
+# les écritures en masse (bulk_create, update) l'incrémentent elles-mêmes
+MODELES_VERSIONNES = (User, Utilisateur, Compagnie_Assurance, Information, Historique, Notification)
+
+
+def incrementer_version(sender, **kwargs):
+    VersionModele.incrementer(sender)
+
+
+def incrementer_version_suppression(sender, **kwargs):
+    """Une suppression modifie aussi les modèles qui la référencent (CASCADE, SET_NULL sans signal)"""
+    VersionModele.incrementer(sender, *(relation.related_model for relation in sender._meta.related_objects))
+
+
+for modele in MODELES_VERSIONNES:
+    post_save.connect(incrementer_version, sender=modele, dispatch_uid=f'version_{modele._meta.label_lower}')
+    post_delete.connect(
+        incrementer_version_suppression, sender=modele, dispatch_uid=f'version_suppression_{modele._meta.label_lower}'
+    )
+
+
+@receiver(m2m_changed, sender=Compagnie_Assurance.notifications.through)
+def incrementer_version_notifications_compagnie(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        VersionModele.incrementer(Compagnie_Assurance, Notification)
+
+
+def _champs_indexes_modifies(update_fields, champs):
+    return update_fields is None or bool(set(update_fields) & set(champs))
+
+
+@receiver(post_save, sender=Utilisateur)
+@receiver(post_delete, sender=Utilisateur)
+def indexer_utilisateur(sender, instance, update_fields=None, **kwargs):
+    if _champs_indexes_modifies(update_fields, recherche.CHAMPS_UTILISATEUR):
+        recherche.indexer([instance.pk])
+
+
+@receiver(post_save, sender=Information)
+@receiver(post_delete, sender=Information)
+def indexer_information(sender, instance, update_fields=None, **kwargs):
+    if _champs_indexes_modifies(update_fields, (*recherche.CHAMPS_INFORMATION, 'utilisateur')):
+        # Une information qui change d'utilisateur sort aussi du document de l'ancien
+        ancien, _nouveau = getattr(instance, 'modifications', {}).get('utilisateur', (None, None))
+        recherche.indexer([instance.utilisateur_id, ancien])
+
+
+@receiver(post_delete, sender=Information)
+def retirer_information_des_statistiques(sender, instance, **kwargs):
+    statut, compagnie = instance.en_base() or (instance.statut, instance.compagnie_assurance_id)
+    StatistiqueCompagnie.ajuster({(compagnie, statut): -1})
+
+
+@receiver(post_delete, sender=Notification)
+def retirer_notification_des_statistiques(sender, instance, **kwargs):
+    StatistiqueJour.compter_notifications([instance], signe=-1)
+
+
+@receiver(post_delete, sender=EmailEnAttente)
+def retirer_email_des_statistiques(sender, instance, **kwargs):
+    StatistiqueJour.compter_email(instance, signe=-1)
+
+
+@receiver(post_delete, sender=Compagnie_Assurance)
+def statistiques_compagnie_supprimee(sender, instance, **kwargs):
+    """Les informations de la compagnie sont passées sans compagnie (SET_NULL, sans signal) :
+    ses compteurs vont à SANS_COMPAGNIE"""
+    ligne = StatistiqueCompagnie.objects.filter(pk=instance.pk).first()
+    if ligne is not None:
+        ligne.delete()
+        StatistiqueCompagnie.ajuster({(None, True): ligne.confirmees, (None, False): ligne.en_attente})
@@ -0,0 +1,36 @@
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Backend SQLite pour les accès concurrents (ENGINE 'data_info.sqlite').
+
+    Applique à chaque connexion les PRAGMAS de OPTIONS['PRAGMAS'] (fusionnés
+    avec les valeurs par défaut ci-dessus) et ouvre les transactions en
+    BEGIN IMMEDIATE sauf si OPTIONS['transaction_mode'] dit autrement :
+    l'écrivain prend le verrou dès le début de la transaction et attend
+    busy_timeout au lieu d'échouer en passant d'une lecture à une écriture.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **kwargs.pop('PRAGMAS', {})}
+        if 'transaction_mode' not in self.settings_dict['OPTIONS']:
+            self.transaction_mode = 'IMMEDIATE'
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for nom, valeur in self.pragmas.items():
+            if nom == 'journal_mode' and self.is_in_memory_db():
+                continue
+            conn.execute(f"PRAGMA {nom} = {valeur}")
+        return conn
@@ -0,0 +1,89 @@
+"""
+Statistiques du tableau de bord, lues dans deux tables de compteurs.
+
+StatistiqueCompagnie (informations confirmées / en attente par compagnie)
+et StatistiqueJour (notifications, emails envoyés et abandonnés par jour)
+sont ajustées dans la transaction de chaque écriture : Information.save,
+confirmer, generer_notifications, Notification.save, l'outbox, l'import,
+et les suppressions (signals.py). Une lecture coûte donc une ligne par
+compagnie et par jour, quel que soit le nombre d'informations.
+
+reconstruire() recalcule les deux tables depuis les lignes (commande
+reconstruire_statistiques, fin de jeu_de_donnees).
+"""
+
+from django.apps import apps as registre
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+from .models import EmailEnAttente, StatistiqueCompagnie, StatistiqueJour
+
+
+def reconstruire(apps=registre):
+    """Recalcule les compteurs depuis les informations, notifications et emails.
+
+    ``apps`` permet l'appel depuis une migration, avec les modèles historiques.
+    Renvoie (lignes par compagnie, lignes par jour).
+    """
+    Information = apps.get_model('data_info', 'Information')
+    Notification = apps.get_model('data_info', 'Notification')
+    Email = apps.get_model('data_info', 'EmailEnAttente')
+    ParCompagnie = apps.get_model('data_info', 'StatistiqueCompagnie')
+    ParJour = apps.get_model('data_info', 'StatistiqueJour')
+
+    # Lecture et réécriture dans une même transaction : aucune écriture concurrente n'est perdue
+    with transaction.atomic():
+        compagnies = {}
+        for compagnie_id, confirmees, en_attente in Information.objects.order_by().values_list('compagnie_assurance_id') \
+                .annotate(confirmees=Count('pk', filter=Q(statut=True)), en_attente=Count('pk', filter=Q(statut=False))) \
+                .values_list('compagnie_assurance_id', 'confirmees', 'en_attente'):
+            compteurs = compagnies.setdefault(compagnie_id or StatistiqueCompagnie.SANS_COMPAGNIE, {'confirmees': 0, 'en_attente': 0})
+            compteurs['confirmees'] += confirmees
+            compteurs['en_attente'] += en_attente
+
+        jours = {}
+        comptages = [
+            ('notifications', Notification.objects.filter(date_envoi__isnull=False), 'date_envoi'),
+            ('emails_envoyes', Email.objects.filter(statut=EmailEnAttente.ENVOYE, date_envoi__isnull=False), 'date_envoi'),
+            ('emails_echec', Email.objects.filter(statut=EmailEnAttente.ECHEC), 'prochaine_tentative'),
+        ]
+        for champ, queryset, date in comptages:
+            for jour, nombre in queryset.order_by().annotate(jour=TruncDate(date)).values_list('jour') \
+                    .annotate(nombre=Count('pk')).values_list('jour', 'nombre'):
+                jours.setdefault(jour, {})[champ] = nombre
+
+        ParCompagnie.objects.all().delete()
+        ParJour.objects.all().delete()
+        ParCompagnie.objects.bulk_create([
+            ParCompagnie(compagnie_id=compagnie_id, **compteurs)
+            for compagnie_id, compteurs in sorted(compagnies.items())
+        ])
+        ParJour.objects.bulk_create([
+            ParJour(jour=jour, **compteurs) for jour, compteurs in sorted(jours.items())
+        ])
+    return len(compagnies), len(jours)
+
+
+def tableau_de_bord(debut=None, fin=None):
+    """Compteurs par compagnie, par jour de ``debut`` à ``fin`` (inclus), et totaux de la période"""
+    compagnies = list(StatistiqueCompagnie.objects.order_by('compagnie_id'))
+    jours = StatistiqueJour.objects.order_by('jour')
+    if debut is not None:
+        jours = jours.filter(jour__gte=debut)
+    if fin is not None:
+        jours = jours.filter(jour__lte=fin)
+    jours = list(jours)
+
+    envoyes = sum(jour.emails_envoyes for jour in jours)
+    echecs = sum(jour.emails_echec for jour in jours)
+    return {
+        'compagnies': compagnies,
+        'jours': jours,
+        'confirmees': sum(ligne.confirmees for ligne in compagnies),
+        'en_attente': sum(ligne.en_attente for ligne in compagnies),
+        'notifications': sum(jour.notifications for jour in jours),
+        'emails_envoyes': envoyes,
+        'emails_echec': echecs,
+        'taux_echec': echecs / (envoyes + echecs) if envoyes + echecs else None,
+    }
@@ -1,3 +1,1645 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import re
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models.signals import post_save
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from schema_root import schema
+
+from . import cache, canaux, cout, outbox, statistiques
+from .authentification import JETONS, LISTE_NOIRE, authentifier
+from .documents import empreinte
+from .historique import archiver_mois, lire_archives, mois_a_archiver
+from .importation import ImportateurInformations, lire_lignes
+from .loaders import RelationLoader
+from .models import (
+    BudgetClient, Compagnie_Assurance, EmailEnAttente, Historique, Information, MessageCanal, Notification,
+    StatistiqueCompagnie, StatistiqueJour, Utilisateur, VersionModele, mois_de,
+)
+from .reessais import ReessaiMiddleware
+from .views import AsyncDataInfoGraphQLView, DataInfoGraphQLView
+from .websocket import ServeurAbonnements
+
+def requetes(contexte):
+    """Requêtes capturées, sans celles du budget de coût (table BudgetClient, voir cout.py) ni
+    les points de sauvegarde qui l'entourent dans la transaction d'un test"""
+    table = BudgetClient._meta.db_table
+    return [
+        requete for requete in contexte.captured_queries
+        if table not in requete['sql'] and 'SAVEPOINT' not in requete['sql']
+    ]
+
+
+# Lignes d'EXPLAIN QUERY PLAN qui parcourent une table entière sans index
+SCAN_COMPLET = re.compile(r'^SCAN (\w+)$')
+TRI_TEMPORAIRE = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class QueryPlanTests(TestCase):
+    """Vérifie que chaque resolver de lecture passe par un index sur un jeu de données volumineux.
+
+    Chaque requête GraphQL est exécutée, puis le plan SQLite de chaque requête
+    SQL filtrée (WHERE) est inspecté : un ``SCAN table`` sans index ou un tri
+    temporaire sur une requête paginée fait échouer le test.
+    """
+
+    NB_UTILISATEURS = 200
+    NB_INFORMATIONS_PAR_UTILISATEUR = 10
+    NB_COMPAGNIES = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        compagnies = Compagnie_Assurance.objects.bulk_create([
+            Compagnie_Assurance(nom_compagnie=f"Compagnie {i}", email_compagnie=f"compagnie{i}@example.com")
+            for i in range(cls.NB_COMPAGNIES)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f"user{i}", email=f"user{i}@example.com") for i in range(cls.NB_UTILISATEURS)
+        ])
+        utilisateurs = Utilisateur.objects.bulk_create([
+            Utilisateur(user=user, nom=f"Nom{i}", prenom=f"Prenom{i}", email=user.email, role="employe", mot_de_passe="x")
+            for i, user in enumerate(users)
+        ])
+        informations = Information.objects.bulk_create([
+            Information(
+                utilisateur=utilisateur,
+                compagnie_assurance=compagnies[(i + j) % cls.NB_COMPAGNIES],
+                numero_employe=f"EMP-{i}-{j}",
+                cin=f"CIN-{i}-{j}",
+                statut=bool(j % 2),
+            )
+            for i, utilisateur in enumerate(utilisateurs)
+            for j in range(cls.NB_INFORMATIONS_PAR_UTILISATEUR)
+        ])
+        historiques = Historique.objects.bulk_create([
+            Historique(type_action="envoye", description=f"Information {information.pk}")
+            for information in informations
+        ])
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                historique=historique,
+                information=information,
+                objet="Confirmation d'information",
+                destinataire=f"dest{information.pk % 50}@example.com",
+                statut=True,
+            )
+            for historique, information in zip(historiques, informations)
+        ])
+        Lien = Compagnie_Assurance.notifications.through
+        Lien.objects.bulk_create([
+            Lien(compagnie_assurance_id=notification.information.compagnie_assurance_id, notification_id=notification.pk)
+            for notification in notifications
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def executer(self, query, variables=None):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.post(
+                '/graphql/', json.dumps({'query': query, 'variables': variables}), content_type='application/json'
+            )
+        contenu = json.loads(response.content)
+        self.assertNotIn('errors', contenu, contenu.get('errors'))
+        return contenu['data'], [requete['sql'] for requete in requetes.captured_queries]
+
+    def verifier_plans(self, sqls):
+        for sql in sqls:
+            if not sql.lstrip().upper().startswith('SELECT') or ' WHERE ' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [ligne[-1] for ligne in cursor.fetchall()]
+            for etape in plan:
+                self.assertIsNone(
+                    SCAN_COMPLET.match(etape),
+                    f"Parcours complet de table :\n{sql}\nPlan : {plan}"
+                )
+                if ' LIMIT ' in sql:
+                    self.assertNotIn(TRI_TEMPORAIRE, etape, f"Tri sans index :\n{sql}\nPlan : {plan}")
+
+    def verifier(self, query, variables=None):
+        data, sqls = self.executer(query, variables)
+        self.verifier_plans(sqls)
+        return data
+
+    def test_utilisateur_par_id_et_email(self):
+        self.verifier('{ utilisateurById(id: 42) { nom informations { cin notifications { objet } } } }')
+        self.verifier('{ utilisateurByEmail(email: "user42@example.com") { nom user { username } } }')
+
+    def test_information_par_id_et_par_utilisateur(self):
+        self.verifier('{ informationById(id: 42) { cin utilisateur { nom } compagnieAssurance { nomCompagnie } } }')
+        self.verifier('{ informationsByUtilisateur(utilisateurId: 42) { cin notifications { destinataire } } }')
+
+    def test_historique_et_notification_par_id(self):
+        self.verifier('{ historiqueById(id: 42) { typeAction notifications { objet } } }')
+        self.verifier('{ notificationById(id: 42) { objet information { cin } compagniesAssurance { nomCompagnie } } }')
+
+    def test_compagnie_par_id_et_nom(self):
+        self.verifier('{ compagnieById(id: 3) { nomCompagnie informations { cin } notifications { objet } } }')
+        self.verifier('{ compagnieByNom(nom: "Compagnie 7") { nomCompagnie } }')
+
+    def test_pages_des_connexions(self):
+        for champ in ('informationsConnection', 'historiquesConnection', 'notificationsConnection',
+                      'utilisateursConnection', 'compagniesConnection'):
+            with self.subTest(champ=champ):
+                query = 'query($apres: String) { %s(first: 20, after: $apres) { pageInfo { endCursor } edges { node { __typename } } } }' % champ
+                data = self.verifier(query)
+                curseur = data[champ]['pageInfo']['endCursor']
+                self.verifier(query, {'apres': curseur})
+
+    def test_relations_prechargees(self):
+        self.verifier('{ informationsConnection(first: 50) { edges { node { cin utilisateur { nom } notifications { objet compagniesAssurance { nomCompagnie } } } } } }')
+
+
+class RelationLoaderTests(TestCase):
+    """Relations chargées par lot : une requête par relation et par niveau, quel que soit le nombre d'instances"""
+
+    @classmethod
+    def setUpTestData(cls):
+        compagnies = Compagnie_Assurance.objects.bulk_create([Compagnie_Assurance(nom_compagnie=f"C{i}") for i in range(2)])
+        users = User.objects.bulk_create([User(username=f"user{i}") for i in range(3)])
+        utilisateurs = Utilisateur.objects.bulk_create([Utilisateur(user=user, nom=f"Nom{i}") for i, user in enumerate(users)])
+        informations = Information.objects.bulk_create([
+            Information(utilisateur=utilisateurs[i % 3], compagnie_assurance=compagnies[i % 2], statut=True)
+            for i in range(6)
+        ])
+        notifications = Notification.objects.bulk_create([
+            Notification(information=information, objet="Confirmation") for information in informations for _ in range(2)
+        ])
+        Lien = Compagnie_Assurance.notifications.through
+        Lien.objects.bulk_create([
+            Lien(compagnie_assurance_id=notification.information.compagnie_assurance_id, notification_id=notification.pk)
+            for notification in notifications
+        ])
+
+    def test_une_requete_par_relation(self):
+        loader = RelationLoader()
+        informations = list(Information.objects.all())
+        loader.enregistrer(informations)
+        with self.assertNumQueries(1):
+            noms = {loader.charger(information, 'utilisateur').nom for information in informations}
+        self.assertEqual(noms, {"Nom0", "Nom1", "Nom2"})
+        with self.assertNumQueries(1):
+            notifications = [
+                notification for information in informations
+                for notification in loader.charger(information, 'notifications').all()
+            ]
+        self.assertEqual(len(notifications), 12)
+        # Les objets chargés forment le groupe du niveau suivant
+        with self.assertNumQueries(1):
+            for notification in notifications:
+                self.assertEqual(len(loader.charger(notification, 'compagnies_assurance').all()), 1)
+        self.assertEqual(loader.lots, 3)
+
+    def test_requetes_graphql_independantes_du_nombre_de_lignes(self):
+        query = '{ utilisateurById(id: %d) { nom informations { cin notifications { objet compagniesAssurance { nomCompagnie } } } } }'
+        comptes = []
+        for utilisateur in Utilisateur.objects.order_by('pk')[:2]:
+            if comptes:
+                # Le second utilisateur a trois fois plus d'informations
+                Information.objects.filter(utilisateur__in=Utilisateur.objects.exclude(pk=utilisateur.pk)).update(utilisateur=utilisateur)
+            with CaptureQueriesContext(connection) as contexte:
+                reponse = self.client.post('/graphql/', json.dumps({'query': query % utilisateur.pk}), content_type='application/json')
+            self.assertNotIn('errors', reponse.json())
+            comptes.append(len([requete for requete in requetes(contexte) if requete['sql'].startswith('SELECT')]))
+        self.assertEqual(comptes[0], comptes[1])
+        # Versions du cache de résultats, puis une requête par niveau
+        self.assertLessEqual(comptes[1], 5)
+
+
+class OptimiseurTests(TestCase):
+    """Requêtes racine adaptées à la sélection : jointures, préchargements et colonnes demandées seulement"""
+
+    @classmethod
+    def setUpTestData(cls):
+        compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie")
+        for i in range(3):
+            utilisateur = Utilisateur.objects.create(user=User.objects.create(username=f"user{i}"), nom=f"Nom{i}")
+            Information.objects.bulk_create([
+                Information(utilisateur=utilisateur, compagnie_assurance=compagnie, cin=f"CIN-{i}-{j}", adresse="Adresse", statut=False)
+                for j in range(4)
+            ])
+
+    def selects(self, query):
+        with CaptureQueriesContext(connection) as contexte:
+            reponse = self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json')
+        self.assertNotIn('errors', reponse.json())
+        return reponse.json()['data'], [requete['sql'] for requete in requetes(contexte) if requete['sql'].startswith('SELECT')]
+
+    def test_jointure_et_colonnes(self):
+        data, selects = self.selects('{ informations { cin utilisateur { nom } } }')
+        self.assertEqual(len(data['informations']), 12)
+        self.assertEqual(len(selects), 1)
+        self.assertIn('JOIN "data_info_utilisateur"', selects[0])
+        self.assertNotIn('"adresse"', selects[0])
+        self.assertNotIn('"mot_de_passe"', selects[0])
+
+    def test_prechargement_imbrique(self):
+        data, selects = self.selects('{ utilisateurs { nom informations { cin compagnieAssurance { nomCompagnie } } } }')
+        self.assertEqual(sum(len(utilisateur['informations']) for utilisateur in data['utilisateurs']), 12)
+        # Utilisateurs, puis leurs informations jointes à leur compagnie
+        self.assertEqual(len(selects), 2)
+        self.assertIn('JOIN "data_info_compagnie_assurance"', selects[1])
+
+
+class PaginationTests(TestCase):
+    """Connexions paginées par clé : pages contiguës dans les deux sens, stables malgré les ajouts"""
+
+    QUERY = '''
+    query($first: Int, $after: String, $last: Int, $before: String) {
+        historiquesConnection(first: $first, after: $after, last: $last, before: $before) {
+            totalCount
+            pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+            edges { node { historiqueId } }
+        }
+    }'''
+
+    @classmethod
+    def setUpTestData(cls):
+        Historique.objects.bulk_create([Historique(type_action="test") for _ in range(7)])
+        # Même date partout : l'ordre (-date, -pk) départage par la clé primaire
+        Historique.objects.update(date=timezone.now())
+
+    def page(self, **variables):
+        reponse = self.client.post('/graphql/', json.dumps({'query': self.QUERY, 'variables': variables}),
+                                   content_type='application/json').json()
+        self.assertNotIn('errors', reponse)
+        connexion = reponse['data']['historiquesConnection']
+        return [int(edge['node']['historiqueId']) for edge in connexion['edges']], connexion
+
+    def test_pages_en_avant_et_en_arriere(self):
+        attendus = list(Historique.objects.order_by('-pk').values_list('pk', flat=True))
+        vus, apres, pages = [], None, []
+        while True:
+            ids, connexion = self.page(first=3, after=apres)
+            vus += ids
+            pages.append(connexion)
+            if not connexion['pageInfo']['hasNextPage']:
+                break
+            if apres is None:
+                # Un ajout pendant le parcours ne décale pas les pages suivantes
+                Historique.objects.create(type_action="ajout")
+            apres = connexion['pageInfo']['endCursor']
+        self.assertEqual(vus, attendus)
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(pages[0]['totalCount'], 7)
+        self.assertFalse(pages[0]['pageInfo']['hasPreviousPage'])
+        self.assertTrue(pages[1]['pageInfo']['hasPreviousPage'])
+
+        # La page qui précède la dernière, demandée depuis le curseur de début de celle-ci
+        ids, connexion = self.page(last=3, before=pages[2]['pageInfo']['startCursor'])
+        self.assertEqual(ids, attendus[3:6])
+        self.assertTrue(connexion['pageInfo']['hasPreviousPage'])
+        self.assertTrue(connexion['pageInfo']['hasNextPage'])
+
+    def test_arguments_invalides(self):
+        for variables in ({'first': -1}, {'first': 10 ** 6}, {'first': 3, 'after': "pas-un-curseur"}):
+            reponse = self.client.post('/graphql/', json.dumps({'query': self.QUERY, 'variables': variables}),
+                                       content_type='application/json').json()
+            self.assertEqual(len(reponse['errors']), 1, variables)
+
+
+@override_settings(EXPORT={'TAILLE_LOT': 200})
+class ExportTests(TestCase):
+    """Export en flux : contenu, filtres, et mémoire indépendante du nombre de lignes"""
+
+    NB_INFORMATIONS = 6000
+
+    @classmethod
+    def setUpTestData(cls):
+        grande = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie", email_compagnie="compagnie@example.com")
+        cls.petite = Compagnie_Assurance.objects.create(nom_compagnie="Petite", email_compagnie="petite@example.com")
+        users = User.objects.bulk_create([User(username=f"user{i}") for i in range(50)])
+        utilisateurs = Utilisateur.objects.bulk_create([
+            Utilisateur(user=user, nom=f"Nom{i}", prenom=f"Prenom{i}", email=f"user{i}@example.com", mot_de_passe="x")
+            for i, user in enumerate(users)
+        ])
+        # 4000 informations chez « Compagnie », 1000 chez « Petite », 1000 sans compagnie
+        Information.objects.bulk_create([
+            Information(
+                utilisateur=utilisateurs[i % 50],
+                compagnie_assurance=grande if i % 3 else (cls.petite if i % 6 == 0 else None),
+                numero_employe=f"EMP-{i:05d}",
+                cin=f"CIN-{i}",
+                adresse=f"Lot {i}, \"Analakely\"",
+                statut=bool(i % 2),
+            )
+            for i in range(cls.NB_INFORMATIONS)
+        ])
+        cls.entete = {'Authorization': f"Bearer {AccessToken.for_user(users[0])}"}
+
+    def exporter(self, chemin):
+        reponse = self.client.get(chemin, headers=self.entete)
+        self.assertEqual(reponse.status_code, 200)
+        return b''.join(reponse.streaming_content).decode('utf-8')
+
+    def pic_memoire(self, chemin):
+        """(lignes, pic d'allocations en octets) pendant la lecture de l'export"""
+        reponse = self.client.get(chemin, headers=self.entete)
+        self.assertEqual(reponse.status_code, 200)
+        tracemalloc.start()
+        try:
+            lignes = sum(morceau.count(b'\n') for morceau in reponse.streaming_content)
+            return lignes, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_csv_colonnes_et_jointures(self):
+        contenu = self.exporter('/export/informations?colonnes=numero_employe,adresse,utilisateur_nom,compagnie_nom')
+        lignes = list(csv.reader(io.StringIO(contenu)))
+        self.assertEqual(lignes[0], ['numero_employe', 'adresse', 'utilisateur_nom', 'compagnie_nom'])
+        self.assertEqual(len(lignes) - 1, self.NB_INFORMATIONS)
+        self.assertEqual(lignes[2], ['EMP-00001', 'Lot 1, "Analakely"', 'Nom1', 'Compagnie'])
+        self.assertEqual(lignes[4][3], '')  # information 3 : sans compagnie
+
+    def test_filtres(self):
+        contenu = self.exporter(f'/export/informations?format=ndjson&statut=false&compagnie={self.petite.pk}&colonnes=cin,statut')
+        lignes = [json.loads(ligne) for ligne in contenu.splitlines()]
+        self.assertEqual(len(lignes), self.NB_INFORMATIONS // 6)
+        self.assertEqual(lignes[0], {'cin': 'CIN-0', 'statut': False})
+
+        Historique.objects.create(type_action="envoye", description="dans la période")
+        contenu = self.exporter('/export/historiques?format=ndjson&debut=2000-01-01T00:00:00Z&colonnes=type_action,description')
+        self.assertEqual([json.loads(ligne) for ligne in contenu.splitlines()],
+                         [{'type_action': 'envoye', 'description': 'dans la période'}])
+        self.assertEqual(self.exporter('/export/historiques?fin=2000-01-01T00:00:00Z&colonnes=date'), 'date\r\n')
+
+    def test_parametres_invalides_et_authentification(self):
+        for chemin in ('/export/inconnue', '/export/informations?format=xml', '/export/informations?colonnes=mot_de_passe',
+                       '/export/informations?statut=peut-etre', '/export/historiques?debut=hier'):
+            with self.subTest(chemin=chemin):
+                self.assertEqual(self.client.get(chemin, headers=self.entete).status_code, 400)
+        self.assertEqual(self.client.get('/export/informations').status_code, 401)
+
+    def test_memoire_constante(self):
+        lignes_petit, petit = self.pic_memoire(f'/export/informations?format=ndjson&compagnie={self.petite.pk}')
+        lignes_grand, grand = self.pic_memoire('/export/informations?format=ndjson')
+        self.assertEqual((lignes_petit, lignes_grand), (self.NB_INFORMATIONS // 6, self.NB_INFORMATIONS))
+        # Six fois plus de lignes avec la même taille de lot : le pic reste celui d'un lot
+        self.assertLess(grand, petit * 1.5, f"Pic de {grand} octets pour {lignes_grand} lignes, {petit} pour {lignes_petit}")
+
+
+class DocumentsTests(TestCase):
+    """Documents analysés une fois, requêtes persistées (APQ) et liste autorisée"""
+
+    def envoyer(self, query=None, hash=None):
+        corps = {'query': query} if query else {}
+        if hash:
+            corps['extensions'] = {'persistedQuery': {'version': 1, 'sha256Hash': hash}}
+        return self.client.post('/graphql/', json.dumps(corps), content_type='application/json').json()
+
+    def test_cache_des_documents(self):
+        documents = DataInfoGraphQLView.documents
+        query = '{ compagnies { nomCompagnie } } # test_cache_des_documents'
+        hits, misses = documents.hits, documents.misses
+        self.assertNotIn('errors', self.envoyer(query))
+        self.assertNotIn('errors', self.envoyer(query))
+        self.assertEqual((documents.hits - hits, documents.misses - misses), (1, 1))
+
+    def test_requete_persistee(self):
+        query = '{ compagnies { nomCompagnie } } # test_requete_persistee'
+        hash = empreinte(query)
+        # Hash inconnu : le client renvoie le document complet
+        self.assertEqual(self.envoyer(hash=hash)['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+        self.assertEqual(self.envoyer(query, hash), {'data': {'compagnies': []}})
+        self.assertEqual(self.envoyer(hash=hash), {'data': {'compagnies': []}})
+        self.assertEqual(self.envoyer(query, '0' * 64)['errors'][0]['extensions']['code'], 'BAD_REQUEST')
+
+    @override_settings(GRAPHQL_DOCUMENTS={**settings.GRAPHQL_DOCUMENTS, 'LISTE_AUTORISEE': True})
+    def test_liste_autorisee(self):
+        enregistree = 'query Compagnies {\n  compagnies {\n    compagnieId\n    nomCompagnie\n    adresseCompagnie\n    emailCompagnie\n  }\n}'
+        self.assertNotIn('errors', self.envoyer(hash=empreinte(enregistree)))
+        # Même opération mise en forme autrement, avec les __typename d'Apollo
+        self.assertNotIn('errors', self.envoyer(
+            'query Compagnies { compagnies { __typename compagnieId nomCompagnie adresseCompagnie emailCompagnie } }'
+        ))
+        self.assertEqual(self.envoyer('{ compagnies { nomCompagnie } }')['errors'][0]['extensions']['code'],
+                         'PERSISTED_QUERY_NOT_ALLOWED')
+
+
+class CoutTests(TestCase):
+    """Limites de coût des opérations GraphQL et budget par client"""
+
+    QUERY = '{ compagniesConnection(first: 10) { edges { node { nomCompagnie } } } }'  # coût 1 + 10 × 2
+
+    def lire(self, query=None, proxy='10.0.0.1', forwarded_for=None):
+        entetes = {'X-Forwarded-For': forwarded_for} if forwarded_for else {}
+        return self.client.post(
+            '/graphql/', json.dumps({'query': query or self.QUERY}), content_type='application/json',
+            headers=entetes, REMOTE_ADDR=proxy,
+        ).json()
+
+    @override_settings(GRAPHQL_COUT={**settings.GRAPHQL_COUT, 'PROFONDEUR_MAX': 5})
+    def test_refus_par_profondeur(self):
+        query = '{ utilisateursConnection(first: 1) { edges { node { informations { compagnieAssurance { nomCompagnie } } } } } }'
+        with CaptureQueriesContext(connection) as contexte:
+            erreur = self.lire(query)['errors'][0]
+        self.assertEqual(erreur['extensions']['code'], 'PROFONDEUR_MAX')
+        self.assertEqual(erreur['extensions']['profondeur'], 6)
+        self.assertIn("profondeur 6 (maximum 5)", erreur['message'])
+        self.assertEqual(requetes(contexte), [])  # refusée à la validation, aucun resolver exécuté
+        self.assertNotIn('errors', self.lire(
+            '{ utilisateursConnection(first: 1) { edges { node { informations { numeroEmploye } } } } }'
+        ))
+
+    def test_refus_par_cout(self):
+        # 50 compagnies supposées × (1 + 1000 informations × (1 + 1 utilisateur))
+        query = 'query Lourde { compagnies { informations { utilisateur { nom } } } }'
+        erreur = self.lire(query)['errors'][0]
+        self.assertEqual(erreur['extensions']['code'], 'COUT_MAX')
+        self.assertEqual(erreur['extensions']['cout'], 100050)
+        self.assertEqual(erreur['message'], "Opération Lourde trop coûteuse : coût estimé 100050 (maximum 20000)")
+        # Une connexion paginée est comptée d'après first
+        self.assertNotIn('errors', self.lire(
+            '{ compagniesConnection(first: 5) { edges { node { informations { utilisateur { nom } } } } } }'
+        ))
+
+    @override_settings(GRAPHQL_COUT={**settings.GRAPHQL_COUT, 'BUDGET': 50})
+    def test_budget_par_adresse_du_client(self):
+        # Derrière l'ingress, le client est l'adresse ajoutée par le proxy, pas une adresse fournie par le client
+        self.assertNotIn('errors', self.lire(proxy='10.0.0.1', forwarded_for="1.1.1.1, 203.0.113.5"))
+        self.assertNotIn('errors', self.lire(proxy='10.0.0.2', forwarded_for="2.2.2.2, 203.0.113.5"))
+        erreur = self.lire(forwarded_for="203.0.113.5")['errors'][0]
+        self.assertEqual(erreur['extensions']['code'], 'BUDGET_DEPASSE')
+        self.assertEqual((erreur['extensions']['consomme'], erreur['extensions']['cout']), (42, 21))
+        self.assertNotIn('errors', self.lire(forwarded_for="203.0.113.6"))
+
+    def test_purge_des_fenetres_passees(self):
+        cout._derniere_purge = None
+        BudgetClient.objects.create(cle="ip:203.0.113.5:1", fenetre=1, consomme=10)
+        self.assertNotIn('errors', self.lire(forwarded_for="203.0.113.5"))
+        self.assertEqual(list(BudgetClient.objects.values_list('consomme', flat=True)), [21])
+
+    def test_base_indisponible(self):
+        # Table absente (migration non appliquée) ou base verrouillée : l'opération passe sans être décomptée
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE "{BudgetClient._meta.db_table}"')
+        with self.assertLogs('data_info.cout', 'WARNING'):
+            self.assertNotIn('errors', self.lire())
+
+
+class MetriquesTests(TestCase):
+    """/metrics : réseaux internes ou requêtes authentifiées seulement"""
+
+    def test_acces(self):
+        self.client.post('/graphql/', json.dumps({'query': 'query Compagnies { compagnies { nomCompagnie } }'}),
+                         content_type='application/json')
+        reponse = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('operation="Compagnies"', reponse.content.decode())
+
+        # Par l'ingress : l'adresse du client est celle ajoutée par le proxy
+        depuis_internet = {'REMOTE_ADDR': '10.0.0.1', 'headers': {'X-Forwarded-For': "10.0.0.9, 203.0.113.5"}}
+        self.assertEqual(self.client.get('/metrics', **depuis_internet).status_code, 401)
+        jeton = AccessToken.for_user(User.objects.create(username="rh"))
+        depuis_internet['headers']['Authorization'] = f"Bearer {jeton}"
+        self.assertEqual(self.client.get('/metrics', **depuis_internet).status_code, 200)
+
+
+class CacheResultatsTests(TestCase):
+    """Resolvers racine en cache : lecture des seules versions, entrées invalidées par les écritures"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie", email_compagnie="c@example.com")
+        cls.utilisateur = Utilisateur.objects.create(
+            user=User.objects.create(username="u"), nom="Nom", prenom="Prenom", email="u@example.com", mot_de_passe="x"
+        )
+        information = Information.objects.create(utilisateur=cls.utilisateur, compagnie_assurance=cls.compagnie, statut=False)
+        cls.notification = Notification.objects.create(
+            historique=Historique.objects.create(type_action="envoye", description="x"),
+            information=information, objet="Objet", statut=True,
+        )
+
+    def setUp(self):
+        caches[cache.ALIAS].clear()
+
+    def executer(self, query, **variables):
+        contenu = self.client.post(
+            '/graphql/', json.dumps({'query': query, 'variables': variables}), content_type='application/json'
+        ).json()
+        self.assertNotIn('errors', contenu, contenu.get('errors'))
+        return contenu['data']
+
+    def lire(self, query):
+        """Exécute ``query`` ; renvoie les données et si elles viennent du cache"""
+        hits = cache.statistiques['hits']
+        data = self.executer(query)
+        return data, cache.statistiques['hits'] > hits
+
+    def test_lecture_en_cache(self):
+        query = '{ compagnies { nomCompagnie } utilisateurById(id: %d) { nom } }' % self.utilisateur.pk
+        self.assertFalse(self.lire(query)[1])
+        with CaptureQueriesContext(connection) as contexte:
+            data, en_cache = self.lire(query)
+        self.assertTrue(en_cache)
+        self.assertEqual(data['compagnies'], [{'nomCompagnie': "Compagnie"}])
+        # Une lecture des versions par champ en cache
+        self.assertEqual(len(requetes(contexte)), 2)
+        for requete in requetes(contexte):
+            self.assertIn(VersionModele._meta.db_table, requete['sql'])
+
+    def test_invalidation_par_un_autre_worker(self):
+        """Une écriture faite ailleurs (autre worker, écriture en masse) sans signal n'incrémente que VersionModele"""
+        lecture = '{ compagnies { nomCompagnie } }'
+        self.lire(lecture)
+        self.assertTrue(self.lire(lecture)[1])
+        Compagnie_Assurance.objects.filter(pk=self.compagnie.pk).update(nom_compagnie="Ailleurs")
+        VersionModele.incrementer(Compagnie_Assurance)
+        data, en_cache = self.lire(lecture)
+        self.assertFalse(en_cache)
+        self.assertEqual(data['compagnies'], [{'nomCompagnie': "Ailleurs"}])
+
+    def test_invalidation_par_les_mutations(self):
+        compagnie = self.compagnie.pk
+        lecture = '{ compagnies { nomCompagnie } compagnieById(id: %d) { nomCompagnie } }' % compagnie
+        mutations = [
+            ('mutation($id: ID!) { updateCompagnieAssurance(id: $id, compagnieData: {nomCompagnie: "Renommée"}) { compagnie { nomCompagnie } } }',
+             {'id': compagnie}),
+            ('mutation { createCompagnieAssurance(compagnieData: {nomCompagnie: "Nouvelle", emailCompagnie: "n@example.com"}) { compagnie { compagnieId } } }',
+             {}),
+            ('mutation($id: ID!, $ids: [ID]) { updateCompagnieAssurance(id: $id, compagnieData: {notificationIds: $ids}) { compagnie { compagnieId } } }',
+             {'id': compagnie, 'ids': [self.notification.pk]}),
+        ]
+        for mutation, variables in mutations:
+            with self.subTest(mutation=mutation):
+                self.lire(lecture)
+                self.assertTrue(self.lire(lecture)[1])
+                self.executer(mutation, **variables)
+                data, en_cache = self.lire(lecture)
+                self.assertFalse(en_cache)
+                self.assertEqual(data['compagnies'], [{'nomCompagnie': nom} for nom in
+                                 Compagnie_Assurance.objects.order_by('pk').values_list('nom_compagnie', flat=True)])
+
+        supprimee = Compagnie_Assurance.objects.get(nom_compagnie="Nouvelle").pk
+        self.lire(lecture)
+        self.executer('mutation($id: ID!) { deleteCompagnieAssurance(id: $id) { success } }', id=supprimee)
+        data, en_cache = self.lire(lecture)
+        self.assertFalse(en_cache)
+        self.assertEqual(data['compagnies'], [{'nomCompagnie': "Renommée"}])
+        self.assertEqual(data['compagnieById'], {'nomCompagnie': "Renommée"})
+
+    def test_invalidation_utilisateur(self):
+        lecture = '{ utilisateurById(id: %d) { nom } }' % self.utilisateur.pk
+        self.lire(lecture)
+        self.assertTrue(self.lire(lecture)[1])
+        self.executer('mutation($id: ID!) { updateUtilisateur(id: $id, utilisateurData: {nom: "Autre"}) { utilisateur { nom } } }',
+                      id=self.utilisateur.pk)
+        data, en_cache = self.lire(lecture)
+        self.assertFalse(en_cache)
+        self.assertEqual(data['utilisateurById'], {'nom': "Autre"})
+
+
+class CacheHttpTests(TestCase):
+    """Lectures en GET : ETag fort, 304 sans exécution, ETag changé par une écriture"""
+
+    QUERY = 'query Compagnies { compagniesConnection(first: 10) { totalCount edges { node { nomCompagnie } } } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie", email_compagnie="c@example.com")
+
+    def lire(self, etag=None, **parametres):
+        entetes = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/graphql/', parametres or {'query': self.QUERY}, headers=entetes)
+
+    def test_etag_et_304(self):
+        reponse = self.lire()
+        self.assertEqual(reponse.status_code, 200)
+        etag = reponse['ETag']
+        self.assertRegex(etag, r'^"[0-9a-f]{64}"$')
+        self.assertEqual(reponse['Cache-Control'], 'no-cache')
+
+        # Même ETag par le hash de requête persistée, une fois le document appris
+        extensions = json.dumps({'persistedQuery': {'version': 1, 'sha256Hash': empreinte(self.QUERY)}})
+        self.assertEqual(self.lire(query=self.QUERY, extensions=extensions)['ETag'], etag)
+        self.assertEqual(self.lire(extensions=extensions)['ETag'], etag)
+
+        with self.assertNumQueries(1):  # lecture des versions, aucun resolver
+            reponse = self.lire(etag)
+        self.assertEqual(reponse.status_code, 304)
+        self.assertEqual(reponse.content, b'')
+        self.assertEqual(reponse['ETag'], etag)
+        self.assertEqual(self.lire(f'W/{etag}').status_code, 304)
+
+        self.compagnie.nom_compagnie = "Renommée"
+        self.compagnie.save()
+        reponse = self.lire(etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+
+    def test_ecriture_sur_un_autre_modele(self):
+        etag = self.lire()['ETag']
+        Historique.objects.create(type_action="modification", description="x")
+        self.assertEqual(self.lire(etag).status_code, 304)
+
+    def test_suppression_qui_modifie_les_lignes_liees(self):
+        utilisateur = Utilisateur.objects.create(
+            user=User.objects.create(username="u"), nom="Nom", prenom="Prenom", email="u@example.com", mot_de_passe="x"
+        )
+        Information.objects.create(utilisateur=utilisateur, compagnie_assurance=self.compagnie, numero_employe="EMP", statut=False)
+        query = '{ informationsConnection(first: 10) { edges { node { compagnieAssurance { compagnieId } } } } }'
+        etag = self.lire(query=query)['ETag']
+        # Les informations passent sans compagnie par SET_NULL, sans signal sur Information
+        Compagnie_Assurance.objects.create(nom_compagnie="Autre", email_compagnie="a@example.com").delete()
+        self.assertEqual(self.lire(etag, query=query).status_code, 200)
+
+    @override_settings(CACHE_HTTP={'MAX_AGE': {'Compagnies': 60}})
+    def test_max_age_par_operation(self):
+        self.assertEqual(self.lire()['Cache-Control'], 'public, max-age=60')
+        # POST et mutations ne sont jamais mis en cache
+        reponse = self.client.post('/graphql/', {'query': self.QUERY}, content_type='application/json')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertFalse(reponse.has_header('ETag'))
+
+
+class LotTests(TestCase):
+    """Lots d'opérations : ordre, transaction unique, annulation par opération ou du lot entier"""
+
+    RENOMMER = 'mutation($id: ID!, $nom: String!) { %s: updateCompagnieAssurance(id: $id, compagnieData: {nomCompagnie: $nom}) { compagnie { nomCompagnie } } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnies = Compagnie_Assurance.objects.bulk_create([
+            Compagnie_Assurance(nom_compagnie=f"C{i}", email_compagnie=f"c{i}@example.com") for i in range(2)
+        ])
+
+    def renommer(self, alias, compagnie_id, nom):
+        return {'query': self.RENOMMER % alias, 'variables': {'id': compagnie_id, 'nom': nom}}
+
+    def envoyer(self, operations, options=''):
+        return self.client.post('/graphql/' + options, json.dumps(operations), content_type='application/json')
+
+    def noms(self):
+        return list(Compagnie_Assurance.objects.order_by('pk').values_list('nom_compagnie', flat=True))
+
+    def test_operations_dans_l_ordre(self):
+        reponse = self.envoyer([
+            self.renommer('premiere', self.compagnies[0].pk, "A"),
+            self.renommer('seconde', self.compagnies[1].pk, "B"),
+            {'query': '{ compagnies { nomCompagnie } }'},
+        ])
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json(), {'data': {
+            'premiere': {'compagnie': {'nomCompagnie': "A"}},
+            'seconde': {'compagnie': {'nomCompagnie': "B"}},
+            # La lecture voit les écritures des opérations précédentes
+            'compagnies': [{'nomCompagnie': "A"}, {'nomCompagnie': "B"}],
+        }})
+
+    def test_operation_en_erreur_annulee_seule(self):
+        reponse = self.envoyer([
+            self.renommer('a', self.compagnies[0].pk, "A"),
+            self.renommer('b', 99999, "X"),
+            self.renommer('c', self.compagnies[1].pk, "B"),
+        ], '?par_operation=true')
+        resultats = reponse.json()
+        self.assertEqual([resultat['id'] for resultat in resultats], [0, 1, 2])
+        self.assertNotIn('errors', resultats[0])
+        self.assertEqual(resultats[1]['data'], {'b': None})
+        self.assertEqual(self.noms(), ["A", "B"])
+
+    def test_tout_ou_rien(self):
+        reponse = self.envoyer([
+            self.renommer('a', self.compagnies[0].pk, "A"),
+            self.renommer('b', 99999, "X"),
+            self.renommer('c', self.compagnies[1].pk, "B"),
+        ], '?tout_ou_rien=true')
+        erreurs = reponse.json()['errors']
+        self.assertEqual([erreur.get('extensions', {}).get('operation') for erreur in erreurs], [0, 1, 2])
+        self.assertIn("non exécutée", erreurs[2]['message'])
+        self.assertEqual(self.noms(), ["C0", "C1"])
+
+    def test_lot_invalide(self):
+        self.assertEqual(self.envoyer([]).status_code, 400)
+        with self.settings(GRAPHQL_LOTS={'TAILLE_MAX': 2}):
+            self.assertEqual(self.envoyer([{'query': '{ compagnies { nomCompagnie } }'}] * 3).status_code, 400)
+
+
+class MasseTests(TestCase):
+    """Mutations ensemblistes : nombre de requêtes fixe, notifications et statistiques tenues à jour"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie", email_compagnie="c@example.com")
+        cls.utilisateur = Utilisateur.objects.create(
+            user=User.objects.create(username="u"), nom="Nom", prenom="Prenom", email="u@example.com", mot_de_passe="x"
+        )
+
+    def creer(self, nombre, debut=0):
+        return [
+            Information.objects.create(
+                utilisateur=self.utilisateur, compagnie_assurance=self.compagnie, cin=f"CIN-{i}", statut=False
+            ).pk
+            for i in range(debut, debut + nombre)
+        ]
+
+    def executer(self, mutation, **variables):
+        reponse = self.client.post(
+            '/graphql/', json.dumps({'query': mutation, 'variables': variables}), content_type='application/json'
+        )
+        contenu = reponse.json()
+        self.assertNotIn('errors', contenu)
+        return contenu['data']
+
+    def statistiques_exactes(self):
+        compteurs = lambda: sorted(  # noqa: E731
+            ligne for ligne in StatistiqueCompagnie.objects.values_list('compagnie_id', 'confirmees', 'en_attente')
+            if ligne[1] or ligne[2]
+        )
+        tenues = compteurs()
+        statistiques.reconstruire()
+        self.assertEqual(tenues, compteurs())
+
+    def test_update_informations(self):
+        mutation = 'mutation($ids: [ID!]!) { updateInformations(ids: $ids, patch: {statut: true}) { nombre notifiees } }'
+        peu, ids = self.creer(2), self.creer(40, debut=2)
+        with CaptureQueriesContext(connection) as petit:
+            self.executer(mutation, ids=peu)
+        with CaptureQueriesContext(connection) as grand:
+            data = self.executer(mutation, ids=ids)
+        self.assertEqual(data['updateInformations'], {'nombre': 40, 'notifiees': 40})
+        self.assertEqual(len(requetes(grand)), len(requetes(petit)))
+        self.assertEqual(Notification.objects.filter(information_id__in=ids).count(), 40)
+        # Déjà confirmées : rien à notifier
+        self.assertEqual(self.executer(mutation, ids=ids)['updateInformations'], {'nombre': 40, 'notifiees': 0})
+        self.statistiques_exactes()
+
+    def test_confirm_informations(self):
+        mutation = 'mutation($ids: [ID!]!) { confirmInformations(ids: $ids) { nombre confirmees } }'
+        en_attente = self.creer(3)
+        deja_confirmee = Information.objects.create(utilisateur=self.utilisateur, compagnie_assurance=self.compagnie, statut=True).pk
+        self.assertEqual(Notification.objects.filter(information_id=deja_confirmee).count(), 1)
+
+        data = self.executer(mutation, ids=[*en_attente, deja_confirmee, 999999])
+        self.assertEqual(data['confirmInformations']['nombre'], 3)
+        self.assertEqual(sorted(map(int, data['confirmInformations']['confirmees'])), en_attente)
+        # Une notification (et un email par adresse) par information réellement passée à confirmé
+        self.assertEqual(
+            sorted(Notification.objects.values_list('information_id', flat=True)), sorted([*en_attente, deja_confirmee])
+        )
+        self.assertEqual(EmailEnAttente.objects.filter(notification__information_id__in=en_attente).count(), 3)
+
+        self.assertEqual(self.executer(mutation, ids=en_attente)['confirmInformations'], {'nombre': 0, 'confirmees': []})
+        self.assertEqual(Notification.objects.count(), 4)
+        self.statistiques_exactes()
+
+    def test_messages_des_canaux_en_lot(self):
+        canaux.reinitialiser()
+        mutation = 'mutation($ids: [ID!]!) { confirmInformations(ids: $ids) { nombre } }'
+        ancien = MessageCanal.objects.create(canal=canaux.INFORMATIONS, contenu={})
+        MessageCanal.objects.filter(pk=ancien.pk).update(date=timezone.now() - timedelta(seconds=settings.ABONNEMENTS['RETENTION'] + 1))
+        insertions = lambda contexte: [  # noqa: E731
+            requete for requete in contexte.captured_queries
+            if requete['sql'].startswith(f'INSERT INTO "{MessageCanal._meta.db_table}"')
+        ]
+        for nombre in (3, 50):
+            ids = self.creer(nombre, debut=nombre)
+            with CaptureQueriesContext(connection) as contexte, self.captureOnCommitCallbacks(execute=True):
+                self.executer(mutation, ids=ids)
+            # Un changement de statut et une notification par information, en une insertion par canal
+            self.assertEqual(len(insertions(contexte)), 2)
+            self.assertEqual(MessageCanal.objects.filter(canal=canaux.NOTIFICATIONS, contenu__information_id__in=ids).count(), nombre)
+        # Les anciens messages sont purgés par le processus qui publie, sans lecteur démarré
+        self.assertFalse(MessageCanal.objects.filter(pk=ancien.pk).exists())
+        self.assertIsNone(canaux.couche()._lecteur)
+
+    def test_upsert_informations(self):
+        self.creer(2)
+        mutation = 'mutation($rows: [InformationInput!]!) { upsertInformations(rows: $rows, cle: CIN) { creees modifiees notifiees } }'
+        ligne = {'utilisateurId': self.utilisateur.pk, 'compagnieId': self.compagnie.pk, 'statut': True}
+        data = self.executer(mutation, rows=[
+            {**ligne, 'cin': "CIN-0", 'adresse': "Nouvelle"},
+            {**ligne, 'cin': "CIN-9"},
+        ])
+        self.assertEqual(data['upsertInformations'], {'creees': 1, 'modifiees': 1, 'notifiees': 2})
+        self.assertEqual(Information.objects.get(cin="CIN-0").adresse, "Nouvelle")
+        self.assertEqual(Information.objects.count(), 3)
+        self.statistiques_exactes()
+
+    def test_upsert_autre_cle_prise(self):
+        Information.objects.create(utilisateur=self.utilisateur, statut=False, cin="CIN-A", numero_employe="E-A")
+        mutation = 'mutation($rows: [InformationInput!]!) { upsertInformations(rows: $rows) { creees } }'
+        ligne = {'utilisateurId': self.utilisateur.pk, 'compagnieId': self.compagnie.pk, 'statut': False}
+        for lignes in (
+            [{**ligne, 'cin': "CIN-B"}, {**ligne, 'cin': "CIN-C", 'numeroEmploye': "E-A"}],
+            [{**ligne, 'cin': "CIN-B", 'numeroEmploye': "E-B"}, {**ligne, 'cin': "CIN-C", 'numeroEmploye': "E-B"}],
+        ):
+            reponse = self.client.post(
+                '/graphql/', json.dumps({'query': mutation, 'variables': {'rows': lignes}}), content_type='application/json'
+            ).json()
+            self.assertEqual(
+                reponse['errors'][0]['message'], "numero_employe déjà utilisé par une autre information, lignes : 2"
+            )
+        self.assertEqual(Information.objects.count(), 1)
+        # Des numéros vides ne se gênent pas
+        data = self.executer(mutation, rows=[{**ligne, 'cin': "CIN-B", 'numeroEmploye': ""}, {**ligne, 'cin': "CIN-C", 'numeroEmploye': ""}])
+        self.assertEqual(data['upsertInformations'], {'creees': 2})
+
+    def test_cles_vides(self):
+        # Le front envoie "" pour une clé non renseignée : plusieurs informations peuvent la laisser vide
+        mutation = 'mutation($data: InformationInput!) { createInformation(informationData: $data) { information { informationId } } }'
+        ligne = {'utilisateurId': self.utilisateur.pk, 'compagnieId': self.compagnie.pk, 'statut': False,
+                 'cin': "", 'numeroEmploye': ""}
+        for _ in range(2):
+            self.executer(mutation, data=ligne)
+        self.assertEqual(Information.objects.filter(cin__isnull=True, numero_employe__isnull=True).count(), 2)
+
+        information = Information.objects.create(utilisateur=self.utilisateur, statut=False, cin="CIN-X", numero_employe="E")
+        information.cin = " "
+        information.save()
+        self.assertIsNone(Information.objects.get(pk=information.pk).cin)
+
+    def test_delete_informations(self):
+        ids = self.creer(5)
+        Information.confirmer(ids[:2])
+        data = self.executer('mutation($c: ID!) { deleteInformations(filtre: {compagnieId: $c}) { nombre } }', c=self.compagnie.pk)
+        self.assertEqual(data['deleteInformations'], {'nombre': 5})
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(EmailEnAttente.objects.exists())
+        self.assertFalse(self.compagnie.notifications.exists())
+        self.statistiques_exactes()
+
+
+class StatistiquesTests(TestCase):
+    """Compteurs du tableau de bord tenus par chaque écriture : identiques à un recalcul complet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnies = Compagnie_Assurance.objects.bulk_create([
+            Compagnie_Assurance(nom_compagnie="A"), Compagnie_Assurance(nom_compagnie="B"),
+        ])
+        cls.utilisateurs = [
+            Utilisateur.objects.create(user=User.objects.create(username=f"u{i}"), nom=f"Nom{i}", mot_de_passe="x")
+            for i in range(2)
+        ]
+        historique = Historique.objects.create(type_action="envoye", description="x")
+        cls.informations = []
+        for i in range(8):
+            information = Information.objects.create(
+                utilisateur=cls.utilisateurs[i % 2], compagnie_assurance=cls.compagnies[i % 2], cin=f"CIN-{i}", statut=i < 3
+            )
+            cls.informations.append(information.pk)
+            Notification.objects.create(historique=historique, information=information, objet="Objet",
+                                        date_envoi=timezone.now() - timedelta(days=i % 3), statut=True)
+
+    def executer(self, query, **variables):
+        contenu = self.client.post(
+            '/graphql/', json.dumps({'query': query, 'variables': variables}), content_type='application/json'
+        ).json()
+        self.assertNotIn('errors', contenu, contenu.get('errors'))
+        return contenu['data']
+
+    def verifier(self):
+        """Compteurs tenus = compteurs recalculés, et tableau de bord = comptage des lignes"""
+        compteurs = lambda: (  # noqa: E731
+            sorted(ligne for ligne in StatistiqueCompagnie.objects.values_list('compagnie_id', 'confirmees', 'en_attente')
+                   if ligne[1] or ligne[2]),
+            sorted(ligne for ligne in StatistiqueJour.objects.values_list('jour', 'notifications')
+                   if ligne[1]),
+        )
+        tenus = compteurs()
+        tableau = self.executer('{ dashboardStats { confirmees enAttente notifications } }')['dashboardStats']
+        statistiques.reconstruire()
+        self.assertEqual(tenus, compteurs())
+        self.assertEqual(tableau, {
+            'confirmees': Information.objects.filter(statut=True).count(),
+            'enAttente': Information.objects.filter(statut=False).count(),
+            'notifications': Notification.objects.count(),
+        })
+
+    def test_mises_a_jour(self):
+        ids = self.informations
+        self.verifier()
+        self.executer('mutation($id: ID!, $utilisateur: ID!, $compagnie: ID!) { updateInformation(id: $id, informationData: '
+                      '{utilisateurId: $utilisateur, compagnieId: $compagnie, statut: true}) { information { statut } } }',
+                      id=ids[5], utilisateur=self.utilisateurs[1].pk, compagnie=self.compagnies[1].pk)
+        self.verifier()
+        # Changement de compagnie et de statut en masse
+        self.executer('mutation($ids: [ID!]!) { updateInformations(ids: $ids, patch: {compagnieId: %d, statut: false}) { nombre } }'
+                      % self.compagnies[1].pk, ids=ids[:4])
+        self.verifier()
+        self.executer('mutation($ids: [ID!]!) { confirmInformations(ids: $ids) { nombre } }', ids=ids[:6])
+        self.verifier()
+
+    def test_suppressions(self):
+        ids = self.informations
+        self.executer('mutation($id: ID!) { deleteInformation(id: $id) { success } }', id=ids[0])
+        self.verifier()
+        self.executer('mutation($ids: [ID!]!) { deleteInformations(ids: $ids) { nombre } }', ids=ids[1:3])
+        self.verifier()
+        # Les informations de la compagnie passent sans compagnie
+        self.executer('mutation($id: ID!) { deleteCompagnieAssurance(id: $id) { success } }', id=self.compagnies[0].pk)
+        self.verifier()
+        self.assertTrue(StatistiqueCompagnie.objects.filter(compagnie_id=StatistiqueCompagnie.SANS_COMPAGNIE).exists())
+        Notification.objects.filter(information_id=ids[3]).delete()
+        self.verifier()
+        self.executer('mutation($ids: [ID!]!) { deleteUtilisateurs(ids: $ids) { nombre } }', ids=[self.utilisateurs[1].pk])
+        self.verifier()
+        self.executer('mutation($id: ID!) { deleteUtilisateur(id: $id) { success } }', id=self.utilisateurs[0].pk)
+        self.verifier()
+        self.assertEqual(self.executer('{ dashboardStats { confirmees enAttente notifications } }')['dashboardStats'],
+                         {'confirmees': 0, 'enAttente': 0, 'notifications': 0})
+
+
+class SuiviModificationsTests(TestCase):
+    """save() n'écrit que les colonnes modifiées, et rien quand rien n'a changé"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie")
+        cls.utilisateur = Utilisateur.objects.create(
+            user=User.objects.create(username="u"), nom="Nom", prenom="Prenom", email="u@example.com", mot_de_passe="x"
+        )
+
+    def test_save_partiel(self):
+        utilisateur = Utilisateur.objects.get(pk=self.utilisateur.pk)
+        with CaptureQueriesContext(connection) as requetes:
+            utilisateur.save()
+        self.assertEqual(len(requetes.captured_queries), 0)
+
+        utilisateur.role = "admin"
+        with CaptureQueriesContext(connection) as requetes:
+            utilisateur.save()
+        ecritures = [requete['sql'] for requete in requetes.captured_queries if requete['sql'].startswith('UPDATE')]
+        # Le rôle n'est pas recopié dans le User : une seule ligne, une seule colonne
+        self.assertEqual(len(ecritures), 1)
+        self.assertIn('"role"', ecritures[0])
+        self.assertNotIn('"nom"', ecritures[0])
+        self.assertEqual(utilisateur.champs_modifies(), set())
+
+        utilisateur.email = "nouveau@example.com"
+        utilisateur.save()
+        self.assertEqual(User.objects.get(pk=utilisateur.user_id).email, "nouveau@example.com")
+
+    def test_modifications_visibles_des_signaux(self):
+        recus = []
+
+        def recepteur(sender, instance, update_fields, **kwargs):
+            recus.append((set(update_fields or ()), dict(instance.modifications)))
+
+        post_save.connect(recepteur, sender=Compagnie_Assurance)
+        try:
+            compagnie = Compagnie_Assurance.objects.get(pk=self.compagnie.pk)
+            compagnie.nom_compagnie = "Autre"
+            compagnie.save()
+            compagnie.save()
+        finally:
+            post_save.disconnect(recepteur, sender=Compagnie_Assurance)
+        self.assertEqual(recus, [({'nom_compagnie'}, {'nom_compagnie': ("Compagnie", "Autre")})])
+
+    def test_modifier_relation(self):
+        information = Information.objects.create(utilisateur=self.utilisateur, statut=False)
+        notifications = [Notification.objects.create(information=information, objet=f"N{i}") for i in range(3)]
+        compagnie = self.compagnie
+        compagnie.notifications.add(notifications[0], notifications[1])
+        ajoutes, retires = compagnie.modifier_relation('notifications', [notifications[1].pk, notifications[2].pk])
+        self.assertEqual((ajoutes, retires), ({notifications[2].pk}, {notifications[0].pk}))
+        # Relation déjà à jour : une lecture par ensemble, aucune écriture
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(compagnie.modifier_relation('notifications', [n.pk for n in notifications[1:]]), (set(), set()))
+        self.assertTrue(all(requete['sql'].startswith('SELECT') for requete in requetes.captured_queries))
+
+
+class RechercheTests(TestCase):
+    """Recherche plein texte : classement, préfixes, index tenu à jour par les écritures"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateurs = {}
+        for i, (nom, prenom) in enumerate([("Rakotobe", "Marie"), ("Rakoto", "Jean"), ("Hériniaina", "Soa"), ("Nom120", "A"), ("Nom12", "B")]):
+            cls.utilisateurs[nom] = Utilisateur.objects.create(
+                user=User.objects.create(username=f"u{i}"), nom=nom, prenom=prenom, email=f"u{i}@example.com", mot_de_passe="x"
+            )
+        cls.information = Information.objects.create(
+            utilisateur=cls.utilisateurs["Rakoto"], numero_employe="EMP-0042", cin="101202303", statut=False
+        )
+
+    def chercher(self, terme):
+        contenu = self.client.post('/graphql/', json.dumps({
+            'query': 'query($terme: String!) { search(term: $terme, first: 10) { totalCount edges { rang node { nom } } } }',
+            'variables': {'terme': terme},
+        }), content_type='application/json').json()
+        self.assertNotIn('errors', contenu, contenu.get('errors'))
+        return contenu['data']['search']
+
+    def noms(self, terme):
+        return [edge['node']['nom'] for edge in self.chercher(terme)['edges']]
+
+    def test_classement(self):
+        resultats = self.chercher("rakoto")
+        self.assertEqual([edge['node']['nom'] for edge in resultats['edges']], ["Rakoto", "Rakotobe"])
+        self.assertEqual(resultats['totalCount'], 2)
+        self.assertGreater(resultats['edges'][0]['rang'], resultats['edges'][1]['rang'])
+        # Le mot exact passe avant le mot plus long, quel que soit l'ordre d'insertion
+        self.assertEqual(self.noms("nom12"), ["Nom12", "Nom120"])
+        # Tous les mots doivent correspondre
+        self.assertEqual(self.noms("rakoto jean"), ["Rakoto"])
+
+    def test_prefixes_casse_et_accents(self):
+        self.assertCountEqual(self.noms("rak"), ["Rakoto", "Rakotobe"])
+        self.assertEqual(self.noms("HERIN"), ["Hériniaina"])
+        self.assertEqual(self.noms("EMP-00"), ["Rakoto"])
+        self.assertEqual(self.noms("1012"), ["Rakoto"])
+        self.assertEqual(self.noms("-- !"), [])
+
+    def test_index_tenu_a_jour(self):
+        rakoto, soa = self.utilisateurs["Rakoto"], self.utilisateurs["Hériniaina"]
+        rakoto.nom = "Randria"
+        rakoto.save()
+        self.assertEqual(self.noms("rakoto"), ["Rakotobe"])
+        self.assertEqual(self.noms("randria"), ["Randria"])
+
+        # Information déplacée vers un autre utilisateur : retirée du document de l'ancien
+        information = Information.objects.get(pk=self.information.pk)
+        information.utilisateur = soa
+        information.save()
+        self.assertEqual(self.noms("EMP-0042"), ["Hériniaina"])
+
+        Information.objects.create(utilisateur=rakoto, cin="999888777", statut=False)
+        self.assertEqual(self.noms("999888"), ["Randria"])
+        information.delete()
+        self.assertEqual(self.noms("EMP-0042"), [])
+
+        rakoto.delete()
+        self.assertEqual(self.noms("randria"), [])
+        self.assertEqual(self.noms("999888"), [])
+
+
+class HistoriqueTests(TestCase):
+    """Historique en ajout seul, archives mensuelles relues telles qu'écrites"""
+
+    def setUp(self):
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        reglages = override_settings(HISTORIQUE={**settings.HISTORIQUE, 'REPERTOIRE_ARCHIVES': repertoire.name, 'TAILLE_LOT': 2})
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def creer(self, date, type_action="envoye", description="x"):
+        """Entrée datée de ``date`` (auto_now_add : la date est posée après l'insertion)"""
+        historique = Historique.objects.create(type_action=type_action, description=description)
+        Historique.objects.filter(pk=historique.pk).update(date=date, mois=mois_de(date))
+        return historique.pk
+
+    def test_ajout_seul(self):
+        historique = Historique.objects.create(type_action="envoye", description="x")
+        historique.description = "modifiée"
+        with self.assertRaises(ValueError):
+            historique.save()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Historique(historique_id=historique.pk, type_action="autre").save()
+        self.assertEqual(Historique.objects.get(pk=historique.pk).description, "x")
+
+    def test_archives(self):
+        janvier = [
+            self.creer(datetime(2023, 1, jour, 12, tzinfo=dt_timezone.utc), type_action=action, description=f"Entrée {jour}")
+            for jour, action in ((3, "envoye"), (15, "modification"), (28, "envoye"))
+        ]
+        fevrier = self.creer(datetime(2023, 2, 10, tzinfo=dt_timezone.utc))
+        recente = self.creer(timezone.now())
+        compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie")
+        utilisateur = Utilisateur.objects.create(user=User.objects.create(username="u"), mot_de_passe="x")
+        notification = Notification.objects.create(
+            historique_id=janvier[1], information=Information.objects.create(
+                utilisateur=utilisateur, compagnie_assurance=compagnie, statut=False
+            ), objet="Objet", statut=True,
+        )
+        attendues = list(Historique.objects.filter(pk__in=janvier).order_by('pk').values(
+            'historique_id', 'date', 'type_action', 'description', 'mois'
+        ))
+
+        self.assertEqual(mois_a_archiver(), [202301, 202302])
+        self.assertEqual(archiver_mois(202301), (3, 3))
+        self.assertFalse(Historique.objects.filter(pk__in=janvier).exists())
+        notification.refresh_from_db()
+        self.assertIsNone(notification.historique_id)  # la notification reste, sans historique
+
+        relues = list(lire_archives())
+        self.assertEqual([{cle: entree[cle] for cle in attendues[0]} for entree in relues], attendues)
+        self.assertEqual([entree['notifications'] for entree in relues], [[], [notification.pk], []])
+        self.assertEqual(
+            [entree['historique_id'] for entree in lire_archives(
+                debut=datetime(2023, 1, 10, tzinfo=dt_timezone.utc), fin=datetime(2023, 3, 1, tzinfo=dt_timezone.utc),
+                type_action="envoye",
+            )],
+            [janvier[2]],
+        )
+
+        # Une entrée arrivée ensuite dans un mois déjà archivé est ajoutée à l'archive existante
+        tardive = self.creer(datetime(2023, 1, 31, tzinfo=dt_timezone.utc))
+        call_command('archiver_historique', stdout=io.StringIO())
+        self.assertEqual([entree['historique_id'] for entree in lire_archives()], janvier + [tardive, fevrier])
+        self.assertEqual(list(Historique.objects.values_list('pk', flat=True)), [recente])
+
+
+class ImportTests(TestCase):
+    """Import : une clé unique déjà prise ou une ligne refusée par la base rejette la ligne, pas le lot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie")
+        cls.utilisateur = Utilisateur.objects.create(user=User.objects.create(username="u"), nom="Nom", mot_de_passe="x")
+
+    def importer(self, lignes, **options):
+        fichier = io.StringIO()
+        ecrivain = csv.writer(fichier)
+        ecrivain.writerow(['utilisateur_id', 'compagnie_id', 'cin', 'numero_employe', 'statut'])
+        for cin, numero_employe in lignes:
+            ecrivain.writerow([self.utilisateur.pk, self.compagnie.pk, cin, numero_employe, 'non'])
+        fichier.seek(0)
+        return ImportateurInformations(taille_lot=2, **options).importer(lire_lignes(fichier, 'csv'))
+
+    def test_reimport(self):
+        lignes = [("C1", "E1"), ("C2", ""), ("C3", "")]
+        self.assertEqual(self.importer(lignes)['importees'], 3)
+        rapport = self.importer(lignes)
+        self.assertEqual((rapport['importees'], rapport['rejetees']), (0, 3))
+        self.assertEqual(rapport['erreurs'][0], "Ligne 1 : cin « C1 » déjà utilisé")
+        self.assertEqual(Information.objects.count(), 3)
+
+    def test_doublons_dans_le_fichier(self):
+        # Le doublon de E4 est dans un autre lot que sa première occurrence
+        lignes = [("C4", "E4"), ("C5", "E5"), ("C6", "E4"), ("C5", "E7")]
+        for simulation in (True, False):
+            rapport = self.importer(lignes, simulation=simulation)
+            self.assertEqual((rapport['importees'], rapport['rejetees']), (2, 2))
+        self.assertEqual(set(Information.objects.values_list('cin', flat=True)), {"C4", "C5"})
+
+    def test_valeurs_numeriques_jsonl(self):
+        Information.objects.create(utilisateur=self.utilisateur, compagnie_assurance=self.compagnie, cin="123", statut=False)
+        ligne = {'utilisateur_id': self.utilisateur.pk, 'compagnie_id': self.compagnie.pk, 'statut': False}
+        lignes = [json.dumps({**ligne, 'cin': 123}), json.dumps({**ligne, 'cin': 456, 'numero_employe': 7.5, 'adresse': " "})]
+        rapport = ImportateurInformations().importer(lire_lignes(lignes, 'jsonl'))
+        self.assertEqual((rapport['importees'], rapport['rejetees']), (1, 1))
+        self.assertEqual(rapport['erreurs'], ["Ligne 1 : cin « 123 » déjà utilisé"])
+        self.assertEqual(Information.objects.filter(cin="456").values_list('numero_employe', 'adresse').get(), ("7.5", None))
+
+    def test_conflit_a_l_ecriture(self):
+        # Contrainte que la vérification des clés ne voit pas (comme une écriture concurrente)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TRIGGER conflit BEFORE INSERT ON "{Information._meta.db_table}" WHEN NEW.cin = \'C8\' '
+                "BEGIN SELECT RAISE(ABORT, 'conflit'); END"
+            )
+        rapport = self.importer([("C7", ""), ("C8", ""), ("C9", "")])
+        self.assertEqual((rapport['importees'], rapport['rejetees']), (2, 1))
+        self.assertTrue(rapport['erreurs'][0].startswith("Ligne 2 : refusée par la base"), rapport['erreurs'])
+        self.assertEqual(set(Information.objects.values_list('cin', flat=True)), {"C7", "C9"})
+        self.assertEqual(StatistiqueCompagnie.objects.get(pk=self.compagnie.pk).en_attente, 2)
+
+
+class BackendDeTest(EmailBackend):
+    """Backend locmem qui compte les connexions et refuse les adresses de ``refusees``"""
+    ouvertures = 0
+    refusees = set()
+
+    def open(self):
+        BackendDeTest.ouvertures += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refusees:
+                raise OSError(f"Destinataire refusé : {message.to}")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_OUTBOX={**settings.EMAIL_OUTBOX, 'DIGEST': False, 'MAX_TENTATIVES': 3, 'DELAI_INITIAL': 30})
+class OutboxTests(TestCase):
+    """Outbox : emails écrits avec la notification, envoyés par lots, reprogrammés avec backoff"""
+
+    @classmethod
+    def setUpTestData(cls):
+        compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie")
+        utilisateur = Utilisateur.objects.create(user=User.objects.create(username="rh"), nom="Nom", mot_de_passe="x")
+        for i in range(5):
+            Information.objects.create(
+                utilisateur=utilisateur, compagnie_assurance=compagnie, statut=True, email_notification=f"rh{i}@example.com"
+            )
+
+    def setUp(self):
+        BackendDeTest.ouvertures = 0
+        BackendDeTest.refusees = set()
+
+    def test_emails_ecrits_avec_la_notification(self):
+        self.assertEqual(EmailEnAttente.objects.filter(statut=EmailEnAttente.EN_ATTENTE).count(), 5)
+        self.assertEqual(len(mail.outbox), 0, "Rien n'est envoyé pendant la requête")
+
+    def test_envoi_par_lots(self):
+        self.assertEqual(outbox.traiter_lot(2, connection=BackendDeTest()), (2, 0, 0))
+        self.assertEqual(BackendDeTest.ouvertures, 1)
+        sortie = io.StringIO()
+        call_command('envoyer_emails', '--une-fois', '--taille-lot', '2',
+                     '--backend', 'django.core.mail.backends.locmem.EmailBackend', stdout=sortie)
+        self.assertIn("Terminé : 3 envoyé(s)", sortie.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [f"rh{i}@example.com" for i in range(5)])
+        self.assertFalse(EmailEnAttente.objects.exclude(statut=EmailEnAttente.ENVOYE).exists())
+        self.assertEqual(Historique.objects.filter(type_action="email_envoye").count(), 5)
+        self.assertEqual(StatistiqueJour.objects.get(jour=timezone.localdate()).emails_envoyes, 5)
+
+    def test_backoff_puis_abandon(self):
+        BackendDeTest.refusees = {"rh0@example.com"}
+        email = EmailEnAttente.objects.get(destinataires="rh0@example.com")
+        delais = []
+        for tentative in range(1, 4):
+            avant = timezone.now()
+            envoyes, reportes, echecs = outbox.traiter_lot(connection=BackendDeTest())
+            email.refresh_from_db()
+            self.assertEqual(email.tentatives, tentative)
+            self.assertIn("Destinataire refusé", email.derniere_erreur)
+            if tentative < 3:
+                self.assertEqual((reportes, echecs), (1, 0))
+                delais.append(round((email.prochaine_tentative - avant).total_seconds()))
+                # Pas encore l'heure : l'email n'est pas repris
+                self.assertEqual(outbox.traiter_lot(connection=BackendDeTest()), (0, 0, 0))
+                EmailEnAttente.objects.filter(pk=email.pk).update(prochaine_tentative=timezone.now())
+        self.assertEqual(delais, [30, 60])
+        self.assertEqual((envoyes, reportes, echecs), (0, 0, 1))
+        self.assertEqual(email.statut, EmailEnAttente.ECHEC)
+        self.assertEqual(Historique.objects.filter(type_action="email_echec").count(), 1)
+        self.assertEqual(email.notification.historique.type_action, "email_echec")
+        self.assertEqual(StatistiqueJour.objects.get(jour=timezone.localdate()).emails_echec, 1)
+
+
+@override_settings(EMAIL_OUTBOX={'DIGEST': True, 'FENETRE_DIGEST': 300})
+class DigestTests(TestCase):
+    """Mode digest de l'outbox : un récapitulatif par adresse, une connexion par lot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie", email_compagnie="compagnie@example.com")
+        utilisateur = Utilisateur.objects.create(
+            user=User.objects.create(username="rh"), nom="Nom", prenom="Prenom", email="rh@example.com", mot_de_passe="x"
+        )
+        Information.objects.bulk_create([
+            Information(utilisateur=utilisateur, compagnie_assurance=compagnie, statut=False,
+                        email_notification=f"rh{i % 2}@example.com")
+            for i in range(100)
+        ])
+        Information.confirmer(Information.objects.values_list('pk', flat=True))
+
+    def setUp(self):
+        BackendDeTest.ouvertures = 0
+        BackendDeTest.refusees = set()
+
+    def fermer_fenetre(self):
+        EmailEnAttente.objects.update(date_creation=timezone.now() - timedelta(seconds=600))
+
+    def test_recapitulatif_par_adresse(self):
+        self.assertEqual(outbox.traiter_lot(connection=BackendDeTest()), (0, 0, 0), "La fenêtre en cours n'est pas envoyée")
+        self.fermer_fenetre()
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(outbox.traiter_lot(connection=BackendDeTest()), (100, 0, 0))
+        self.assertEqual(
+            sorted((message.to[0], message.subject) for message in mail.outbox),
+            [('compagnie@example.com', '100 notifications'), ('rh0@example.com', '50 notifications'),
+             ('rh1@example.com', '50 notifications')]
+        )
+        self.assertEqual(BackendDeTest.ouvertures, 1)
+        self.assertLess(len(requetes), 20, "Historiques et emails sont écrits en masse")
+        self.assertEqual(Notification.objects.filter(historique__type_action="email_envoye").count(), 100)
+
+    def test_adresse_refusee_seule_reprogrammee(self):
+        self.fermer_fenetre()
+        BackendDeTest.refusees = {'rh1@example.com'}
+        self.assertEqual(outbox.traiter_lot(connection=BackendDeTest()), (50, 50, 0))
+        self.assertEqual(
+            set(EmailEnAttente.objects.filter(statut=EmailEnAttente.EN_ATTENTE).values_list('destinataires', flat=True)),
+            {'rh1@example.com'}
+        )
+
+
+@override_settings(GRAPHQL_TRACING={**settings.GRAPHQL_TRACING, 'EXTENSIONS': True})
+class VueAsynchroneTests(TransactionTestCase):
+    """Vue GraphQL asynchrone (service ASGI) : mêmes réponses que la vue synchrone, champs racine dans le pool"""
+
+    QUERY = '''query Tableau {
+        compagnies { nomCompagnie }
+        informationsConnection(first: 10) { edges { node { numeroEmploye compagnieAssurance { nomCompagnie } } } }
+        utilisateursConnection(first: 10) { totalCount edges { node { nom informations { cin } } } }
+    }'''
+
+    def setUp(self):
+        compagnie = Compagnie_Assurance.objects.create(nom_compagnie="Compagnie", email_compagnie="c@example.com")
+        for i in range(3):
+            utilisateur = Utilisateur.objects.create(
+                user=User.objects.create(username=f"u{i}"), nom=f"Nom{i}", prenom="Prenom", mot_de_passe="x"
+            )
+            Information.objects.create(utilisateur=utilisateur, compagnie_assurance=compagnie,
+                                       numero_employe=f"EMP-{i}", cin=f"CIN-{i}", statut=False)
+        caches[cache.ALIAS].clear()
+
+    async def envoyer(self, query, **variables):
+        vue = AsyncDataInfoGraphQLView.as_view(schema=schema)
+        requete = AsyncRequestFactory().post(
+            '/graphql/', json.dumps({'query': query, 'variables': variables}), content_type='application/json',
+            headers={settings.GRAPHQL_TRACING['ENTETE']: '1'},
+        )
+        requete.user = AnonymousUser()
+        reponse = await vue(requete)
+        return reponse.status_code, json.loads(reponse.content)
+
+    async def test_champs_racine_dans_le_pool(self):
+        statut, contenu = await self.envoyer(self.QUERY)
+        self.assertNotIn('errors', contenu, contenu.get('errors'))
+        self.assertEqual(statut, 200)
+        synchrone = await sync_to_async(self.client.post)(
+            '/graphql/', json.dumps({'query': self.QUERY}), content_type='application/json'
+        )
+        self.assertEqual(contenu['data'], synchrone.json()['data'])
+
+        # Chaque champ racine et chaque lot de relations est mesuré par un passage dans le pool
+        chemins = {resolver['chemin'] for resolver in contenu['extensions']['tracing']['resolvers']}
+        racines = {'compagnies', 'informationsConnection', 'utilisateursConnection'}
+        self.assertTrue(racines <= chemins, chemins)
+        self.assertTrue(any(chemin.endswith('.informations') for chemin in chemins), chemins)
+        self.assertTrue(any(chemin.endswith('.compagnieAssurance') for chemin in chemins), chemins)
+
+    async def test_pile_de_middlewares_asgi(self):
+        # Les middlewares de Django et JWTMiddleware, appelés par le gestionnaire ASGI
+        jeton = AccessToken.for_user(await User.objects.aget(username="u0"))
+        reponse = await self.async_client.get(
+            '/metrics', REMOTE_ADDR='10.0.0.1',
+            headers={'X-Forwarded-For': "203.0.113.5", 'Authorization': f"Bearer {jeton}"},
+        )
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse['X-Frame-Options'], 'DENY')
+        reponse = await self.async_client.post(
+            '/graphql/', json.dumps({'query': '{ compagnies { nomCompagnie } }'}), content_type='application/json'
+        )
+        self.assertEqual(json.loads(reponse.content)['data'], {'compagnies': [{'nomCompagnie': "Compagnie"}]})
+
+    async def test_mutation_et_erreurs(self):
+        statut, contenu = await self.envoyer(
+            'mutation($nom: String!) { createCompagnieAssurance(compagnieData: {nomCompagnie: $nom}) { compagnie { nomCompagnie } } }',
+            nom="Nouvelle",
+        )
+        self.assertEqual(statut, 200)
+        self.assertEqual(contenu['data']['createCompagnieAssurance']['compagnie'], {'nomCompagnie': "Nouvelle"})
+        self.assertTrue(await Compagnie_Assurance.objects.filter(nom_compagnie="Nouvelle").aexists())
+
+        statut, contenu = await self.envoyer('{ compagnies { inconnu } }')
+        self.assertEqual(statut, 400)
+        self.assertIn('inconnu', contenu['errors'][0]['message'])
+
+        # Erreur d'un resolver exécuté sur la boucle : les autres champs racine sont renvoyés
+        statut, contenu = await self.envoyer('{ compagnies { nomCompagnie } compagnieById(id: 999) { nomCompagnie } }')
+        self.assertEqual(statut, 200)
+        self.assertEqual(len(contenu['data']['compagnies']), 2)
+        self.assertIsNone(contenu['data']['compagnieById'])
+        self.assertIn("n'existe pas", contenu['errors'][0]['message'])
+
+
+class AuthentificationTests(TestCase):
+    """Jetons JWT : claims vérifiés une fois puis servis par le cache, révocations lues par intervalle"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="rh", password="secret")
+        cls.utilisateur = Utilisateur.objects.create(user=cls.user, nom="Nom", prenom="Prenom", role="admin", mot_de_passe="x")
+
+    def setUp(self):
+        JETONS.vider()
+        LISTE_NOIRE.vider()
+
+    def executer(self, mutation, **variables):
+        contenu = self.client.post(
+            '/graphql/', json.dumps({'query': mutation, 'variables': variables}), content_type='application/json'
+        ).json()
+        self.assertNotIn('errors', contenu, contenu.get('errors'))
+        return contenu['data']
+
+    def connexion(self):
+        return self.executer(
+            'mutation { login(username: "rh", password: "secret") { success token refreshToken } }'
+        )['login']
+
+    def requete(self, jeton):
+        requete = RequestFactory().post('/graphql/', headers={'Authorization': f"Bearer {jeton}"})
+        authentifier(requete)
+        return requete
+
+    def test_claims_en_cache(self):
+        jeton = self.connexion()['token']
+        hits, misses = JETONS.hits, JETONS.misses
+        with self.assertNumQueries(0):
+            premiere, seconde = self.requete(jeton), self.requete(jeton)
+            # Profil construit depuis les claims, sans requête
+            self.assertEqual((seconde.utilisateur.pk, seconde.utilisateur.role), (self.utilisateur.pk, "admin"))
+        self.assertEqual((JETONS.hits - hits, JETONS.misses - misses), (1, 1))
+        self.assertEqual(premiere.jwt, seconde.jwt)
+        self.assertEqual(seconde.jwt['utilisateurId'], self.utilisateur.pk)
+
+        # Même signature, contenu modifié : le jeton est revérifié et refusé
+        entete, contenu, signature = jeton.split('.')
+        falsifie = '.'.join([entete, contenu[:-2] + ('AA' if contenu[-2:] != 'AA' else 'BB'), signature])
+        self.assertIsNone(self.requete(falsifie).jwt)
+        self.assertIsNotNone(self.requete(jeton).jwt)
+
+        # Jeton expiré : l'entrée du cache n'est plus servie
+        expire = AccessToken.for_user(self.user)
+        expire.set_exp(lifetime=timedelta(seconds=-1))
+        self.assertIsNone(self.requete(str(expire)).jwt)
+
+    def test_liste_noire(self):
+        refresh = self.connexion()['refreshToken']
+        rafraichir = 'mutation($jeton: String!) { refreshToken(refreshToken: $jeton) { success } }'
+        self.assertTrue(self.executer(rafraichir, jeton=refresh)['refreshToken']['success'])
+
+        # Révocation par ce processus : vue immédiatement
+        self.assertTrue(self.executer(
+            'mutation($jeton: String!) { logout(refreshToken: $jeton) { success } }', jeton=refresh
+        )['logout']['success'])
+        self.assertFalse(self.executer(rafraichir, jeton=refresh)['refreshToken']['success'])
+
+        # Révocation par un autre processus : vue au plus après INTERVALLE_LISTE_NOIRE
+        autre = self.connexion()['refreshToken']
+        self.assertTrue(self.executer(rafraichir, jeton=autre)['refreshToken']['success'])
+        jti = RefreshToken(autre)['jti']
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=jti))
+        with self.assertNumQueries(0):
+            self.assertFalse(LISTE_NOIRE.contient(jti))
+        with override_settings(GRAPHQL_AUTH={**settings.GRAPHQL_AUTH, 'INTERVALLE_LISTE_NOIRE': 0}):
+            with self.assertNumQueries(1):  # seules les révocations ajoutées depuis la dernière lecture
+                self.assertTrue(LISTE_NOIRE.contient(jti))
+            self.assertFalse(self.executer(rafraichir, jeton=autre)['refreshToken']['success'])
+
+
+@override_settings(SQLITE_REESSAIS={**settings.SQLITE_REESSAIS, 'TENTATIVES': 3, 'DELAI_INITIAL': 0})
+class ReessaiTests(TransactionTestCase):
+    """Mutations relancées sur « database is locked », chacune dans sa propre transaction"""
+
+    CREER = 'mutation { createCompagnieAssurance(compagnieData: {nomCompagnie: "Nouvelle"}) { compagnie { nomCompagnie } } }'
+
+    def executer(self, echecs, message="database is locked", dans_une_transaction=False):
+        """Exécute CREER ; les ``echecs`` premières sauvegardes lèvent OperationalError(message)
+        après l'insertion. Renvoie le résultat et le nombre de tentatives."""
+        tentatives = []
+
+        def recepteur(sender, **kwargs):
+            tentatives.append(1)
+            if len(tentatives) <= echecs:
+                raise OperationalError(message)
+
+        post_save.connect(recepteur, sender=Compagnie_Assurance)
+        try:
+            if dans_une_transaction:
+                with transaction.atomic():
+                    resultat = schema.execute(self.CREER, middleware=[ReessaiMiddleware()])
+            else:
+                resultat = schema.execute(self.CREER, middleware=[ReessaiMiddleware()])
+        finally:
+            post_save.disconnect(recepteur, sender=Compagnie_Assurance)
+        return resultat, len(tentatives)
+
+    def test_reessai_sur_base_verrouillee(self):
+        resultat, tentatives = self.executer(echecs=2)
+        self.assertIsNone(resultat.errors)
+        self.assertEqual(tentatives, 3)
+        # Les insertions des tentatives échouées sont annulées
+        self.assertEqual(Compagnie_Assurance.objects.filter(nom_compagnie="Nouvelle").count(), 1)
+
+    def test_abandon_apres_les_tentatives(self):
+        resultat, tentatives = self.executer(echecs=10)
+        self.assertIn("database is locked", resultat.errors[0].message)
+        self.assertEqual(tentatives, 4)  # première exécution + TENTATIVES
+        self.assertFalse(Compagnie_Assurance.objects.exists())
+
+    def test_autre_erreur_non_relancee(self):
+        resultat, tentatives = self.executer(echecs=1, message="no such table: x")
+        self.assertIn("no such table", resultat.errors[0].message)
+        self.assertEqual(tentatives, 1)
+
+    def test_aucun_reessai_dans_une_transaction_ouverte(self):
+        resultat, tentatives = self.executer(echecs=1, dans_une_transaction=True)
+        self.assertIn("database is locked", resultat.errors[0].message)
+        self.assertEqual(tentatives, 1)
+
+
+class ClientWebsocket:
+    """Client graphql-transport-ws branché directement sur l'application ASGI"""
+
+    def __init__(self, application, sous_protocoles=('graphql-transport-ws',)):
+        self.entree = asyncio.Queue()
+        self.sortie = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': '/graphql/', 'subprotocols': list(sous_protocoles), 'headers': []}
+        self.tache = asyncio.ensure_future(application(scope, self.entree.get, self.sortie.put))
+
+    async def connecter(self, jeton):
+        await self.entree.put({'type': 'websocket.connect'})
+        assert (await self.recevoir())['type'] == 'websocket.accept'
+        await self.envoyer({'type': 'connection_init', 'payload': {'Authorization': f"Bearer {jeton}"}})
+        return await self.recevoir()
+
+    async def envoyer(self, message):
+        await self.entree.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def recevoir(self):
+        evenement = await asyncio.wait_for(self.sortie.get(), 5)
+        return json.loads(evenement['text']) if evenement['type'] == 'websocket.send' else evenement
+
+    async def deconnecter(self):
+        await self.entree.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.tache, 5)
+
+
+class SubscriptionTests(TransactionTestCase):
+    """Subscriptions en websocket, alimentées par les écritures via la couche partagée par la base"""
+
+    def setUp(self):
+        canaux.reinitialiser()
+        self.application = ServeurAbonnements(schema)
+        self.suivie, autre = Compagnie_Assurance.objects.bulk_create([
+            Compagnie_Assurance(nom_compagnie="Suivie"), Compagnie_Assurance(nom_compagnie="Autre"),
+        ])
+        user = User.objects.create(username="rh")
+        utilisateur = Utilisateur.objects.create(user=user, nom="Nom", prenom="Prenom", mot_de_passe="x")
+        self.informations = [
+            Information.objects.create(utilisateur=utilisateur, compagnie_assurance=compagnie, statut=False)
+            for compagnie in (self.suivie, autre)
+        ]
+        self.jeton = str(AccessToken.for_user(user))
+
+    async def attendre_abonnement(self, canal):
+        for _essai in range(200):
+            if canaux.couche().nombre_abonnes(canal):
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"Aucun abonné sur le canal {canal}")
+
+    async def test_couche_partagee(self):
+        # Deux processus : une publication de l'un atteint les abonnés de l'autre
+        abonne, publiant = canaux.CoucheBase(), canaux.CoucheBase()
+        abonnement = abonne.abonner(canaux.NOTIFICATIONS)
+        try:
+            await sync_to_async(publiant.publier)(canaux.NOTIFICATIONS, {'notification_id': 1})
+            self.assertEqual(await asyncio.wait_for(abonnement.__anext__(), 5), {'notification_id': 1})
+        finally:
+            abonnement.fermer()
+            await sync_to_async(abonne.arreter)()
+
+    async def test_jeton_obligatoire(self):
+        client = ClientWebsocket(self.application)
+        fermeture = await client.connecter("invalide")
+        self.assertEqual((fermeture['type'], fermeture['code']), ('websocket.close', 4403))
+        await client.deconnecter()
+
+    async def test_notifications_filtrees_par_compagnie(self):
+        client = ClientWebsocket(self.application)
+        self.assertEqual((await client.connecter(self.jeton))['type'], 'connection_ack')
+        await client.envoyer({'id': '1', 'type': 'subscribe', 'payload': {
+            'query': 'subscription ($c: ID) { notificationCreated(compagnieId: $c) { objet information { informationId } } }',
+            'variables': {'c': str(self.suivie.pk)},
+        }})
+        await self.attendre_abonnement(canaux.NOTIFICATIONS)
+
+        await sync_to_async(Information.confirmer)([information.pk for information in self.informations])
+        message = await client.recevoir()
+        self.assertEqual(message['type'], 'next')
+        self.assertEqual(message['payload']['data']['notificationCreated']['information'],
+                         {'informationId': str(self.informations[0].pk)})
+        # La notification de l'autre compagnie n'est pas transmise
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.sortie.get(), 0.2)
+
+        await client.deconnecter()
+        self.assertEqual(canaux.couche().nombre_abonnes(canaux.NOTIFICATIONS), 0)
+
+    async def test_changement_de_statut(self):
+        client = ClientWebsocket(self.application)
+        await client.connecter(self.jeton)
+        await client.envoyer({'id': 'a', 'type': 'subscribe', 'payload': {
+            'query': 'subscription { informationStatusChanged { ancienStatut statut information { informationId } } }',
+        }})
+        await self.attendre_abonnement(canaux.INFORMATIONS)
+
+        information = self.informations[1]
+        information.statut = True
+        await sync_to_async(information.save)()
+        message = await client.recevoir()
+        self.assertEqual(message['payload']['data']['informationStatusChanged'], {
+            'ancienStatut': False, 'statut': True, 'information': {'informationId': str(information.pk)},
+        })
+
+        await client.envoyer({'id': 'a', 'type': 'complete'})
+        await client.envoyer({'type': 'ping'})
+        self.assertEqual(await client.recevoir(), {'type': 'pong'})
+        await client.deconnecter()
+        self.assertEqual(canaux.couche().nombre_abonnes(canaux.INFORMATIONS), 0)
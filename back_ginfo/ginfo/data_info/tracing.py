@@ -0,0 +1,121 @@
+import time
+
+from django.db import models
+from graphql import GraphQLEnumType, GraphQLScalarType, get_named_type
+
+from . import metriques
+
+
+class Trace:
+    """Mesures d'une requête GraphQL : temps, requêtes SQL et lignes par chemin de resolver.
+
+    S'installe comme ``execute_wrapper`` sur la connexion pour compter les
+    requêtes SQL ; le TracingMiddleware attribue à chaque resolver les
+    requêtes exécutées pendant son appel. Les chemins sont regroupés sans les
+    indices de liste (``informations.utilisateur`` pour tous les éléments).
+    """
+
+    def __init__(self, detail=False):
+        self.detail = detail
+        self.operation = None
+        self.cout = None
+        self.debut = time.perf_counter()
+        self.duree = 0.0
+        self.requetes_sql = 0
+        self.duree_sql = 0.0
+        self.lignes = 0
+        self.resolvers = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes_sql += 1
+            self.duree_sql += time.perf_counter() - debut
+
+    def enregistrer(self, chemin, duree, requetes_sql, duree_sql, lignes):
+        mesure = self.resolvers.get(chemin)
+        if mesure is None:
+            mesure = self.resolvers[chemin] = [0, 0.0, 0, 0.0, 0]
+        mesure[0] += 1
+        mesure[1] += duree
+        mesure[2] += requetes_sql
+        mesure[3] += duree_sql
+        mesure[4] += lignes
+        self.lignes += lignes
+
+    def terminer(self):
+        """Clôt la mesure et l'ajoute aux histogrammes de /metrics"""
+        self.duree = time.perf_counter() - self.debut
+        operation = self.operation or 'anonyme'
+        metriques.duree_requete.observer(self.duree, operation=operation)
+        metriques.requetes_sql.observer(self.requetes_sql, operation=operation)
+        metriques.duree_sql.observer(self.duree_sql, operation=operation)
+        metriques.lignes.observer(self.lignes, operation=operation)
+        for chemin, mesure in self.resolvers.items():
+            if '.' not in chemin:
+                metriques.duree_resolver.observer(mesure[1], operation=operation, champ=chemin)
+
+    def extensions(self):
+        resolvers = sorted(self.resolvers.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'operation': self.operation,
+            'cout': self.cout,
+            'duree_ms': round(self.duree * 1000, 3),
+            'requetes_sql': self.requetes_sql,
+            'duree_sql_ms': round(self.duree_sql * 1000, 3),
+            'lignes': self.lignes,
+            'resolvers': [
+                {
+                    'chemin': chemin,
+                    'appels': appels,
+                    'duree_ms': round(duree * 1000, 3),
+                    'requetes_sql': requetes_sql,
+                    'duree_sql_ms': round(duree_sql * 1000, 3),
+                    'lignes': lignes,
+                }
+                for chemin, (appels, duree, requetes_sql, duree_sql, lignes) in resolvers
+            ],
+        }
+
+
+def _nombre_de_lignes(resultat):
+    if isinstance(resultat, models.Model):
+        return 1
+    if isinstance(resultat, list):
+        return len(resultat)
+    edges = getattr(resultat, 'edges', None)
+    if isinstance(edges, list):
+        return len(edges)
+    return 0
+
+
+class TracingMiddleware:
+    """Middleware graphene qui mesure chaque resolver de la requête tracée.
+
+    Doit être placé après LoaderMiddleware dans GRAPHENE['MIDDLEWARE'] (le
+    dernier middleware de la liste est le plus extérieur) pour compter les
+    requêtes de préchargement du chargeur. Les champs scalaires qui
+    n'exécutent pas de SQL ne sont pas enregistrés.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, 'trace', None)
+        if trace is None:
+            return next(root, info, **args)
+
+        requetes_avant, duree_sql_avant = trace.requetes_sql, trace.duree_sql
+        debut = time.perf_counter()
+        resultat = next(root, info, **args)
+        duree = time.perf_counter() - debut
+
+        requetes_sql = trace.requetes_sql - requetes_avant
+        if not requetes_sql and isinstance(get_named_type(info.return_type), (GraphQLScalarType, GraphQLEnumType)):
+            return resultat
+
+        chemin = '.'.join(cle for cle in info.path.as_list() if isinstance(cle, str))
+        trace.enregistrer(
+            chemin, duree, requetes_sql, trace.duree_sql - duree_sql_avant, _nombre_de_lignes(resultat)
+        )
+        return resultat
@@ -1,3 +1,397 @@
-from django.shortcuts import render
+import functools
+import time
+from inspect import isawaitable
 
-# Create your views here.
+from django.db import OperationalError, connection, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+from graphql.validation import specified_rules
+
+from .asynchrone import ExecutionAsynchrone, executer
+from .asynchrone import parametre as parametre_async
+from .conditionnel import NonModifie, appliquer, preparer
+from .cout import LimiteCout, analyser, consommer_budget, identifiant_client
+from .documents import DocumentCache, OperationsPersistees, lire_extensions, parametre
+from .export import Export, ExportInvalide
+from .lots import Lot, LotInvalide, annuler, est_un_lot, fusionner
+from .loaders import RelationLoader
+from .metriques import acces_autorise, exposition
+from .metriques import parametre as parametre_tracing
+from .reessais import attente, base_verrouillee
+from .reessais import parametre as parametre_reessais
+from .tracing import Trace
+
+
+class DataInfoGraphQLView(GraphQLView):
+    """Vue GraphQL du projet : prépare le contexte partagé par les resolvers,
+    réutilise les documents déjà analysés, accepte les requêtes persistées,
+    répond aux lectures en GET avec ETag et 304 (data_info/conditionnel.py),
+    exécute les lots d'opérations en une transaction (data_info/lots.py)
+    et mesure chaque opération (extensions ``tracing`` et /metrics)"""
+
+    validation_rules = (*specified_rules, LimiteCout)
+    documents = DocumentCache(parametre('TAILLE_CACHE'))
+    operations = OperationsPersistees()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.batch and est_un_lot(request):
+            return self.dispatch_lot(request)
+        try:
+            return appliquer(request, super().dispatch(request, *args, **kwargs))
+        except NonModifie as e:
+            return self._non_modifie(e)
+
+    @staticmethod
+    def _non_modifie(exception):
+        response = HttpResponseNotModified()
+        for nom, valeur in exception.entetes.items():
+            response[nom] = valeur
+        return response
+
+    def get_context(self, request):
+        # Un chargeur de relations neuf par requête HTTP, partagé par les opérations d'un lot
+        if getattr(request, 'lot', None) is None:
+            request.loaders = RelationLoader()
+        return request
+
+    def dispatch_lot(self, request):
+        """Exécute un lot d'opérations dans une transaction, relancée entière si SQLite reste
+        verrouillé à son ouverture (comme ReessaiMiddleware pour une mutation seule)"""
+        try:
+            request.lot = Lot.depuis_requete(request)
+        except LotInvalide as e:
+            return JsonResponse({'errors': [{'message': str(e)}]}, status=400)
+
+        tentative = 0
+        while True:
+            request.loaders = RelationLoader()
+            try:
+                with transaction.atomic():
+                    resultats = self._executer_lot(request, request.lot)
+                break
+            except OperationalError as e:
+                if not base_verrouillee(e) or tentative >= parametre_reessais('TENTATIVES'):
+                    raise
+                time.sleep(attente(tentative))
+                tentative += 1
+
+        if request.lot.par_operation:
+            status_code = max(status for _resultat, status in resultats)
+            contenu = [resultat for resultat, _status in resultats]
+        else:
+            contenu, status_code = fusionner(resultats)
+        # Les mesures de chaque opération sont déjà dans son résultat
+        request.trace = None
+        return HttpResponse(
+            status=status_code, content=self.json_encode(request, contenu), content_type="application/json"
+        )
+
+    def _executer_lot(self, request, lot):
+        """[(résultat, code HTTP)] des opérations du lot, chacune dans son point de sauvegarde"""
+        resultats = []
+        for index, entree in enumerate(lot.entrees):
+            setattr(request, MUTATION_ERRORS_FLAG, False)
+            with transaction.atomic():
+                try:
+                    query, variables, operation_name, _id = self.get_graphql_params(request, entree)
+                    execution_result = self.execute_graphql_request(request, entree, query, variables, operation_name)
+                    resultat, status_code = self._resultat(request, execution_result)
+                except HttpError as e:
+                    resultat, status_code = {'errors': [self.format_error(e)]}, e.response.status_code
+                echec = bool(resultat.get('errors')) or getattr(request, MUTATION_ERRORS_FLAG, False) is True
+                if echec:
+                    transaction.set_rollback(True)
+            trace = getattr(request, 'trace', None)
+            if trace is not None and trace.detail:
+                resultat['extensions'] = {'tracing': trace.extensions()}
+            if lot.par_operation:
+                resultat.update(id=entree.get('id', index), status=status_code)
+            resultats.append((resultat, status_code))
+            if echec and lot.tout_ou_rien:
+                transaction.set_rollback(True)
+                resultats += [
+                    ({'id': suivante.get('id', rang), 'status': 200} if lot.par_operation else {}, 200)
+                    for rang, suivante in enumerate(lot.entrees[index + 1:], start=index + 1)
+                ]
+                annuler(resultats, index)
+                break
+        return resultats
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        request.trace = self._nouvelle_trace(request, operation_name)
+        try:
+            with connection.execute_wrapper(request.trace):
+                return self._executer(request, data, query, variables, operation_name, show_graphiql)
+        finally:
+            request.trace.terminer()
+
+    @staticmethod
+    def _nouvelle_trace(request, operation_name):
+        entete = 'HTTP_' + parametre_tracing('ENTETE').upper().replace('-', '_')
+        trace = Trace(detail=parametre_tracing('EXTENSIONS') and entete in request.META)
+        trace.operation = operation_name
+        return trace
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        return self._reponse(request, execution_result, id, show_graphiql)
+
+    def _reponse(self, request, execution_result, id=None, show_graphiql=False):
+        """Résultat d'exécution → (JSON, code HTTP), comme GraphQLView.get_response"""
+        if not execution_result:
+            return None, 200
+        response, status_code = self._resultat(request, execution_result)
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def _resultat(self, request, execution_result):
+        """Résultat d'exécution → (dict de réponse, code HTTP)"""
+        status_code = 200
+        response = {}
+
+        if execution_result.errors:
+            set_rollback()
+            # Une réponse en erreur n'est ni validée ni mise en cache
+            request.cache_http = None
+            response["errors"] = [
+                self.format_error(e) for e in execution_result.errors
+            ]
+
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        return response, status_code
+
+    def json_encode(self, request, d, pretty=False):
+        trace = getattr(request, 'trace', None)
+        if trace is not None and trace.detail:
+            d = {**d, 'extensions': {'tracing': trace.extensions()}}
+        return super().json_encode(request, d, pretty)
+
+    def _executer(self, request, data, query, variables, operation_name, show_graphiql):
+        try:
+            query, hash = self.operations.resoudre(query, lire_extensions(request, data))
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, validation_errors = self.documents.obtenir(
+            schema, query, self.validation_rules, hash
+        )
+        if document is None or validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is not None and operation_ast.name is not None:
+            request.trace.operation = operation_ast.name.value
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if (
+            request.method.lower() == "get"
+            and not self.batch
+            and not show_graphiql
+            and not request.trace.detail
+            and operation_ast is not None
+            and operation_ast.operation == OperationType.QUERY
+        ):
+            # Lève NonModifie (304) avant toute exécution, budget compris
+            preparer(request, schema, document, hash, variables, operation_name, operation_ast)
+
+        if operation_ast is not None:
+            cout = analyser(schema, document, operation_ast).cout
+            request.trace.cout = cout
+            try:
+                consommer_budget(identifiant_client(request), cout)
+            except GraphQLError as e:
+                return ExecutionResult(errors=[e])
+
+        return self._lancer(request, schema, document, operation_ast, variables, operation_name)
+
+    def _options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def _lancer(self, request, schema, document, operation_ast, variables, operation_name):
+        try:
+            execute_options = self._options(request, variables, operation_name)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncDataInfoGraphQLView(DataInfoGraphQLView):
+    """Vue GraphQL asynchrone, pour le service ASGI (GRAPHQL_ASYNC['ACTIF']).
+
+    La préparation (requête persistée, validation, budget), les mutations et
+    les requêtes à un seul champ racine s'exécutent d'un bloc dans le pool de
+    threads ORM. Les requêtes de lecture à plusieurs champs racine
+    (CHAMPS_RACINE_MIN) sont exécutées sur la boucle d'événements avec le
+    middleware ExecutionAsynchrone. GraphiQL et le mode batch gardent le
+    traitement synchrone habituel, dans le pool.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            if not self.batch and est_un_lot(request):
+                return await executer(None, self.dispatch_lot, request)
+
+            data = self.parse_body(request)
+            if self.batch or (self.graphiql and self.can_display_graphiql(request, data)):
+                return await executer(None, super().dispatch, request, *args, **kwargs)
+
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+            request.asynchrone = True
+            request.trace = self._nouvelle_trace(request, operation_name)
+            try:
+                execution_result = await executer(
+                    None, self._executer_trace, request, data, query, variables, operation_name
+                )
+                if callable(execution_result):
+                    execution_result = await self._executer_async(execution_result)
+            except NonModifie as e:
+                return self._non_modifie(e)
+            finally:
+                request.trace.terminer()
+
+            result, status_code = self._reponse(request, execution_result, id)
+            return appliquer(request, HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            ))
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+            return response
+
+    def _executer_trace(self, request, data, query, variables, operation_name):
+        with connection.execute_wrapper(request.trace):
+            return self._executer(request, data, query, variables, operation_name, False)
+
+    def _lancer(self, request, schema, document, operation_ast, variables, operation_name):
+        if not getattr(request, 'asynchrone', False) or operation_ast is None \
+                or operation_ast.operation != OperationType.QUERY \
+                or len(operation_ast.selection_set.selections) < parametre_async('CHAMPS_RACINE_MIN'):
+            # Exécution synchrone dans le thread courant du pool : rien à paralléliser
+            return super()._lancer(request, schema, document, operation_ast, variables, operation_name)
+
+        # Exécution différée : lancée par dispatch sur la boucle d'événements
+        execute_options = self._options(request, variables, operation_name)
+        execute_options["middleware"] = [ExecutionAsynchrone()]
+        return functools.partial(execute, schema, document, **execute_options)
+
+    @staticmethod
+    async def _executer_async(execution):
+        try:
+            result = execution()
+            if isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def metriques(request):
+    """Histogrammes des opérations GraphQL au format texte Prometheus, réservés aux requêtes
+    authentifiées et aux réseaux internes"""
+    if not acces_autorise(request):
+        return JsonResponse({'erreur': "Authentification requise"}, status=401)
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def export(request, ressource):
+    """Export en flux d'une ressource (voir data_info/export.py), réservé aux requêtes authentifiées"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if getattr(request, 'jwt', None) is None and not request.user.is_authenticated:
+        return JsonResponse({'erreur': "Authentification requise"}, status=401)
+    try:
+        extraction = Export(ressource, request.GET)
+    except ExportInvalide as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+
+    contenu = extraction.contenu_async() if isinstance(request, ASGIRequest) else extraction.contenu()
+    reponse = StreamingHttpResponse(contenu, content_type=extraction.content_type)
+    reponse['Content-Disposition'] = f'attachment; filename="{extraction.nom_fichier}"'
+    return reponse
@@ -0,0 +1,230 @@
+"""
+Subscriptions GraphQL en websocket, protocole graphql-transport-ws.
+
+ServeurAbonnements est une application ASGI pour les connexions websocket
+(ginfo/asgi.py lui passe les scopes ``websocket``). Déroulement :
+
+1. le client ouvre /graphql/ avec le sous-protocole ``graphql-transport-ws`` ;
+2. il envoie ``connection_init`` avec son jeton (``{"Authorization": "Bearer ..."}``),
+   le serveur répond ``connection_ack`` ou ferme la connexion (4403) ;
+3. chaque ``subscribe`` ouvre une subscription ; ses résultats arrivent en
+   ``next``, puis ``complete`` ; le client arrête une subscription par ``complete``.
+
+Le flux d'évènements tourne sur la boucle ; chaque évènement est résolu dans
+le pool de threads ORM (asynchrone.executer), où les resolvers peuvent lire
+la base comme pour une requête HTTP.
+"""
+
+import asyncio
+import json
+import logging
+
+from graphql import ExecutionResult, GraphQLError, OperationType, get_operation_ast, parse, validate
+from graphql.execution import create_source_event_stream, execute
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .asynchrone import executer
+from .authentification import JETONS, utilisateur_depuis_claims
+from .canaux import parametre
+
+logger = logging.getLogger(__name__)
+
+SOUS_PROTOCOLE = 'graphql-transport-ws'
+
+# Codes de fermeture du protocole
+MESSAGE_INVALIDE = 4400
+NON_AUTORISE = 4401
+INTERDIT = 4403
+DELAI_INIT_DEPASSE = 4408
+IDENTIFIANT_DEJA_PRIS = 4409
+INIT_EN_DOUBLE = 4429
+
+
+class ContexteWebsocket:
+    """``info.context`` des resolvers d'une subscription, à la place de la requête HTTP"""
+
+    def __init__(self, scope, claims):
+        self.scope = scope
+        self.jwt = claims
+        self.utilisateur = utilisateur_depuis_claims(claims)
+        self.asynchrone = False
+        self.trace = None
+
+
+def _jeton(payload):
+    """Jeton d'accès de ``connection_init`` : en-tête Authorization ou clé token"""
+    if not isinstance(payload, dict):
+        return None
+    entete = payload.get('Authorization') or payload.get('authorization') or ''
+    type, _espace, brut = entete.partition(' ')
+    if type in api_settings.AUTH_HEADER_TYPES and brut.strip():
+        return brut.strip()
+    return payload.get('token') or None
+
+
+class Connexion:
+    """Une connexion websocket et ses subscriptions en cours"""
+
+    def __init__(self, schema, scope, receive, send):
+        self.schema = schema
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self._verrou_envoi = asyncio.Lock()
+        self.contexte = None
+        self.init_recu = False
+        self.operations = {}
+        self.fermee = False
+
+    async def envoyer(self, message):
+        async with self._verrou_envoi:
+            if not self.fermee:
+                await self._send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def fermer(self, code, raison=''):
+        async with self._verrou_envoi:
+            if not self.fermee:
+                self.fermee = True
+                await self._send({'type': 'websocket.close', 'code': code, 'reason': raison})
+
+    async def servir(self):
+        evenement = await self.receive()
+        if evenement['type'] != 'websocket.connect':
+            return
+        if SOUS_PROTOCOLE not in self.scope.get('subprotocols', []):
+            # Refus avant acceptation : le client reçoit un 403
+            await self._send({'type': 'websocket.close', 'code': 1002})
+            return
+        await self._send({'type': 'websocket.accept', 'subprotocol': SOUS_PROTOCOLE})
+
+        delai = asyncio.get_running_loop().call_later(parametre('DELAI_INIT'), self._delai_init_depasse)
+        try:
+            while not self.fermee:
+                evenement = await self.receive()
+                if evenement['type'] == 'websocket.disconnect':
+                    self.fermee = True
+                    break
+                if evenement['type'] == 'websocket.receive':
+                    await self.traiter(evenement.get('text') or (evenement.get('bytes') or b'').decode('utf-8'))
+        finally:
+            delai.cancel()
+            for tache in self.operations.values():
+                tache.cancel()
+            if self.operations:
+                await asyncio.gather(*self.operations.values(), return_exceptions=True)
+
+    def _delai_init_depasse(self):
+        if self.contexte is None:
+            asyncio.ensure_future(self.fermer(DELAI_INIT_DEPASSE, "Connection initialisation timeout"))
+
+    async def traiter(self, texte):
+        try:
+            message = json.loads(texte)
+            type = message['type']
+        except (ValueError, TypeError, KeyError):
+            await self.fermer(MESSAGE_INVALIDE, "Message invalide")
+            return
+
+        if type == 'connection_init':
+            await self.initialiser(message.get('payload'))
+        elif type == 'ping':
+            await self.envoyer({'type': 'pong'})
+        elif type == 'pong':
+            pass
+        elif type == 'subscribe':
+            if self.contexte is None:
+                await self.fermer(NON_AUTORISE, "Unauthorized")
+                return
+            await self.souscrire(message.get('id'), message.get('payload') or {})
+        elif type == 'complete':
+            tache = self.operations.pop(message.get('id'), None)
+            if tache is not None:
+                tache.cancel()
+        else:
+            await self.fermer(MESSAGE_INVALIDE, f"Type de message inconnu : {type}")
+
+    async def initialiser(self, payload):
+        if self.init_recu:
+            await self.fermer(INIT_EN_DOUBLE, "Too many initialisation requests")
+            return
+        self.init_recu = True
+        brut = _jeton(payload)
+        try:
+            claims = JETONS.verifier(brut) if brut else None
+        except TokenError:
+            claims = None
+        if claims is None:
+            await self.fermer(INTERDIT, "Forbidden")
+            return
+        self.contexte = ContexteWebsocket(self.scope, claims)
+        await self.envoyer({'type': 'connection_ack'})
+
+    async def souscrire(self, id, payload):
+        if not isinstance(id, str) or not id:
+            await self.fermer(MESSAGE_INVALIDE, "Identifiant de subscription manquant")
+            return
+        if id in self.operations:
+            await self.fermer(IDENTIFIANT_DEJA_PRIS, f"Subscriber for {id} already exists")
+            return
+
+        try:
+            document = parse(payload.get('query') or '')
+        except GraphQLError as erreur:
+            await self.envoyer({'type': 'error', 'id': id, 'payload': [erreur.formatted]})
+            return
+        erreurs = validate(self.schema.graphql_schema, document)
+        operation = get_operation_ast(document, payload.get('operationName'))
+        if not erreurs and (operation is None or operation.operation != OperationType.SUBSCRIPTION):
+            erreurs = [GraphQLError("Seules les subscriptions passent par le websocket ; requêtes et mutations restent en HTTP")]
+        if erreurs:
+            await self.envoyer({'type': 'error', 'id': id, 'payload': [erreur.formatted for erreur in erreurs]})
+            return
+
+        variables = payload.get('variables') or {}
+        flux = await create_source_event_stream(
+            self.schema.graphql_schema, document, context_value=self.contexte,
+            variable_values=variables, operation_name=payload.get('operationName'),
+        )
+        if isinstance(flux, ExecutionResult):
+            await self.envoyer({'type': 'error', 'id': id, 'payload': [erreur.formatted for erreur in flux.errors]})
+            return
+        tache = asyncio.create_task(self.diffuser(id, flux, document, variables, payload.get('operationName')))
+        # Le flux est fermé (désabonnement) même si la tâche est annulée avant d'avoir démarré
+        tache.add_done_callback(lambda _tache: asyncio.ensure_future(flux.aclose()))
+        self.operations[id] = tache
+
+    async def diffuser(self, id, flux, document, variables, nom_operation):
+        try:
+            async for evenement in flux:
+                # Un contexte par évènement, comme une requête par appel HTTP (optimiseur, loaders)
+                resultat = await executer(
+                    None, execute, self.schema.graphql_schema, document, root_value=evenement,
+                    context_value=ContexteWebsocket(self.scope, self.contexte.jwt),
+                    variable_values=variables, operation_name=nom_operation,
+                )
+                await self.envoyer({'type': 'next', 'id': id, 'payload': resultat.formatted})
+            await self.envoyer({'type': 'complete', 'id': id})
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Subscription %s interrompue", id)
+            await self.envoyer({'type': 'error', 'id': id, 'payload': [{'message': "Erreur interne"}]})
+        finally:
+            if self.operations.get(id) is asyncio.current_task():
+                del self.operations[id]
+
+
+class ServeurAbonnements:
+    """Application ASGI des connexions websocket sur ``chemin``"""
+
+    def __init__(self, schema, chemin='/graphql/'):
+        self.schema = schema
+        self.chemin = chemin
+
+    async def __call__(self, scope, receive, send):
+        if scope['path'] != self.chemin:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1000})
+            return
+        await Connexion(self.schema, scope, receive, send).servir()
@@ -12,5 +12,20 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ginfo.settings')
+# /graphql/ est alors servi par la vue asynchrone (GRAPHQL_ASYNC)
+os.environ.setdefault('GINFO_ASGI', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importés après get_asgi_application(), qui initialise Django
+from data_info.websocket import ServeurAbonnements  # noqa: E402
+from schema_root import schema  # noqa: E402
+
+# Subscriptions GraphQL en websocket sur /graphql/ (protocole graphql-transport-ws)
+abonnements = ServeurAbonnements(schema)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await abonnements(scope, receive, send)
+    return await django_application(scope, receive, send)
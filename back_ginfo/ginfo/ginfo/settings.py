@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -62,8 +63,115 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# File d'attente des emails de notification (commande envoyer_emails)
+EMAIL_OUTBOX = {
+    'TAILLE_LOT': 50,
+    'MAX_TENTATIVES': 5,
+    'DELAI_INITIAL': 30,  # secondes, doublé à chaque échec
+    'DELAI_MAX': 3600,
+    'DUREE_VERROU': 300,
+    # Digest : les emails d'une fenêtre partent ensemble, un récapitulatif par adresse
+    'DIGEST': False,
+    'FENETRE_DIGEST': 300,  # secondes
+    'TAILLE_LOT_DIGEST': 1000,
+}
+
+# Historique : mois gardés en table, archives des mois plus anciens (commande archiver_historique)
+HISTORIQUE = {
+    'MOIS_CONSERVES': 12,  # en plus du mois en cours
+    'REPERTOIRE_ARCHIVES': BASE_DIR / 'archives' / 'historique',
+    'TAILLE_LOT': 1000,
+}
+
+# Export en flux /export/informations et /export/historiques (data_info/export.py)
+EXPORT = {
+    'TAILLE_LOT': 2000,  # lignes lues, jointes et écrites ensemble
+}
+
+# Cache des documents GraphQL et requêtes persistées (commande enregistrer_operations)
+GRAPHQL_DOCUMENTS = {
+    'TAILLE_CACHE': 256,
+    'LISTE_AUTORISEE': False,  # True : seules les opérations enregistrées sont exécutées
+    'FICHIER_OPERATIONS': BASE_DIR / 'operations.json',
+    'CACHE_APQ': 'default',
+}
+
+# Lots d'opérations GraphQL : tableau JSON exécuté en une transaction (data_info/lots.py)
+GRAPHQL_LOTS = {
+    'TAILLE_MAX': 20,  # opérations par lot
+}
+
+# Lectures GraphQL en GET : ETag, 304 sur If-None-Match, Cache-Control (data_info/conditionnel.py)
+CACHE_HTTP = {
+    'MAX_AGE': {},  # {nom d'opération: secondes} ; les autres opérations sont en no-cache
+    'MAX_AGE_DEFAUT': 0,
+    'PORTEE': 'public',  # les réponses ne dépendent pas de l'appelant : cache partagé possible (nginx)
+    'TAILLE_CACHE': 256,  # documents dont les modèles lus sont gardés en mémoire
+    'VERSION': '1',
+}
+
+# Mesures des opérations GraphQL : extensions 'tracing' si l'en-tête est présent, /metrics
+GRAPHQL_TRACING = {
+    'ENTETE': 'X-GraphQL-Trace',
+    'EXTENSIONS': DEBUG,  # renvoyer le détail par resolver dans la réponse
+    'MAX_SERIES': 500,  # combinaisons de labels par histogramme
+    # Clients admis sur /metrics sans authentification (adresse lue comme pour le budget de coût) :
+    # la machine elle-même et le réseau du cluster, d'où Prometheus interroge les pods
+    'RESEAUX_METRIQUES': ['127.0.0.0/8', '::1/128', '10.0.0.0/8'],
+}
+
+# Limites par opération GraphQL (règle de validation data_info.cout.LimiteCout)
+# et budget de coût par client sur une fenêtre de FENETRE secondes
+GRAPHQL_COUT = {
+    'PROFONDEUR_MAX': 10,
+    'COUT_MAX': 20000,
+    'MULTIPLICATEUR_LISTE': 50,  # éléments supposés pour une liste sans first/last
+    # Éléments attendus par liste de relation, d'après la forme des données
+    'MULTIPLICATEURS': {
+        'UtilisateurType.informations': 10,
+        'InformationType.notifications': 5,
+        'NotificationType.compagniesAssurance': 2,
+        'HistoriqueType.notifications': 2,
+        'CompagnieAssuranceType.informations': 1000,
+        'CompagnieAssuranceType.notifications': 1000,
+    },
+    'BUDGET': 200000,  # par client et par pod : compté dans la base du pod (table BudgetClient)
+    'FENETRE': 60,
+    'PROXIES': 1,  # proxys de confiance devant l'application (l'ingress), qui ajoutent X-Forwarded-For
+}
+
+# Jetons JWT des requêtes GraphQL (data_info.authentification.JWTMiddleware)
+GRAPHQL_AUTH = {
+    'TAILLE_CACHE': 1024,  # jetons d'accès vérifiés gardés en mémoire par processus
+    'INTERVALLE_LISTE_NOIRE': 5,  # secondes entre deux lectures des nouvelles révocations
+}
+
+# Exécution asynchrone de /graphql/ sous ASGI (ginfo/asgi.py positionne GINFO_ASGI)
+GRAPHQL_ASYNC = {
+    'ACTIF': os.environ.get('GINFO_ASGI') == '1',
+    'THREADS': int(os.environ.get('GINFO_THREADS_ORM', 4)),  # pool de threads ORM par worker
+    # Exécution asynchrone à partir de ce nombre de champs racine ; en dessous,
+    # la requête s'exécute d'un bloc dans un thread du pool (moins de changements de thread)
+    'CHAMPS_RACINE_MIN': 2,
+}
+
+# Subscriptions GraphQL en websocket (data_info/canaux.py, data_info/websocket.py)
+ABONNEMENTS = {
+    # Couche partagée par la base (plusieurs workers et pods) ; CoucheMemoire pour un seul processus
+    'COUCHE': 'data_info.canaux.CoucheBase',
+    'INTERVALLE': 0.5,  # secondes entre deux lectures des messages publiés
+    'RETENTION': 300,  # secondes de conservation des messages publiés
+    'TAILLE_FILE': 1000,  # messages en attente par subscription, les plus anciens perdus au-delà
+    'DELAI_INIT': 10,  # secondes pour envoyer connection_init
+}
+
 GRAPHENE = {
     'SCHEMA': 'schema_root.schema', 
+    'MIDDLEWARE': [
+        'data_info.reessais.ReessaiMiddleware',
+        'data_info.loaders.LoaderMiddleware',
+        'data_info.tracing.TracingMiddleware',
+    ],
 }
 
 ALLOWED_HOSTS = [
@@ -84,6 +192,7 @@ CSRF_TRUSTED_ORIGINS = [
 
 AUTH_USER_MODEL = 'auth.User'
 
+# Même pile sous WSGI et ASGI : ces middlewares gèrent tous deux l'appel asynchrone
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -91,6 +200,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'data_info.authentification.JWTMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -118,13 +228,55 @@ WSGI_APPLICATION = 'ginfo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# data_info.sqlite : SQLite en WAL, transactions BEGIN IMMEDIATE et PRAGMAS ajustables
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'data_info.sqlite',
+        'NAME': os.environ.get('GINFO_BASE', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',  # sûr en WAL, sans fsync à chaque commit
+                'busy_timeout': 5000,  # ms d'attente du verrou d'écriture
+                'cache_size': -64000,  # Kio
+                'mmap_size': 268435456,
+            },
+        },
     }
 }
 
+# Nouvelle tentative des mutations qui échouent sur « database is locked »
+SQLITE_REESSAIS = {
+    'TENTATIVES': 5,
+    'DELAI_INITIAL': 0.05,  # secondes, doublé à chaque tentative (avec tirage aléatoire)
+    'DELAI_MAX': 1.0,
+    # mutations à ne pas envelopper : transactions par lots, ou sans écriture
+    'EXCLUS': ['importInformations', 'refreshToken'],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'resultats' garde les résultats des requêtes de lecture fréquentes (compagnies,
+# utilisateurById...). Chaque worker garde ses propres entrées, mais les clés
+# portent les versions de la table VersionModele : une écriture validée par
+# n'importe quel worker du pod rend obsolètes les entrées de tous les autres.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'resultats': {
+        'BACKEND': 'data_info.cache.LocMemCacheCompte',
+        'LOCATION': 'resultats',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from schema_root import schema
+from data_info.views import AsyncDataInfoGraphQLView, DataInfoGraphQLView, export, metriques
+
+GraphQLVue = AsyncDataInfoGraphQLView if settings.GRAPHQL_ASYNC['ACTIF'] else DataInfoGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql/', csrf_exempt(GraphQLVue.as_view(graphiql=True, schema=schema))),
+    path('metrics', metriques),
+    path('export/<str:ressource>', export),
 ]
\ No newline at end of file
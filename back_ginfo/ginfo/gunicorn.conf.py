@@ -0,0 +1,38 @@
+"""
+Configuration gunicorn du service ASGI : gunicorn ginfo.asgi:application
+
+Le nombre de workers suit la limite CPU du conteneur (cgroup), et non le
+nombre de cœurs de la machine hôte. WEB_CONCURRENCY le remplace si défini.
+"""
+
+import math
+import os
+
+
+def limite_cpu():
+    """Nombre de CPU alloués au conteneur (quota cgroup v2 ou v1), sinon os.cpu_count()"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as fichier:
+            quota, periode = fichier.read().split()
+        if quota != 'max':
+            return int(quota) / int(periode)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as fichier:
+            quota = int(fichier.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as fichier:
+            periode = int(fichier.read())
+        if quota > 0:
+            return quota / periode
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY') or max(1, math.ceil(limite_cpu())))
+timeout = 60
+graceful_timeout = 30
+accesslog = '-'
@@ -1,5 +1,5 @@
 import graphene 
-from data_info.schema import Query as DataInfoQuery, Mutation as DataInfoMutation
+from data_info.schema import Query as DataInfoQuery, Mutation as DataInfoMutation, Subscription as DataInfoSubscription
 
 class Query (DataInfoQuery, graphene.ObjectType):
     pass
@@ -7,4 +7,7 @@ class Query (DataInfoQuery, graphene.ObjectType):
 class Mutation(DataInfoMutation, graphene.ObjectType):
     pass
 
-schema = graphene.Schema(query = Query, mutation = Mutation)
\ No newline at end of file
+class Subscription(DataInfoSubscription, graphene.ObjectType):
+    pass
+
+schema = graphene.Schema(query = Query, mutation = Mutation, subscription = Subscription)
\ No newline at end of file